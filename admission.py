@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+
+
+class QueryRejected(Exception):
+    """Raised when a query is turned away: the wait queue is full or the wait took too long"""
+
+
+class QueryTimeout(Exception):
+    """Raised when a query ran past its statement timeout and was cancelled"""
+
+
+def parse_limits(spec, default):
+    """Parse "10" or "postgres=20,sqlite=1" into (default, {engine: limit})
+
+    A bare number replaces the default; engines without an entry use it.
+    """
+    limits = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            name, value = part.split("=", 1)
+            limits[name.strip()] = int(value)
+        else:
+            default = int(part)
+    return default, limits
+
+
+class AdmissionGate:
+    """Concurrency limit with a bounded wait queue for a single database
+
+    At most max_concurrent queries run at once. Up to max_queue more wait
+    for a slot, each for at most queue_timeout seconds; anything beyond that
+    is rejected at once, so overload turns into fast QueryRejected errors
+    instead of an ever-growing backlog of requests holding threads.
+    """
+    def __init__(self, name, max_concurrent, max_queue=0, queue_timeout=5.0):
+        """Initialize the gate
+
+        Args:
+            name: Database name, used in messages and stats
+            max_concurrent: Queries allowed to run at the same time
+            max_queue: Queries allowed to wait for a slot; 0 rejects as soon as all slots are taken
+            queue_timeout: Seconds a query waits for a slot before it is rejected
+        """
+        if max_concurrent < 1 or max_queue < 0:
+            raise ValueError(f"Invalid admission limits for {name}: concurrent={max_concurrent}, queue={max_queue}")
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self.running = 0
+        self.queued = 0
+
+        self.admitted = 0
+        self.queue_full = 0
+        self.queue_timeouts = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if there is room; raises QueryRejected otherwise"""
+        start = time.perf_counter()
+        with self._cond:
+            if self.running < self.max_concurrent:
+                self.running += 1
+                self.admitted += 1
+                return
+            if self.queued >= self.max_queue:
+                self.queue_full += 1
+                raise QueryRejected(
+                    f"{self.name} is busy: {self.running} queries running and {self.queued} waiting"
+                )
+            self.queued += 1
+            try:
+                while self.running >= self.max_concurrent:
+                    remaining = self.queue_timeout - (time.perf_counter() - start)
+                    if remaining <= 0:
+                        self.queue_timeouts += 1
+                        raise QueryRejected(
+                            f"{self.name} is busy: no query slot free after {self.queue_timeout}s"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self.queued -= 1
+            self.running += 1
+            self.admitted += 1
+            wait = time.perf_counter() - start
+            self.queue_wait_total += wait
+            self.queue_wait_max = max(self.queue_wait_max, wait)
+
+    def release(self):
+        with self._cond:
+            self.running -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        """Context manager holding one query slot"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """Snapshot of the gate's gauges and counters"""
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": self.queued,
+                "admitted": self.admitted,
+                "queue_full": self.queue_full,
+                "queue_timeouts": self.queue_timeouts,
+                "rejected": self.queue_full + self.queue_timeouts,
+                "queue_wait_total": self.queue_wait_total,
+                "queue_wait_max": self.queue_wait_max
+            }
+
+
+class _Watch:
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.fired = False
+        self.discarded = False
+        self.done = threading.Event()
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+class Watchdog:
+    """One background thread that runs callbacks for watches past their deadline
+
+    Used to cancel runaway queries from the client side without starting a
+    timer thread per query.
+    """
+    def __init__(self, name="watchdog"):
+        self.name = name
+        self._cond = threading.Condition()
+        self._heap = []
+        self._discarded = 0
+        self._thread = None
+        self.fired = 0
+
+    def watch(self, seconds, callback):
+        """Call callback() in seconds unless discard() is called first; returns the watch"""
+        watch = _Watch(time.monotonic() + seconds, callback)
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, watch)
+            if self._heap[0] is watch:
+                self._cond.notify()
+        return watch
+
+    def discard(self, watch):
+        """Stop a watch; if its callback already started, wait for it to finish"""
+        with self._cond:
+            watch.discarded = True
+            fired = watch.fired
+            if not fired:
+                # Most queries finish long before their deadline; drop their
+                # watches in bulk rather than letting the heap grow
+                self._discarded += 1
+                if self._discarded > 1000 and self._discarded * 2 > len(self._heap):
+                    self._heap = [entry for entry in self._heap if not entry.discarded]
+                    heapq.heapify(self._heap)
+                    self._discarded = 0
+        if fired:
+            watch.done.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._heap and self._heap[0].discarded:
+                    heapq.heappop(self._heap)
+                    self._discarded -= 1
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                remaining = self._heap[0].deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                watch = heapq.heappop(self._heap)
+                watch.fired = True
+                self.fired += 1
+            try:
+                watch.callback()
+            except Exception as e:
+                print(f"{self.name}: cancel failed: {e}")
+            finally:
+                watch.done.set()
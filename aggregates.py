@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from histogram import LatencyHistogram
+from stats import RunningStats
+
+# Rolling windows shown on the dashboard: (label, seconds, ring)
+WINDOWS = (("1m", 60, "fine"), ("5m", 300, "fine"), ("1h", 3600, "coarse"))
+
+# Ring granularity: (slot seconds, number of slots)
+RINGS = {"fine": (10, 30), "coarse": (60, 60)}
+
+# Outcomes of failed executions, counted apart from each other
+FAILURES = ("rejected", "timeout", "error")
+
+
+class _Bucket:
+    """Statistics of the executions that fell into one time slot (or ever)
+
+    Failed executions are only counted, by outcome (FAILURES): a rejected
+    query takes next to no time and would drag the latencies down.
+    """
+    def __init__(self, relative_error):
+        self.stats = RunningStats()
+        self.histogram = LatencyHistogram(relative_error)
+        self.failures = dict.fromkeys(FAILURES, 0)
+
+    def add(self, seconds, outcome):
+        if outcome:
+            self.failures[outcome] += 1
+            return
+        self.stats.add(seconds)
+        self.histogram.record(seconds)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.histogram.merge(other.histogram)
+        for outcome, count in other.failures.items():
+            self.failures[outcome] += count
+        return self
+
+    def to_dict(self):
+        return {"stats": self.stats.to_dict(), "histogram": self.histogram.to_dict(), "failures": self.failures}
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls(data["histogram"]["relative_error"])
+        bucket.stats = RunningStats.from_dict(data["stats"])
+        bucket.histogram = LatencyHistogram.from_dict(data["histogram"])
+        bucket.failures.update(data["failures"])
+        return bucket
+
+
+class _Series:
+    """Everything kept for one (engine, query) key; size is fixed per key"""
+    def __init__(self, history_size, relative_error):
+        self.relative_error = relative_error
+        self.total = _Bucket(relative_error)
+        self.recent = deque(maxlen=history_size)
+        self.rings = {name: deque(maxlen=slots) for name, (_, slots) in RINGS.items()}
+        self.last_time = None
+
+    def add(self, timestamp, seconds, outcome):
+        self.total.add(seconds, outcome)
+        if not outcome:
+            self.recent.append(seconds)
+        self.last_time = timestamp
+        for name, (slot_seconds, _) in RINGS.items():
+            ring = self.rings[name]
+            slot = int(timestamp // slot_seconds)
+            if not ring or ring[-1][0] != slot:
+                ring.append((slot, _Bucket(self.relative_error)))
+            ring[-1][1].add(seconds, outcome)
+
+    def window(self, now, seconds, ring_name):
+        slot_seconds, _ = RINGS[ring_name]
+        # Slots that started within the window, including the current partial one
+        oldest = int(now // slot_seconds) - seconds // slot_seconds + 1
+        merged = _Bucket(self.relative_error)
+        for slot, bucket in self.rings[ring_name]:
+            if slot >= oldest:
+                merged.merge(bucket)
+        return merged
+
+    def merge(self, other):
+        """Add another process's series; ring slots are absolute, so equal slots combine"""
+        self.total.merge(other.total)
+        if other.last_time is not None and (self.last_time is None or other.last_time > self.last_time):
+            self.recent.extend(other.recent)
+            self.last_time = other.last_time
+        for name, ring in other.rings.items():
+            slots = {slot: bucket for slot, bucket in self.rings[name]}
+            for slot, bucket in ring:
+                if slot in slots:
+                    slots[slot].merge(bucket)
+                else:
+                    slots[slot] = bucket
+            self.rings[name].clear()
+            self.rings[name].extend(sorted(slots.items())[-self.rings[name].maxlen:])
+        return self
+
+    def to_dict(self):
+        return {
+            "total": self.total.to_dict(),
+            "recent": list(self.recent),
+            "last_time": self.last_time,
+            "rings": {name: [[slot, bucket.to_dict()] for slot, bucket in ring] for name, ring in self.rings.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data, history_size, relative_error):
+        series = cls(history_size, relative_error)
+        series.total = _Bucket.from_dict(data["total"])
+        series.recent.extend(data["recent"])
+        series.last_time = data["last_time"]
+        for name, ring in data["rings"].items():
+            series.rings[name].extend((slot, _Bucket.from_dict(bucket)) for slot, bucket in ring)
+        return series
+
+
+class AggregateStore:
+    """Process-wide, memory-bounded query statistics for every user
+
+    For each (engine, query) it keeps a ring buffer of recent latencies,
+    all-time streaming mean/variance and a latency sketch, and per-slot
+    sketches rolled up into 1m/5m/1h windows. Memory is bounded by max_keys
+    and the fixed ring sizes, not by the number of executions, and the
+    dashboard summary is cached for cache_seconds so rendering it costs the
+    same at any request rate.
+
+    With a shared snapshots.SnapshotDir, every worker process writes its
+    store there and summaries cover all workers. The recent executions go to
+    a small snapshot of their own in shared_recent, so the history table on
+    every page does not re-read the full stores.
+    """
+    def __init__(self, history_size=100, recent_size=50, max_keys=200, relative_error=0.01,
+                 cache_seconds=1.0, shared=None, shared_recent=None):
+        """Initialize the store
+
+        Args:
+            history_size: Recent latencies kept per (engine, query)
+            recent_size: Recent executions kept across all keys for the history table
+            max_keys: Distinct (engine, query) keys before new queries are grouped as "other"
+            relative_error: Accuracy of the latency sketches
+            cache_seconds: How long a computed summary is reused
+            shared: Optional snapshots.SnapshotDir to combine worker processes
+            shared_recent: Optional snapshots.SnapshotDir for the recent executions
+        """
+        self.history_size = history_size
+        self.max_keys = max_keys
+        self.relative_error = relative_error
+        self.cache_seconds = cache_seconds
+        self.shared = shared
+        self.shared_recent = shared_recent
+        self.series = {}
+        self.executions = deque(maxlen=recent_size)
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def record(self, engine, query_key, query, seconds, outcome=None, timestamp=None):
+        """Record one execution of query (grouped under query_key) on engine
+
+        outcome is None for a successful execution, otherwise "rejected",
+        "timeout" or "error".
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            key = (engine, query_key)
+            series = self.series.get(key)
+            if series is None:
+                if len(self.series) >= self.max_keys:
+                    key = (engine, "other")
+                    series = self.series.get(key)
+                if series is None:
+                    series = self.series[key] = _Series(self.history_size, self.relative_error)
+            series.add(timestamp, seconds, outcome)
+            self.executions.append({
+                "database": engine,
+                # Only the start of the SQL is shown, so bound what is kept
+                "query": query[:200],
+                "execution_time": seconds,
+                "outcome": outcome,
+                "time": timestamp,
+                "timestamp": datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
+            })
+
+    def recent(self, limit=10):
+        """The last limit executions across all users, oldest first"""
+        with self._lock:
+            executions = list(self.executions)
+        if self.shared_recent:
+            for snapshot in self.shared_recent.others():
+                executions.extend(snapshot["executions"])
+            executions.sort(key=lambda execution: execution["time"])
+        return executions[-limit:]
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "series": [[engine, query_key, series.to_dict()] for (engine, query_key), series in self.series.items()]
+            }
+
+    def recent_dict(self):
+        with self._lock:
+            return {"executions": list(self.executions)}
+
+    def flush(self):
+        """Write this process's store and recent executions to the shared directories now"""
+        if self.shared:
+            self.shared.write(self.to_dict())
+        if self.shared_recent:
+            self.shared_recent.write(self.recent_dict())
+
+    def start_flusher(self):
+        """Keep this process's snapshots in the shared directories up to date"""
+        if self.shared:
+            self.shared.start_flusher(self.to_dict)
+        if self.shared_recent:
+            self.shared_recent.start_flusher(self.recent_dict)
+
+    def _merged_series(self, own):
+        """(engine, query) -> _Series from this process's series dicts and every other worker's snapshot
+
+        Called without the lock: reading the other snapshots is file I/O.
+        """
+        merged = {}
+        for key, data in own:
+            merged[key] = _Series.from_dict(data, self.history_size, self.relative_error)
+        for snapshot in self.shared.others():
+            for engine, query_key, data in snapshot["series"]:
+                series = _Series.from_dict(data, self.history_size, self.relative_error)
+                key = (engine, query_key)
+                if key in merged:
+                    merged[key].merge(series)
+                else:
+                    merged[key] = series
+        return merged
+
+    @staticmethod
+    def _row(engine, query_key, bucket, series):
+        summary = bucket.histogram.summary()
+        return {
+            "engine": engine,
+            "query": query_key,
+            "last": series.recent[-1] if series.recent else None,
+            "count": bucket.stats.count,
+            "errors": bucket.failures["error"],
+            "rejected": bucket.failures["rejected"],
+            "timeouts": bucket.failures["timeout"],
+            "mean": bucket.stats.mean,
+            "stdev": bucket.stats.stdev,
+            "p50": summary["p50"],
+            "p90": summary["p90"],
+            "p99": summary["p99"],
+            "max": bucket.stats.max or 0.0
+        }
+
+    def _windows(self, all_series, now):
+        windows = {label: [] for label, _, _ in WINDOWS}
+        windows["all"] = []
+        for (engine, query_key), series in sorted(all_series.items()):
+            for label, seconds, ring_name in WINDOWS:
+                bucket = series.window(now, seconds, ring_name)
+                if bucket.stats.count or any(bucket.failures.values()):
+                    windows[label].append(self._row(engine, query_key, bucket, series))
+            windows["all"].append(self._row(engine, query_key, series.total, series))
+        return windows
+
+    def summary(self, baseline="postgres", candidate="mariadb"):
+        """Per-window rows for every key plus candidate/baseline median ratios"""
+        now = time.time()
+        with self._lock:
+            if self._cache and now - self._cache[0] < self.cache_seconds:
+                return self._cache[1]
+            if self.shared:
+                # Copy the live series; the other snapshots are merged outside the lock
+                own = [(key, series.to_dict()) for key, series in self.series.items()]
+            else:
+                windows = self._windows(self.series, now)
+        if self.shared:
+            windows = self._windows(self._merged_series(own), now)
+
+        comparisons = {}
+        for label, rows in windows.items():
+            medians = {(row["engine"], row["query"]): row["p50"] for row in rows if row["count"]}
+            comparisons[label] = [
+                {
+                    "query": query_key,
+                    "baseline": medians[(baseline, query_key)],
+                    "candidate": medians[(candidate, query_key)],
+                    "ratio": medians[(candidate, query_key)] / medians[(baseline, query_key)]
+                }
+                for engine, query_key in medians
+                if engine == baseline and (candidate, query_key) in medians and medians[(baseline, query_key)] > 0
+            ]
+        summary = {
+            "generated_at": datetime.fromtimestamp(now).strftime("%H:%M:%S"),
+            "baseline": baseline,
+            "candidate": candidate,
+            "windows": windows,
+            "comparisons": comparisons
+        }
+        with self._lock:
+            self._cache = (now, summary)
+        return summary
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class ApiClient:
+    """Runs queries through the app's /api/query endpoint instead of the databases
+
+    It offers the parts of DatabaseManager the benchmark tools use
+    (run_query, engines, close_pools), so bench.py and sweep.py can measure
+    the databases through the web server: HTTP, Flask, Split.io and the
+    server's own connection pools. Every thread keeps one keep-alive
+    connection.
+    """
+    def __init__(self, base_url, engines=None, timeout=30):
+        """Initialize the client
+
+        Args:
+            base_url: Base URL of the web application, e.g. http://localhost:5000
+            engines: Databases to run on (default: DB_ENGINES); the server must have them configured
+            timeout: Per-request timeout in seconds
+        """
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.netloc
+        self.path = parts.path.rstrip("/") + "/api/query"
+        self.timeout = timeout
+        self.engines = list(engines or os.getenv('DB_ENGINES', 'postgres,mariadb').split(','))
+        # The server's settings apply; there are no local pools or defaults
+        self.pool_mode = None
+        self.query_mode = None
+        self.pool_max_size = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = connection_class(self.host, timeout=self.timeout)
+        return conn
+
+    def run_query(self, query, db_type, engine_timing=None, max_rows=None, params=None, mode=None):
+        """Run query on db_type through the API and return the server's result
+
+        Takes the arguments of DatabaseManager.run_query. The result has the
+        server-side execution_time, phases and engine_time, plus round_trip:
+        the milliseconds from sending the request to reading the response.
+        Raises RuntimeError with the server's message for error responses.
+        """
+        body = {"query": query, "database": db_type, "engine_timing": bool(engine_timing), "rows": max_rows or 0}
+        if params is not None:
+            body["params"] = params
+        if mode:
+            body["mode"] = mode
+        payload = json.dumps(body)
+
+        conn = self._connection()
+        start = time.perf_counter_ns()
+        try:
+            conn.request("POST", self.path, body=payload, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            conn.close()
+            self._local.conn = None
+            raise
+        round_trip = (time.perf_counter_ns() - start) / 1e6
+
+        result = json.loads(data)
+        if response.status != 200:
+            raise RuntimeError(f"{response.status}: {result.get('error')}")
+        result["round_trip"] = round_trip
+        return result
+
+    def close_pools(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -1,19 +1,28 @@
 #!/usr/bin/env python3
 import random
-import subprocess
 import time
 import os
 import signal
 import sys
-import psycopg2
-import mysql.connector
 import uuid
 import atexit
-from datetime import datetime
-from flask import Flask, render_template, request, session
+import json
+from flask import Flask, Response, jsonify, make_response, render_template, request, stream_template
 from splitio import get_factory
 from splitio.exceptions import TimeoutException
 from dotenv import load_dotenv
+from admission import QueryRejected, QueryTimeout
+from aggregates import AggregateStore
+from database import DatabaseManager
+import fast_json
+from feature_flags import TrackQueue, TreatmentCache
+from profiling import RequestProfiler
+from metrics import MetricsRegistry, QueryMetrics, admission_collector, feature_flag_collector, pool_collector, warmup_collector
+from queries import QUERY_TEMPLATES, SAMPLE_QUERIES, default_params, query_id, query_label, random_params, template_for
+from snapshots import SnapshotDir
+from stats import PairedStats
+from sweep import chart
+from warmup import FAILED, WarmUp, WarmUpState
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,329 +30,514 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', os.urandom(24))
 
-# Initialize Split.io client
-split_api_key = os.getenv('SPLITIO_SDK_KEY')
-if not split_api_key:
-    print("WARNING: SPLITIO_SDK_KEY environment variable not set")
-    split_api_key = "localhost"  # Use localhost mode if no API key
-
-# Initialize Split factory
-factory = get_factory(split_api_key, config={"impressionsMode": "optimized"})
-try:
-    factory.block_until_ready(5)  # wait up to 5 seconds
-except TimeoutException:
-    print("WARNING: Split.io client initialization timed out")
-
-split_client = factory.client()
-
-class DatabaseManager:
-    def __init__(self):
-        self.postgres_container = "postgres-test"
-        self.mariadb_container = "mariadb-test"
-        self.postgres_port = 5432
-        self.mariadb_port = 3306
-        self.postgres_password = "postgres"
-        self.mariadb_password = "mariadb"
-        self.database_name = "performance_test"
-        self.containers_started = False
-        self.data_loaded = False
-
-    def ensure_containers_running(self):
-        """Make sure containers are running, start them if needed"""
-        if self.containers_started:
-            return
-        
-        print("Starting PostgreSQL container...")
-        try:
-            # Check if container exists and is running
-            result = subprocess.run(["podman", "ps", "-q", "-f", f"name={self.postgres_container}"], 
-                                  capture_output=True, text=True)
-            if not result.stdout.strip():
-                # Container not running, start it
-                subprocess.run([
-                    "podman", "run", "--name", self.postgres_container, 
-                    "-e", f"POSTGRES_PASSWORD={self.postgres_password}",
-                    "-e", f"POSTGRES_DB={self.database_name}",
-                    "-p", f"{self.postgres_port}:5432",
-                    "-d", "postgres:latest"
-                ], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error starting PostgreSQL container: {e}")
-            raise
-        
-        print("Starting MariaDB container...")
-        try:
-            # Check if container exists and is running
-            result = subprocess.run(["podman", "ps", "-q", "-f", f"name={self.mariadb_container}"], 
-                                  capture_output=True, text=True)
-            if not result.stdout.strip():
-                # Container not running, start it
-                subprocess.run([
-                    "podman", "run", "--name", self.mariadb_container,
-                    "-e", f"MYSQL_ROOT_PASSWORD={self.mariadb_password}",
-                    "-e", f"MYSQL_DATABASE={self.database_name}",
-                    "-p", f"{self.mariadb_port}:3306",
-                    "-d", "mariadb:latest"
-                ], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error starting MariaDB container: {e}")
-            raise
-        
-        # Wait for containers to be ready
-        print("Waiting for containers to be ready...")
-        time.sleep(15)
-        self.containers_started = True
-
-    def load_test_data(self, data_size=100000):
-        """Create test tables and populate with identical data"""
-        if self.data_loaded:
-            return
-            
-        print(f"Creating test data with {data_size} records...")
-        
-        # Connect to PostgreSQL
-        pg_conn = psycopg2.connect(
-            host="localhost",
-            port=self.postgres_port,
-            database=self.database_name,
-            user="postgres",
-            password=self.postgres_password
-        )
-        pg_cursor = pg_conn.cursor()
-        
-        # Create PostgreSQL table
-        pg_cursor.execute("DROP TABLE IF EXISTS test_table;")
-        pg_cursor.execute("""
-            CREATE TABLE test_table (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(50),
-                value NUMERIC(10,2),
-                created_at TIMESTAMP
-            );
-        """)
-        
-        # Create batch insert for PostgreSQL
-        insert_sql = "INSERT INTO test_table (name, value, created_at) VALUES "
-        values = []
-        for i in range(data_size):
-            values.append(f"('item{i}', {i * 1.5}, TIMESTAMP '2023-01-01' + '{i} hours'::interval)")
-        
-        # Execute in batches of 1000 to avoid query size limits
-        batch_size = 1000
-        for i in range(0, len(values), batch_size):
-            batch_values = values[i:i+batch_size]
-            pg_cursor.execute(insert_sql + ",".join(batch_values))
-        
-        pg_conn.commit()
-        pg_cursor.close()
-        pg_conn.close()
-        
-        # Connect to MariaDB (wait a bit longer to ensure it's ready)
-        retries = 0
-        mariadb_conn = None
-        while retries < 5:
-            try:
-                mariadb_conn = mysql.connector.connect(
-                    host="localhost",
-                    port=self.mariadb_port,
-                    database=self.database_name,
-                    user="root",
-                    password=self.mariadb_password
-                )
-                break
-            except mysql.connector.Error:
-                retries += 1
-                print(f"Waiting for MariaDB to be ready (attempt {retries})...")
-                time.sleep(5)
-                
-        if not mariadb_conn:
-            raise Exception("Failed to connect to MariaDB")
-            
-        mariadb_cursor = mariadb_conn.cursor()
-        
-        # Create MariaDB table
-        mariadb_cursor.execute("DROP TABLE IF EXISTS test_table;")
-        mariadb_cursor.execute("""
-            CREATE TABLE test_table (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(50),
-                value DECIMAL(10,2),
-                created_at DATETIME
-            );
-        """)
-        
-        # Create batch insert for MariaDB
-        insert_sql = "INSERT INTO test_table (name, value, created_at) VALUES "
-        values = []
-        for i in range(data_size):
-            # Format datetime for MariaDB
-            dt = datetime(2023, 1, 1)
-            dt = dt.replace(hour=i % 24)
-            dt_str = dt.strftime('%Y-%m-%d %H:%M:%S')
-            values.append(f"('item{i}', {i * 1.5}, '{dt_str}')")
-        
-        # Execute in batches
-        for i in range(0, len(values), batch_size):
-            batch_values = values[i:i+batch_size]
-            mariadb_cursor.execute(insert_sql + ",".join(batch_values))
-        
-        mariadb_conn.commit()
-        mariadb_cursor.close()
-        mariadb_conn.close()
-        
-        print("Test data created successfully in both databases.")
-        self.data_loaded = True
-
-    def run_query(self, query, db_type):
-        """Run query on specified database and return results and execution time"""
-        if db_type == "postgres":
-            conn = psycopg2.connect(
-                host="localhost",
-                port=self.postgres_port,
-                database=self.database_name,
-                user="postgres",
-                password=self.postgres_password
-            )
-        else:  # mariadb
-            conn = mysql.connector.connect(
-                host="localhost",
-                port=self.mariadb_port,
-                database=self.database_name,
-                user="root",
-                password=self.mariadb_password
-            )
-        
-        cursor = conn.cursor()
-        
-        start_time = time.time()
-        cursor.execute(query)
-        results = cursor.fetchall()
-        end_time = time.time()
-        execution_time = end_time - start_time
-        
-        # Get column names
-        if db_type == "postgres":
-            column_names = [desc[0] for desc in cursor.description]
-        else:
-            column_names = [desc[0] for desc in cursor.description]
-        
-        cursor.close()
-        conn.close()
-        
-        return {
-            "execution_time": execution_time,
-            "results": results,
-            "column_names": column_names
-        }
-
-    def cleanup(self):
-        """Stop and remove containers"""
-        if not self.containers_started:
-            return
-            
-        print("Cleaning up containers...")
-        subprocess.run(["podman", "stop", self.postgres_container], check=False)
-        subprocess.run(["podman", "stop", self.mariadb_container], check=False)
-        subprocess.run(["podman", "rm", self.postgres_container], check=False)
-        subprocess.run(["podman", "rm", self.mariadb_container], check=False)
-        print("Cleanup complete.")
-        self.containers_started = False
-        self.data_loaded = False
+# Set by gunicorn.conf.py: the gunicorn master's warm-up process owns the
+# containers, and every worker creates its own clients after fork
+PREFORK = os.getenv('APP_PREFORK') == '1'
 
+# Split.io client, treatment cache and track() queue; created per process by init_worker()
+split_client = None
+treatments = None
+track_queue = None
 
 # Create a global database manager
 #db_manager = DatabaseManager()
 db_manager = DatabaseManager()
 
 
-# Initialize containers at startup
-print("Starting containers at application startup...")
-try:
-    db_manager.ensure_containers_running()
-    print("Containers started successfully")
-    print("Loading test data...")
-    db_manager.load_test_data()
-    print("Test data loaded successfully")
-except Exception as e:
-    print(f"Error initializing containers: {e}")
-
-# Sample queries to rotate through
-SAMPLE_QUERIES = [
-    "SELECT COUNT(*), AVG(value) FROM test_table WHERE value > 100",
-    "SELECT a.id, a.name, b.value FROM test_table a JOIN test_table b ON a.value < b.value WHERE a.id < 100 AND b.id < 100 LIMIT 100",
-    "SELECT name, MAX(value) FROM test_table GROUP BY name LIMIT 100",
-    "SELECT id, name, value FROM test_table WHERE id % 10 = 0 ORDER BY value DESC LIMIT 100",
-    "SELECT EXTRACT(HOUR FROM created_at) as hour, COUNT(*), AVG(value) FROM test_table GROUP BY EXTRACT(HOUR FROM created_at) ORDER BY hour"
-]
+# Start containers and load test data in the background so the app can
+# accept requests immediately; query routes return 503 until it is ready.
+# Under gunicorn the master's warm-up process runs it and workers follow its state file
+if PREFORK:
+    warmup = WarmUpState(os.environ['DB_WARMUP_STATE_FILE'])
+else:
+    warmup = WarmUp(db_manager, data_size=os.getenv('DB_DATA_SIZE', '100000'))
 
-@app.route('/')
-def index():
-    # Containers should already be initialized at startup
-    if not db_manager.containers_started or not db_manager.data_loaded:
+# Prometheus metrics; with METRICS_MULTIPROC_DIR set, every worker process
+# writes snapshots there and /metrics merges them
+metrics_registry = MetricsRegistry(
+    multiproc_dir=os.getenv('METRICS_MULTIPROC_DIR') or None,
+    flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+)
+db_manager.query_metrics = QueryMetrics(
+    metrics_registry, max_query_labels=int(os.getenv('METRICS_MAX_QUERY_LABELS', '200'))
+)
+metrics_registry.register_collector(pool_collector(db_manager))
+metrics_registry.register_collector(admission_collector(db_manager))
+metrics_registry.register_collector(warmup_collector(warmup))
+
+# Opt-in request profiling: per-stage timings in a Server-Timing header and
+# the log, and collapsed stack samples of one request in PROFILE_SAMPLE_RATE
+profiler = RequestProfiler(
+    app,
+    stages=os.getenv('PROFILE_STAGES', '0') == '1',
+    log_ms=float(os.getenv('PROFILE_LOG_MS', '0')),
+    sample_rate=int(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    sample_interval=float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005')),
+    output=os.getenv('PROFILE_OUTPUT', 'profiles')
+)
+
+# With STATS_SHARED_DIR set, the dashboard, history and paired statistics
+# combine the executions of every worker process
+STATS_SHARED_DIR = os.getenv('STATS_SHARED_DIR')
+STATS_FLUSH_INTERVAL = float(os.getenv('STATS_FLUSH_INTERVAL', '2'))
+
+def shared_snapshots(prefix):
+    if not STATS_SHARED_DIR:
+        return None
+    return SnapshotDir(STATS_SHARED_DIR, prefix, flush_interval=STATS_FLUSH_INTERVAL)
+
+# Run every request on both databases side by side unless ?paired=0
+PAIRED_MODE = os.getenv('PAIRED_MODE', '0')
+
+# Matched MariaDB/PostgreSQL timing pairs from paired mode
+paired_stats = PairedStats(
+    baseline=os.getenv('PAIRED_BASELINE', 'postgres'),
+    candidate=os.getenv('PAIRED_CANDIDATE', 'mariadb'),
+    shared=shared_snapshots("paired")
+)
+
+# Rolling statistics of every execution, shown on /dashboard and as the
+# execution history instead of a per-browser session cookie
+aggregates = AggregateStore(
+    max_keys=int(os.getenv('AGGREGATE_MAX_KEYS', '200')),
+    shared=shared_snapshots("aggregates"),
+    shared_recent=shared_snapshots("recent")
+)
+
+def init_worker():
+    """Create the Split.io client and start the background threads of this process
+
+    Called at import when app.py serves on its own, and by gunicorn.conf.py
+    in every worker after fork: SDK clients, sockets and threads do not
+    survive a fork.
+    """
+    global split_client, treatments, track_queue
+
+    # Initialize Split.io client
+    split_api_key = os.getenv('SPLITIO_SDK_KEY')
+    if not split_api_key:
+        print("WARNING: SPLITIO_SDK_KEY environment variable not set")
+        split_api_key = "localhost"  # Use localhost mode if no API key
+
+    # Initialize Split factory
+    config = {"impressionsMode": "optimized"}
+    # Localhost mode reads treatments from this file (default ~/.split)
+    if os.getenv('SPLITIO_SPLIT_FILE'):
+        config["splitFile"] = os.environ['SPLITIO_SPLIT_FILE']
+    factory = get_factory(split_api_key, config=config)
+    try:
+        factory.block_until_ready(5)  # wait up to 5 seconds
+    except TimeoutException:
+        print("WARNING: Split.io client initialization timed out")
+
+    split_client = factory.client()
+
+    # Keep the SDK off the request path: treatments are cached for a short TTL
+    # and track() events are sent in batches by a background thread
+    treatments = TreatmentCache(split_client, ttl=float(os.getenv('SPLIT_TREATMENT_TTL', '30')))
+    track_queue = TrackQueue(
+        split_client,
+        max_size=int(os.getenv('SPLIT_TRACK_QUEUE_SIZE', '10000')),
+        batch_size=int(os.getenv('SPLIT_TRACK_BATCH_SIZE', '100')),
+        flush_interval=float(os.getenv('SPLIT_TRACK_FLUSH_INTERVAL', '1'))
+    )
+    track_queue.start()
+
+    metrics_registry.register_collector(feature_flag_collector(treatments, track_queue))
+    metrics_registry.start_flusher()
+    aggregates.start_flusher()
+    paired_stats.start_flusher()
+    paired_stats.start_refresher()
+
+def shutdown_worker():
+    """Flush this process's events and statistics and close its connections
+
+    Containers are left alone: they belong to the warm-up process under gunicorn.
+    """
+    try:
+        track_queue.stop()
+        split_client.destroy()
+    except Exception as e:
+        print(f"Error shutting down Split.io client: {e}")
+    for flush in (metrics_registry.write_snapshot, aggregates.flush, paired_stats.flush, profiler.flush):
         try:
-            # If for some reason containers aren't running, try to start them
-            db_manager.ensure_containers_running()
-            db_manager.load_test_data()
+            flush()
         except Exception as e:
-            return render_template('error.html', error=str(e))
-    
+            print(f"Error writing final statistics snapshot: {e}")
+    db_manager.close_pools()
+
+if not PREFORK:
+    init_worker()
+    warmup.start()
+
+def warmup_unavailable(as_json=False):
+    """Fast 503 returned by query routes until the warm-up has finished"""
+    # Restart the warm-up if it failed or was reset by /cleanup
+    warmup.start()
+    status = warmup.status()
+    if status["state"] == FAILED:
+        message = f"Database warm-up failed: {status['error']}"
+    else:
+        message = f"Databases are warming up ({status['state']}, {status['elapsed']:.0f}s elapsed). Please retry shortly."
+    if as_json:
+        response = api_response({"error": message, "warmup": status}, 503)
+    else:
+        response = make_response(render_template('error.html', error=message), 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+def query_outcome(error):
+    """"invalid", "rejected", "timeout" or "error" for an exception raised by a query"""
+    if isinstance(error, ValueError):
+        # A bad request, such as an unknown mode, that never reached a database
+        return "invalid"
+    if isinstance(error, QueryRejected):
+        return "rejected"
+    if isinstance(error, QueryTimeout):
+        return "timeout"
+    return "error"
+
+# Overload is not a server fault: rejected queries are 503, cancelled ones 504
+OUTCOME_STATUS = {"invalid": 400, "rejected": 503, "timeout": 504, "error": 500}
+
+def record_failure(db_type, sql, start, error):
+    """Count a failed, rejected or timed-out query in the aggregates, by its outcome"""
+    outcome = query_outcome(error)
+    if outcome != "invalid":
+        aggregates.record(db_type, query_label(sql), sql, time.perf_counter() - start, outcome=outcome)
+
+def query_failed(error, as_json=False):
+    """Error response for a failed query, with a status telling overload apart from errors"""
+    outcome = query_outcome(error)
+    if as_json:
+        response = api_response({"error": str(error), "outcome": outcome}, OUTCOME_STATUS[outcome])
+    else:
+        response = make_response(render_template('error.html', error=str(error)), OUTCOME_STATUS[outcome])
+    if outcome == "rejected":
+        response.headers['Retry-After'] = '1'
+    return response
+
+@app.route('/health')
+def health():
+    """Liveness: the process is up, with warm-up progress for information"""
+    return jsonify(warmup.status())
+
+@app.route('/ready')
+def ready():
+    """Readiness: 200 once the databases are started and loaded, 503 before"""
+    return jsonify(warmup.status()), 200 if warmup.is_ready else 503
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def pick_query(query):
+    """The query to run as (sql, params)
+
+    query (from ?query=) is run as given; a sample query runs as its
+    template with the default values. Without one a random sample template
+    is picked with random bind values. params is None for ad-hoc SQL.
+    """
+    if query:
+        template = template_for(query)
+        if template is None:
+            return query, None
+        return template["sql"], default_params(template)
+    template = random.choice(QUERY_TEMPLATES)
+    return template["sql"], random_params(template)
+
+@app.route('/')
+def index():
+    if not warmup.is_ready:
+        return warmup_unavailable()
+
     # Generate a user ID if not already in session
     # if 'user_id' not in session:
     #     session['user_id'] = f"user_{uuid.uuid4().hex[:8]}"
     # user_id = session['user_id']
     user_id = f"user_{random.randint(1, 10000)}"
 
+    if request.args.get('paired', PAIRED_MODE) == '1':
+        return paired_index(user_id)
+
     # Use Split.io to determine which database to use
-    db_choice = split_client.get_treatment(user_id, "db_performance_comparison")
+    with profiler.stage("treatment"):
+        db_choice = treatments.get_treatment(user_id, "db_performance_comparison")
 
-    if db_choice not in ["postgres", "mariadb"]:
-        db_choice = "postgres"  # Default if Split.io fails
+    # Any configured engine can be a treatment
+    if db_choice not in db_manager.engines:
+        db_choice = db_manager.default_engine  # Default if Split.io fails
     
     # Pick a query - either from request or randomly
-    query = request.args.get('query')
-    if not query:
-        query = random.choice(SAMPLE_QUERIES)
+    sql, params = pick_query(request.args.get('query'))
     
     # Run the query
     try:
-        result = db_manager.run_query(query, db_choice)
+        engine_timing = request.args.get('engine_timing') == '1' or None
+        start = time.perf_counter()
+        with profiler.stage("query"):
+            try:
+                result = db_manager.run_query(sql, db_choice, engine_timing=engine_timing,
+                                              params=params, mode=request.args.get('mode'))
+            except Exception as e:
+                record_failure(db_choice, sql, start, e)
+                raise
+        query = result["query"]
         
         # Track metrics with Split.io
-        split_client.track(user_id, "user", "query_execution", result["execution_time"], {"query": query, "database": db_choice})
+        with profiler.stage("track"):
+            track_queue.track(user_id, "user", "query_execution", result["execution_time"], {"query": query, "database": db_choice})
         
-        # Create a record for the execution history
-        execution = {
-            "database": db_choice,
-            "query": query,
-            "execution_time": result["execution_time"],
-            "timestamp": datetime.now().strftime("%H:%M:%S")
-        }
+        with profiler.stage("aggregate"):
+            aggregates.record(db_choice, query_label(sql), query, result["execution_time"])
+            history = aggregates.recent(10)
         
-        # Store history in session
-        if 'history' not in session:
-            session['history'] = []
-        
-        history = session.get('history', [])
-        history.append(execution)
-        session['history'] = history[-10:]  # Keep only the last 10 executions
-        
-        return render_template('results.html', 
+        # Stream the page so large results are never rendered into one string;
+        # its rendering is timed as the "render" stage while it is sent
+        response = app.response_class(stream_template('results.html',
                               user_id=user_id,
                               db_choice=db_choice,
                               query=query,
+                              mode=result["mode"],
                               execution_time=result["execution_time"],
+                              phases=result["phases"],
+                              engine_time=result["engine_time"],
                               results=result["results"],
                               column_names=result["column_names"],
-                              history=session['history'],
-                              sample_queries=SAMPLE_QUERIES)
+                              row_count=result["row_count"],
+                              truncated=result["truncated"],
+                              history=history,
+                              sample_queries=SAMPLE_QUERIES))
+    except Exception as e:
+        response = query_failed(e)
+
+    # Let load testing tools attribute latency to a database and query
+    response.headers['X-Database'] = db_choice
+    response.headers['X-Query-Id'] = query_id(sql)
+    return response
+
+def paired_index(user_id):
+    """Run the same query on both databases at once and show them side by side"""
+    sql, params = pick_query(request.args.get('query'))
+
+    try:
+        engine_timing = request.args.get('engine_timing') == '1' or None
+        start = time.perf_counter()
+        with profiler.stage("query"):
+            try:
+                results = db_manager.run_paired(sql, (paired_stats.baseline, paired_stats.candidate),
+                                                engine_timing=engine_timing, params=params,
+                                                mode=request.args.get('mode'))
+            except Exception as e:
+                record_failure(getattr(e, "database", paired_stats.baseline), sql, start, e)
+                raise
+        query = results[paired_stats.baseline]["query"]
+
+        with profiler.stage("track"):
+            for db_type, result in results.items():
+                track_queue.track(user_id, "user", "query_execution", result["execution_time"],
+                                  {"query": query, "database": db_type, "paired": True})
+
+        with profiler.stage("aggregate"):
+            key = query_id(sql)
+            paired_stats.add(key, results[paired_stats.baseline]["execution_time"],
+                             results[paired_stats.candidate]["execution_time"])
+            for db_type, result in results.items():
+                aggregates.record(db_type, query_label(sql), query, result["execution_time"])
+            query_stats = paired_stats.summary(key)
+            overall_stats = paired_stats.summary()
+            history = aggregates.recent(10)
+
+        response = app.response_class(stream_template('paired.html',
+                              user_id=user_id,
+                              query=query,
+                              results=results,
+                              query_stats=query_stats,
+                              overall_stats=overall_stats,
+                              history=history,
+                              sample_queries=SAMPLE_QUERIES))
     except Exception as e:
-        return render_template('error.html', error=str(e))
+        response = query_failed(e)
+
+    response.headers['X-Database'] = 'paired'
+    response.headers['X-Query-Id'] = query_id(sql)
+    return response
+
+# Largest row sample and batch the JSON API returns or accepts
+API_MAX_ROWS = int(os.getenv('API_MAX_ROWS', '100'))
+API_MAX_BATCH = int(os.getenv('API_MAX_BATCH', '50'))
+
+def api_response(data, status=200):
+    """Compact JSON response, serialised by fast_json"""
+    with profiler.stage("serialize"):
+        body = fast_json.dumps(data)
+    return Response(body, status=status, mimetype='application/json')
+
+def api_request():
+    """Options of an API request: the JSON body of a POST, or the query string of a GET"""
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+    return request.args.to_dict()
+
+def api_treatment(options):
+    """(user_id, treatment, database) for an API request
+
+    "database" in the options runs on that engine and skips Split.io, so
+    benchmarks can target one engine through the API.
+    """
+    user_id = options.get('user_id') or f"user_{random.randint(1, 10000)}"
+    database = options.get('database')
+    if database:
+        if database not in db_manager.engines:
+            raise ValueError(f"Unknown database {database!r}; configured: {', '.join(db_manager.engines)}")
+        return user_id, "override", database
+    with profiler.stage("treatment"):
+        treatment = treatments.get_treatment(user_id, "db_performance_comparison")
+    database = treatment if treatment in db_manager.engines else db_manager.default_engine
+    return user_id, treatment, database
+
+def api_run(options, user_id, database):
+    """Run one API query and return its JSON-ready result
+
+    Args:
+        options: query (SQL or a sample query, default a random template),
+            params (bind values for a template query), mode, rows (size of
+            the row sample, default none) and engine_timing
+        user_id: User the execution is tracked for
+        database: Engine to run on
+    """
+    sql, params = pick_query(options.get('query'))
+    if options.get('params') is not None:
+        params = options['params']
+    rows = min(int(options.get('rows') or 0), API_MAX_ROWS)
+    engine_timing = options.get('engine_timing') in (True, '1') or None
+    start = time.perf_counter()
+    with profiler.stage("query"):
+        try:
+            result = db_manager.run_query(sql, database, engine_timing=engine_timing, max_rows=rows,
+                                          params=params, mode=options.get('mode'))
+        except Exception as e:
+            record_failure(database, sql, start, e)
+            raise
+    query = result["query"]
+
+    with profiler.stage("track"):
+        track_queue.track(user_id, "user", "query_execution", result["execution_time"], {"query": query, "database": database})
+    with profiler.stage("aggregate"):
+        aggregates.record(database, query_label(sql), query, result["execution_time"])
+
+    data = {
+        "query_id": query_id(sql),
+        "query": query,
+        "mode": result["mode"],
+        "execution_time": result["execution_time"],
+        "phases": result["phases"],
+        "engine_time": result["engine_time"],
+        "row_count": result["row_count"]
+    }
+    if rows:
+        data["columns"] = result["column_names"]
+        data["rows"] = result["results"]
+        data["truncated"] = result["truncated"]
+    return data
+
+@app.route('/api/query', methods=['GET', 'POST'])
+def api_query():
+    """One query as compact JSON: treatment, phase timings and an optional row sample
+
+    Takes the same options as / (query, mode, engine_timing) plus rows,
+    user_id and database, as a query string or a JSON body; a JSON body can
+    also carry params for a template query.
+    """
+    if not warmup.is_ready:
+        return warmup_unavailable(as_json=True)
+
+    try:
+        options = api_request()
+        user_id, treatment, database = api_treatment(options)
+    except ValueError as e:
+        return api_response({"error": str(e)}, 400)
+
+    key = query_id(options.get('query') or "")
+    try:
+        data = api_run(options, user_id, database)
+        key = data["query_id"]
+        response = api_response(dict(data, user_id=user_id, treatment=treatment, database=database))
+    except (ValueError, TypeError) as e:
+        response = api_response({"error": str(e)}, 400)
+    except Exception as e:
+        response = query_failed(e, as_json=True)
+
+    response.headers['X-Database'] = database
+    response.headers['X-Query-Id'] = key
+    return response
+
+@app.route('/api/query/batch', methods=['POST'])
+def api_query_batch():
+    """Several queries for one user in one request
+
+    The JSON body is {"queries": [options, ...]} with the options of
+    /api/query for each query, and optional user_id and database for the
+    whole batch. Queries run one after another on the same engine; a
+    failing query reports its error in its place without stopping the rest.
+    """
+    if not warmup.is_ready:
+        return warmup_unavailable(as_json=True)
+
+    try:
+        options = api_request()
+        queries = options.get('queries')
+        if not isinstance(queries, list) or not queries:
+            raise ValueError('Request body must be {"queries": [...]} with at least one query')
+        if len(queries) > API_MAX_BATCH:
+            raise ValueError(f"At most {API_MAX_BATCH} queries per batch (API_MAX_BATCH)")
+        user_id, treatment, database = api_treatment(options)
+    except ValueError as e:
+        return api_response({"error": str(e)}, 400)
+
+    results = []
+    for query_options in queries:
+        try:
+            results.append(api_run(query_options if isinstance(query_options, dict) else {"query": query_options},
+                                   user_id, database))
+        except Exception as e:
+            results.append({"error": str(e), "outcome": query_outcome(e)})
+
+    response = api_response({"user_id": user_id, "treatment": treatment, "database": database, "results": results})
+    response.headers['X-Database'] = database
+    response.headers['X-Query-Id'] = 'batch'
+    return response
+
+@app.route('/dashboard')
+def dashboard():
+    """Rolling per-database, per-query statistics across all users"""
+    return render_template('dashboard.html', summary=aggregates.summary(paired_stats.baseline, paired_stats.candidate))
+
+@app.route('/sweep')
+def sweep_report():
+    """Throughput and latency curves from the last sweep.py report (SWEEP_REPORT)"""
+    path = os.getenv('SWEEP_REPORT', 'sweep.json')
+    try:
+        with open(path) as f:
+            report = json.load(f)
+    except FileNotFoundError:
+        message = f"No sweep report found at {path}. Run python sweep.py to create one."
+        return make_response(render_template('error.html', error=message), 404)
+    return render_template('sweep.html', report=report, chart=chart(report))
 
 @app.route('/cleanup')
 def cleanup():
+    if PREFORK:
+        return "Running under gunicorn: containers are cleaned up when the server stops."
     try:
+        track_queue.stop()
         split_client.destroy()
         db_manager.cleanup()
+        warmup.reset()
         return "Cleanup successful. Containers stopped and removed."
     except Exception as e:
         return f"Error during cleanup: {str(e)}"
@@ -351,6 +545,13 @@ def cleanup():
 def signal_handler(sig, frame):
     """Handle termination signals and clean up resources"""
     print(f"\nReceived signal {sig}. Cleaning up resources before exit...")
+    try:
+        track_queue.stop()
+        stats = track_queue.stats()
+        print(f"Flushed Split.io events: {stats['sent']} sent, {stats['failed']} failed, {stats['dropped']} dropped")
+    except Exception as e:
+        print(f"Error flushing Split.io events: {e}")
+
     try:
         split_client.destroy()
         print("Split.io client destroyed successfully")
@@ -375,13 +576,16 @@ def register_shutdown_handlers():
     # Register cleanup with atexit as a backup
     atexit.register(lambda: db_manager.cleanup())
     atexit.register(lambda: split_client.destroy())
+    atexit.register(lambda: track_queue.stop())
     
     # Note: SIGKILL (kill -9) cannot be caught and handled
 
 if __name__ == "__main__":
     register_shutdown_handlers()
     try:
-        app.run(host='0.0.0.0', port=5000, debug=True)
+        # The reloader would import this module a second time in a child
+        # process and run a second warm-up on the same containers and tables
+        app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
     except Exception as e:
         print(f"Error running Flask app: {e}")
         # The signal handler or atexit will handle cleanup
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from api_client import ApiClient
+from database import PHASES, DatabaseManager
+from engines import create_engine
+from queries import QUERY_MODES, SAMPLE_QUERIES, default_params, query_id, random_params, template_for
+from stats import bootstrap_ratio_ci, summarize
+
+
+def resolve_queries(specs):
+    """Turn --queries arguments (1-based sample numbers or SQL) into (id, sql) pairs"""
+    if not specs:
+        return [(query_id(query), query) for query in SAMPLE_QUERIES]
+    queries = []
+    for i, spec in enumerate(specs):
+        if spec.isdigit():
+            query = SAMPLE_QUERIES[int(spec) - 1]
+            queries.append((query_id(query), query))
+        else:
+            queries.append((f"custom-{i + 1}", spec))
+    return queries
+
+
+def bench_query(db_manager, engine, query, warmup, repetitions, time_budget, engine_timing=False,
+                mode=None, random_values=False, rng=None):
+    """Run one query on one engine and return its samples and phase breakdown
+
+    Stops after `repetitions` measured runs, or once `time_budget` seconds
+    have been spent measuring, whichever is set (time_budget wins if both).
+    Sample queries run as templates in the given mode, with fresh random bind
+    values per run if random_values is set. db_manager can be an
+    api_client.ApiClient, which also reports each request's HTTP round trip.
+    """
+    template = template_for(query)
+    rng = rng or random.Random()
+
+    def run(timing=False):
+        if template is None:
+            return db_manager.run_query(query, engine, engine_timing=timing)
+        params = random_params(template, rng) if random_values else default_params(template)
+        return db_manager.run_query(template["sql"], engine, engine_timing=timing, params=params, mode=mode)
+
+    for _ in range(warmup):
+        run()
+
+    samples = []
+    phases = {phase: [] for phase in PHASES}
+    engine_times = []
+    round_trips = []
+    start = time.perf_counter()
+    while True:
+        if time_budget:
+            if time.perf_counter() - start >= time_budget and samples:
+                break
+        elif len(samples) >= repetitions:
+            break
+        result = run(engine_timing)
+        samples.append(result["execution_time"])
+        for phase, ms in result["phases"].items():
+            phases[phase].append(ms)
+        engine_time = result.get("engine_time") or {}
+        if engine_time.get("execution") is not None:
+            engine_times.append(engine_time["execution"])
+        if "round_trip" in result:
+            round_trips.append(result["round_trip"])
+
+    return {
+        "samples": samples,
+        "stats": summarize(samples),
+        "phase_medians_ms": {phase: statistics.median(values) for phase, values in phases.items() if values},
+        "engine_execution_median_ms": statistics.median(engine_times) if engine_times else None,
+        "round_trip_median_ms": statistics.median(round_trips) if round_trips else None
+    }
+
+
+def compare(results, baseline, threshold, confidence):
+    """Compare medians against a baseline run
+
+    A query regresses when the whole confidence interval of its
+    current/baseline median ratio lies above 1 + threshold, and improves when
+    it lies below 1 - threshold. Anything else is reported as unchanged.
+    """
+    baseline_results = {(r["engine"], r["query_id"]): r for r in baseline["results"]}
+    rows = []
+    for result in results:
+        key = (result["engine"], result["query_id"])
+        base = baseline_results.get(key)
+        if not base or not base["samples"] or not result["samples"]:
+            continue
+        ratio = result["stats"]["median"] / base["stats"]["median"] if base["stats"]["median"] else None
+        low, high = bootstrap_ratio_ci(base["samples"], result["samples"], confidence=confidence)
+        if low is not None and low > 1 + threshold:
+            verdict = "REGRESSION"
+        elif high is not None and high < 1 - threshold:
+            verdict = "improvement"
+        else:
+            verdict = "unchanged"
+        rows.append({
+            "engine": key[0],
+            "query_id": key[1],
+            "baseline_median": base["stats"]["median"],
+            "median": result["stats"]["median"],
+            "ratio": ratio,
+            "ci_low": low,
+            "ci_high": high,
+            "verdict": verdict
+        })
+    return rows
+
+
+def print_results(results):
+    print(f"\n{'engine':<10} {'query':<10} {'n':>5} {'median':>10} {'p90':>10} {'p99':>10} {'stdev':>10}  phases (median ms)")
+    for result in results:
+        stats = result["stats"]
+        if not stats["n"]:
+            continue
+        phases = " ".join(f"{phase}={ms:.2f}" for phase, ms in result["phase_medians_ms"].items())
+        if result.get("round_trip_median_ms") is not None:
+            phases += f" round_trip={result['round_trip_median_ms']:.2f}"
+        print(f"{result['engine']:<10} {result['query_id']:<10} {stats['n']:>5} "
+              f"{stats['median'] * 1000:>8.2f}ms {stats['p90'] * 1000:>8.2f}ms "
+              f"{stats['p99'] * 1000:>8.2f}ms {stats['stdev'] * 1000:>8.2f}ms  {phases}")
+
+
+def print_comparison(rows, confidence):
+    print(f"\nComparison with baseline ({confidence:.0%} bootstrap CI of median ratio)")
+    print(f"{'engine':<10} {'query':<10} {'baseline':>10} {'current':>10} {'ratio':>7} {'CI':>15}  verdict")
+    for row in rows:
+        ci = f"{row['ci_low']:.2f}-{row['ci_high']:.2f}" if row["ci_low"] is not None else "n/a"
+        ratio = f"{row['ratio']:.2f}" if row["ratio"] is not None else "n/a"
+        print(f"{row['engine']:<10} {row['query_id']:<10} {row['baseline_median'] * 1000:>8.2f}ms "
+              f"{row['median'] * 1000:>8.2f}ms {ratio:>7} {ci:>15}  {row['verdict']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark SAMPLE_QUERIES directly against the databases, without the web app'
+    )
+    parser.add_argument(
+        '--engines',
+        nargs='+',
+        help='Databases to benchmark, e.g. postgres mariadb sqlite duckdb (default: DB_ENGINES)'
+    )
+    parser.add_argument(
+        '--queries',
+        nargs='+',
+        help='Sample query numbers (1-based) or SQL strings (default: all sample queries)'
+    )
+    parser.add_argument(
+        '--warmup',
+        type=int,
+        default=3,
+        help='Unmeasured warm-up runs per query and engine (default: 3)'
+    )
+    parser.add_argument(
+        '--repetitions',
+        type=int,
+        default=30,
+        help='Measured runs per query and engine (default: 30)'
+    )
+    parser.add_argument(
+        '--time-budget',
+        type=float,
+        help='Measure each query and engine for this many seconds instead of a fixed number of runs'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=QUERY_MODES,
+        help='How sample queries send their values (default: DB_QUERY_MODE, literal)'
+    )
+    parser.add_argument(
+        '--random-params',
+        action='store_true',
+        help='Draw new random bind values for every run of a sample query'
+    )
+    parser.add_argument(
+        '--engine-timing',
+        action='store_true',
+        help='Also capture the engine-reported execution time (runs each query twice)'
+    )
+    parser.add_argument(
+        '--output',
+        help='Write results, including raw samples, to this JSON file'
+    )
+    parser.add_argument(
+        '--compare',
+        metavar='BASELINE_JSON',
+        help='Compare against a previous --output file and exit with status 1 on regressions'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.05,
+        help='Minimum relative change of the median to flag (default: 0.05)'
+    )
+    parser.add_argument(
+        '--confidence',
+        type=float,
+        default=0.95,
+        help='Confidence level for the comparison (default: 0.95)'
+    )
+    parser.add_argument(
+        '--data-size',
+        default='100000',
+        help='Rows of test data to load, or a scale factor: 100k, 1m, 10m, 100m (default: 100000)'
+    )
+    parser.add_argument(
+        '--no-setup',
+        action='store_true',
+        help='Assume the containers are running and the test data is loaded'
+    )
+    parser.add_argument(
+        '--api',
+        metavar='URL',
+        help='Run the queries through the /api/query endpoint of the app at this URL instead of '
+             'connecting to the databases; the app owns the containers and data'
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.api:
+        db_manager = ApiClient(args.api, engines=args.engines)
+    else:
+        engines = {name: create_engine(name) for name in args.engines} if args.engines else None
+        db_manager = DatabaseManager(engines=engines)
+    args.engines = list(db_manager.engines)
+    if not args.no_setup and not args.api:
+        db_manager.ensure_containers_running()
+        db_manager.load_test_data(args.data_size)
+
+    queries = resolve_queries(args.queries)
+    results = []
+    try:
+        for engine in args.engines:
+            for qid, query in queries:
+                print(f"Benchmarking {engine} {qid}...")
+                result = bench_query(db_manager, engine, query, args.warmup, args.repetitions,
+                                     args.time_budget, engine_timing=args.engine_timing,
+                                     mode=args.mode, random_values=args.random_params)
+                result.update({"engine": engine, "query_id": qid, "query": query})
+                results.append(result)
+    finally:
+        db_manager.close_pools()
+
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "engines": args.engines,
+            "warmup": args.warmup,
+            "repetitions": args.repetitions,
+            "time_budget": args.time_budget,
+            "pool_mode": db_manager.pool_mode,
+            "query_mode": args.mode or db_manager.query_mode,
+            "api": args.api,
+            "random_params": args.random_params,
+            "data_size": args.data_size
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold, args.confidence)
+        print_comparison(rows, args.confidence)
+        if any(row["verdict"] == "REGRESSION" for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
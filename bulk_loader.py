@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import itertools
+import sys
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def batched(rows, batch_size):
+    """Yield lists of at most batch_size rows without materialising the whole input"""
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def copy_file(cursor, table, columns, path):
+    """Load a tab-separated file into a PostgreSQL table with COPY FROM STDIN
+
+    copy_expert() reads the file in fixed-size chunks, so memory stays flat
+    for any file size.
+    """
+    with open(path, "rb") as f:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", f, size=65536)
+
+
+def insert_batches(cursor, table, columns, rows, batch_size=5000, placeholder="%s"):
+    """Insert rows with executemany in batches, returning the row count
+
+    mysql.connector rewrites executemany() INSERTs into a single multi-row
+    statement per batch. placeholder is the driver's parameter marker.
+    """
+    placeholders = ", ".join([placeholder] * len(columns))
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    count = 0
+    for batch in batched(rows, batch_size):
+        cursor.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import bulk_loader
+import dataset
+from admission import AdmissionGate, QueryRejected, QueryTimeout, Watchdog, parse_limits
+from db_pool import ConnectionPool
+from engines import create_engine
+from queries import QUERY_MODES, render
+
+
+# Timed phases of run_query, in order
+PHASES = ("checkout", "prepare", "execute", "fetch", "decode")
+
+
+def is_select(query):
+    """True for read-only statements that are safe to re-run under EXPLAIN ANALYZE"""
+    words = query.split(None, 1)
+    return bool(words) and words[0].upper() in ("SELECT", "WITH")
+
+
+class DatabaseManager:
+    def __init__(self, runner=subprocess.run, connectors=None, engines=None):
+        """Initialize the manager
+
+        Args:
+            runner: subprocess.run-compatible callable used for podman commands
+            connectors: Optional dict mapping db_type to a zero-argument connect
+                callable, overriding the engines' own connect()
+            engines: Optional dict mapping db_type to an engines.Engine; by
+                default the engines named in DB_ENGINES are created
+        """
+        self.runner = runner
+        self.database_name = "performance_test"
+        if engines is None:
+            names = [name.strip() for name in os.getenv('DB_ENGINES', 'postgres,mariadb').split(',') if name.strip()]
+            engines = {name: create_engine(name, database_name=self.database_name) for name in names}
+        self.engines = engines
+        self.connectors = connectors or {}
+        self.containers_started = False
+        self.data_loaded = False
+
+        # "pooled" reuses connections across queries, "per_query" opens and
+        # closes a connection around every query (the original behaviour)
+        self.pool_mode = os.getenv('DB_POOL_MODE', 'pooled')
+        if self.pool_mode not in ("pooled", "per_query"):
+            raise ValueError(f"Unknown DB_POOL_MODE: {self.pool_mode}")
+        self.pool_min_size = int(os.getenv('DB_POOL_MIN', '1'))
+        self.pool_max_size = int(os.getenv('DB_POOL_MAX', '10'))
+        self.pool_checkout_timeout = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+        self.pool_health_check_idle = float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', '5'))
+        self.pools = {}
+        self._pools_lock = threading.Lock()
+
+        # Admission control: queries allowed to run per database (default
+        # DB_POOL_MAX, 0 disables), and how many may wait for a slot and for
+        # how long before they are rejected. Both take "10" or "postgres=20,sqlite=1"
+        self.max_concurrent = parse_limits(os.getenv('DB_MAX_CONCURRENT', ''), None)
+        self.admission_queue = parse_limits(os.getenv('DB_ADMISSION_QUEUE', ''), None)
+        self.admission_timeout = float(os.getenv('DB_ADMISSION_TIMEOUT', '5'))
+        self.gates = {}
+
+        # Server-side statement timeout in seconds on query connections (0
+        # disables); queries still running DB_CANCEL_GRACE seconds after it
+        # are cancelled from the client
+        self.statement_timeout = float(os.getenv('DB_STATEMENT_TIMEOUT', '30'))
+        self.cancel_grace = float(os.getenv('DB_CANCEL_GRACE', '1'))
+        self.watchdog = Watchdog("query-watchdog")
+
+        # Rows per multi-row INSERT when bulk loading MariaDB
+        self.load_batch_size = int(os.getenv('DB_LOAD_BATCH_SIZE', '5000'))
+        # Secondary indexes on test_table, e.g. "value,created_at"
+        self.indexes = dataset.parse_indexes(os.getenv('DB_INDEXES', ''))
+
+        # Readiness probing after container start
+        self.ready_timeout = float(os.getenv('DB_READY_TIMEOUT', '120'))
+        self.ready_initial_delay = 0.25
+        self.ready_max_delay = 5.0
+        self.startup_timings = {}
+
+        # Also capture the engine-reported execution time (runs each query twice)
+        self.engine_timing = os.getenv('DB_ENGINE_TIMING', '0') == '1'
+
+        # Result streaming: server-side cursors read in batches, and only the
+        # first display_cap rows are kept for display
+        self.server_side_cursors = os.getenv('DB_SERVER_SIDE_CURSORS', '1') == '1'
+        self.fetch_batch_size = int(os.getenv('DB_FETCH_BATCH_SIZE', '1000'))
+        self.display_cap = int(os.getenv('DB_RESULT_DISPLAY_CAP', '1000'))
+
+        # How queries with bind values are sent: literal, parameterized or prepared
+        self.query_mode = os.getenv('DB_QUERY_MODE', 'literal')
+        if self.query_mode not in QUERY_MODES:
+            raise ValueError(f"Unknown DB_QUERY_MODE: {self.query_mode}")
+
+        # Optional metrics.QueryMetrics that observes every run_query call
+        self.query_metrics = None
+
+        # Engines whose test_table has been written to since it was loaded
+        self.modified = set()
+        self._modified_lock = threading.Lock()
+
+    @property
+    def default_engine(self):
+        """Engine used when a feature flag treatment names no configured engine"""
+        return next(iter(self.engines))
+
+    def _connect(self, db_type):
+        """Open a new connection to the specified database"""
+        connector = self.connectors.get(db_type)
+        if connector is not None:
+            return connector()
+        return self.engines[db_type].connect()
+
+    def _query_connect(self, db_type):
+        """Open a connection for queries, with the statement timeout applied
+
+        Loading and readiness probes use _connect, so a large load is not
+        cut off by the timeout.
+        """
+        conn = self._connect(db_type)
+        if self.statement_timeout:
+            try:
+                self.engines[db_type].set_statement_timeout(conn, self.statement_timeout)
+            except Exception:
+                conn.close()
+                raise
+        return conn
+
+    @staticmethod
+    def _ping(conn):
+        """Health check used by the pools on checkout"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def get_pool(self, db_type):
+        """Return the connection pool for db_type, creating it on first use"""
+        pool = self.pools.get(db_type)
+        if pool is not None:
+            return pool
+        with self._pools_lock:
+            pool = self.pools.get(db_type)
+            if pool is None:
+                pool = ConnectionPool(
+                    db_type,
+                    lambda: self._query_connect(db_type),
+                    min_size=self.pool_min_size,
+                    max_size=self.pool_max_size,
+                    checkout_timeout=self.pool_checkout_timeout,
+                    health_check=self._ping,
+                    health_check_idle=self.pool_health_check_idle
+                )
+                pool.prefill()
+                self.pools[db_type] = pool
+            return pool
+
+    @contextmanager
+    def connection(self, db_type):
+        """Check out a connection according to the configured pool mode"""
+        if self.pool_mode == "per_query":
+            conn = self._query_connect(db_type)
+            try:
+                yield conn
+            finally:
+                conn.close()
+        else:
+            with self.get_pool(db_type).connection() as conn:
+                yield conn
+
+    def connection_state(self, db_type, conn):
+        """Per-connection dict (prepared statements); fresh for every per_query connection"""
+        if self.pool_mode == "per_query":
+            return {}
+        return self.get_pool(db_type).state(conn)
+
+    def pool_stats(self):
+        """Return counters for every open connection pool"""
+        return {db_type: pool.stats() for db_type, pool in self.pools.items()}
+
+    def admission_gate(self, db_type):
+        """The AdmissionGate limiting queries on db_type, created on first use, or None if disabled"""
+        gate = self.gates.get(db_type)
+        if gate is not None:
+            return gate
+        with self._pools_lock:
+            if db_type not in self.gates:
+                default, limits = self.max_concurrent
+                limit = limits.get(db_type, default)
+                # The pool size is read here so tools that enlarge the pool also raise the limit
+                limit = self.pool_max_size if limit is None else limit
+                if limit > 0:
+                    default, queues = self.admission_queue
+                    queue = queues.get(db_type, default)
+                    self.gates[db_type] = AdmissionGate(
+                        db_type, limit,
+                        max_queue=limit if queue is None else queue,
+                        queue_timeout=self.admission_timeout
+                    )
+                else:
+                    self.gates[db_type] = None
+            return self.gates[db_type]
+
+    def admission_stats(self):
+        """Return counters for every admission gate in use"""
+        return {db_type: gate.stats() for db_type, gate in self.gates.items() if gate is not None}
+
+    def close_pools(self):
+        """Close all connection pools"""
+        with self._pools_lock:
+            pools = self.pools
+            self.pools = {}
+        for pool in pools.values():
+            pool.close()
+
+    def wait_until_ready(self, db_type, timeout=None):
+        """Probe db_type with connect and SELECT 1 until it answers
+
+        Retries with exponential backoff and raises TimeoutError once the
+        overall deadline has passed. Returns the number of attempts made.
+        """
+        timeout = self.ready_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        delay = self.ready_initial_delay
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                conn = self._connect(db_type)
+                try:
+                    self._ping(conn)
+                finally:
+                    conn.close()
+                return attempts
+            except Exception as e:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"{db_type} not ready after {timeout:.0f}s ({attempts} attempts): {e}"
+                    ) from e
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, self.ready_max_delay)
+
+    def _start_and_wait(self, db_type):
+        """Start one database and block until it is ready, returning phase timings"""
+        start_time = time.perf_counter()
+        self.engines[db_type].start(self.runner)
+        started = time.perf_counter()
+        attempts = self.wait_until_ready(db_type)
+        ready = time.perf_counter()
+        timings = {
+            "container_start": started - start_time,
+            "ready_wait": ready - started,
+            "total": ready - start_time,
+            "probe_attempts": attempts
+        }
+        print(f"{db_type} ready in {timings['total']:.1f}s "
+              f"(container {timings['container_start']:.1f}s, "
+              f"readiness {timings['ready_wait']:.1f}s, {attempts} probes)")
+        return timings
+
+    def ensure_containers_running(self):
+        """Start every engine in parallel and wait until each accepts queries
+
+        Embedded engines have nothing to start and are ready at once.
+        """
+        if self.containers_started:
+            return
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(self.engines)) as executor:
+            futures = {
+                db_type: executor.submit(self._start_and_wait, db_type)
+                for db_type in self.engines
+            }
+            # Wait for all and surface the first failure
+            timings = {db_type: future.result() for db_type, future in futures.items()}
+
+        timings["total"] = time.perf_counter() - start_time
+        self.startup_timings = timings
+        print(f"Databases ready in {timings['total']:.1f}s")
+        self.containers_started = True
+
+    def load_test_data(self, data_size=100000):
+        """Load the same generated dataset into every database in parallel
+
+        data_size is a row count or a scale factor name such as "10m". The
+        dataset is generated once and cached on disk; a database whose
+        dataset_meta checksum already matches it is not reloaded.
+        """
+        if self.data_loaded:
+            return
+
+        start_time = time.time()
+        data = dataset.prepare(data_size)
+        print(f"Loading test data with {data.size} records...")
+
+        with ThreadPoolExecutor(max_workers=len(self.engines)) as executor:
+            futures = [executor.submit(self._load, db_type, data) for db_type in self.engines]
+            # Wait for all loads and surface the first failure
+            for future in futures:
+                future.result()
+
+        total_time = time.time() - start_time
+        peak_mb = bulk_loader.peak_memory_mb()
+        peak = f", peak memory {peak_mb:.0f} MB" if peak_mb is not None else ""
+        print(f"Test data ready in all databases in {total_time:.1f}s{peak}.")
+        self.data_loaded = True
+
+    def _report_load(self, db_type, rows, elapsed):
+        rate = rows / elapsed if elapsed > 0 else 0
+        print(f"{db_type}: loaded {rows} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec)")
+
+    def _load(self, db_type, data):
+        """Bring one engine's test table in line with data and the configured indexes"""
+        engine = self.engines[db_type]
+        conn = self._connect(db_type)
+        try:
+            stored = engine.stored_dataset(conn)
+            indexes = ",".join(self.indexes)
+            if stored is not None and stored[0] == data.checksum:
+                if stored[1] != indexes:
+                    engine.set_indexes(conn, self.indexes)
+                    engine.record_dataset(conn, data, self.indexes)
+                    print(f"{db_type}: data already loaded, indexes changed to {indexes or 'none'}")
+                else:
+                    print(f"{db_type}: data already loaded (checksum matches), skipping")
+                return
+
+            # Forget the old checksum first so an interrupted load is redone
+            engine.forget_dataset(conn)
+            start_time = time.time()
+            rows = engine.bulk_load(conn, data, self.load_batch_size)
+            self._report_load(db_type, rows, time.time() - start_time)
+            if self.indexes:
+                index_start = time.time()
+                engine.set_indexes(conn, self.indexes)
+                print(f"{db_type}: built indexes on {indexes} in {time.time() - index_start:.1f}s")
+            engine.record_dataset(conn, data, self.indexes)
+            with self._modified_lock:
+                self.modified.discard(db_type)
+        finally:
+            conn.close()
+
+    def run_query(self, query, db_type, engine_timing=None, max_rows=None, params=None, mode=None):
+        """Run query on specified database and return results with per-phase timings
+
+        Rows are read in fetchmany batches from a server-side cursor and
+        counted to the end, but only the first max_rows (default
+        DB_RESULT_DISPLAY_CAP) are kept, so memory does not grow with the
+        result size.
+
+        Phases are measured with perf_counter_ns and reported in milliseconds:
+        checkout (pool checkout, or connect in per_query mode), execute
+        (cursor.execute until the first batch of rows has arrived), fetch
+        (reading the remaining batches, including the driver's type
+        conversion) and decode (copying kept rows and column names into plain
+        Python objects for rendering). With engine_timing the query is run a
+        second time under the engine's EXPLAIN ANALYZE (Engine.explain) to
+        capture the server-reported planning and execution time.
+
+        With params, query is a pyformat template (queries.QUERY_TEMPLATES)
+        sent according to mode (default DB_QUERY_MODE): "literal" inlines the
+        values, "parameterized" passes them to the driver, and "prepared"
+        uses a server-side prepared statement cached per pooled connection.
+        The prepare phase is the PREPARE itself, so it is zero once the
+        statement is cached and in the other modes. Engines without
+        server-side prepared statements fall back to parameterized; the
+        mode actually used is returned.
+
+        The query is first rewritten for the engine's dialect (Engine.adapt_query).
+
+        Queries pass db_type's admission gate first and raise
+        admission.QueryRejected when it is full. A query cancelled by the
+        statement timeout, on the server or by the watchdog, raises
+        admission.QueryTimeout. An unknown mode raises ValueError.
+        """
+        if mode is not None and mode not in QUERY_MODES:
+            raise ValueError(f"Unknown query mode {mode!r}; use one of {', '.join(QUERY_MODES)}")
+
+        def run():
+            gate = self.admission_gate(db_type)
+            if gate is None:
+                return self._run_query(query, db_type, engine_timing, max_rows, params, mode)
+            with gate.slot():
+                return self._run_query(query, db_type, engine_timing, max_rows, params, mode)
+
+        if self.query_metrics is None:
+            return run()
+        return self.query_metrics.track(db_type, query, run)
+
+    def _run_query(self, query, db_type, engine_timing, max_rows, params, mode):
+        if engine_timing is None:
+            engine_timing = self.engine_timing
+        if max_rows is None:
+            max_rows = self.display_cap
+        batch_size = self.fetch_batch_size
+        engine = self.engines[db_type]
+
+        literal = query if params is None else render(query, params)
+        mode = "literal" if params is None else (mode or self.query_mode)
+        if mode == "prepared" and not engine.supports_prepare:
+            mode = "parameterized"
+        if mode == "literal":
+            statement = engine.adapt_query(literal)
+        else:
+            statement = engine.adapt_query(engine.bind_style(query))
+
+        start = time.perf_counter_ns()
+        with self.connection(db_type) as conn:
+            checked_out = time.perf_counter_ns()
+            prepared = checked_out
+            server_side = self.server_side_cursors and is_select(literal) and (
+                mode != "prepared" or engine.server_side_prepared
+            )
+            # Client-side backstop for engines without a server timeout and
+            # for servers that fail to enforce it
+            watch = None
+            if self.statement_timeout:
+                watch = self.watchdog.watch(
+                    self.statement_timeout + self.cancel_grace,
+                    lambda: engine.cancel(conn, lambda: self._connect(db_type))
+                )
+            cursor = engine.open_cursor(conn, statement, server_side, batch_size)
+            try:
+                if mode == "prepared":
+                    statements = self.connection_state(db_type, conn).setdefault("statements", {})
+                    entry = statements.get(query)
+                    if entry is None:
+                        # The PREPARE goes through a plain cursor; named
+                        # cursors can only run a single query
+                        prepare_cursor = conn.cursor()
+                        try:
+                            name = f"stmt_{len(statements) + 1}"
+                            entry = statements[query] = (name, engine.prepare(prepare_cursor, name, query))
+                        finally:
+                            prepare_cursor.close()
+                    prepared = time.perf_counter_ns()
+                    engine.execute_prepared(cursor, entry[0], entry[1], params)
+                elif mode == "parameterized":
+                    engine.execute(cursor, statement, params)
+                else:
+                    engine.execute(cursor, statement)
+                # Named cursors have no description until the first fetch;
+                # statements without a result set never get one
+                has_rows = cursor.description is not None or getattr(cursor, "name", None)
+                batch = cursor.fetchmany(batch_size) if has_rows else []
+                first_batch = time.perf_counter_ns()
+
+                results = []
+                row_count = 0
+                decode_ns = 0
+                while batch:
+                    row_count += len(batch)
+                    if len(results) < max_rows:
+                        decode_start = time.perf_counter_ns()
+                        results.extend(tuple(row) for row in batch[:max_rows - len(results)])
+                        decode_ns += time.perf_counter_ns() - decode_start
+                    batch = cursor.fetchmany(batch_size)
+                fetched = time.perf_counter_ns()
+
+                column_names = [desc[0] for desc in cursor.description] if cursor.description else []
+                decoded = time.perf_counter_ns()
+            except Exception as e:
+                if (watch is not None and watch.fired) or engine.classify_error(e) == "timeout":
+                    raise QueryTimeout(
+                        f"{db_type} query cancelled after the {self.statement_timeout:g}s statement timeout"
+                    ) from e
+                raise
+            finally:
+                if watch is not None:
+                    self.watchdog.discard(watch)
+                cursor.close()
+
+            engine_time = None
+            if engine_timing and is_select(literal):
+                try:
+                    engine_time = engine.explain(conn, engine.adapt_query(literal))
+                except Exception as e:
+                    engine_time = {"error": str(e)}
+
+        phases = {
+            "checkout": (checked_out - start) / 1e6,
+            "prepare": (prepared - checked_out) / 1e6,
+            "execute": (first_batch - prepared) / 1e6,
+            "fetch": (fetched - first_batch - decode_ns) / 1e6,
+            "decode": (decoded - fetched + decode_ns) / 1e6
+        }
+        return {
+            # Server execution plus result transfer, as reported before phases existed
+            "execution_time": (phases["execute"] + phases["fetch"]) / 1000,
+            "phases": phases,
+            "engine_time": engine_time,
+            "results": results,
+            "column_names": column_names,
+            "row_count": row_count,
+            "truncated": row_count > len(results),
+            "query": literal,
+            "mode": mode
+        }
+
+    def run_paired(self, query, db_types=("postgres", "mariadb"), engine_timing=None, params=None, mode=None):
+        """Run the same query on several databases at the same moment
+
+        Every pair gets threads of its own: the first database runs on the
+        calling thread and each other one on a thread started for it, so
+        concurrent pairs never queue behind each other. A barrier releases
+        them together, so both sides see the same instant of host load.
+        Returns {db_type: result}. A failure is raised with the failing
+        database in its database attribute.
+        """
+        barrier = threading.Barrier(len(db_types))
+        results = {}
+        errors = {}
+
+        def run(db_type):
+            try:
+                barrier.wait()
+                results[db_type] = self.run_query(query, db_type, engine_timing, None, params, mode)
+            except Exception as e:
+                errors[db_type] = e
+
+        threads = [
+            threading.Thread(target=run, args=(db_type,), name=f"paired-{db_type}", daemon=True)
+            for db_type in db_types[1:]
+        ]
+        for thread in threads:
+            thread.start()
+        run(db_types[0])
+        for thread in threads:
+            thread.join()
+        for db_type in db_types:
+            if db_type in errors:
+                try:
+                    errors[db_type].database = db_type
+                except AttributeError:
+                    pass
+                raise errors[db_type]
+        return {db_type: results[db_type] for db_type in db_types}
+
+    def run_transaction(self, db_type, statements, isolation=None, rollback=False):
+        """Run statements as one transaction and report how it ended
+
+        Args:
+            db_type: Engine to run on
+            statements: List of (sql, params) pairs; sql is a pyformat
+                template, sent with its params as bind values
+            isolation: Isolation level such as "repeatable read" (default:
+                the engine's), ignored by engines with a single fixed level
+            rollback: Roll back after the last statement instead of
+                committing, as an application-level abort
+
+        The first write to an engine drops its dataset_meta checksum, so the
+        next load_test_data reloads the unmodified data.
+
+        Transactions pass db_type's admission gate like queries; when it is
+        full the outcome is "rejected".
+
+        Returns a dict with the outcome ("commit", "rollback", "deadlock",
+        "serialization", "lock_timeout", "timeout", "rejected" or "error"),
+        the wall time in seconds and the error message. Conflicts and other
+        failures are rolled back and reported rather than raised.
+        """
+        engine = self.engines[db_type]
+        if len(engine.isolation_levels) == 1:
+            isolation = None
+        elif isolation and isolation not in engine.isolation_levels:
+            raise ValueError(f"{db_type} does not support isolation level {isolation}")
+
+        gate = self.admission_gate(db_type)
+        if gate is None:
+            return self._run_transaction(db_type, engine, statements, isolation, rollback)
+        start = time.perf_counter_ns()
+        try:
+            gate.acquire()
+        except QueryRejected as e:
+            return {"outcome": "rejected", "time": (time.perf_counter_ns() - start) / 1e9, "error": str(e)}
+        try:
+            return self._run_transaction(db_type, engine, statements, isolation, rollback)
+        finally:
+            gate.release()
+
+    def _run_transaction(self, db_type, engine, statements, isolation, rollback):
+        with self.connection(db_type) as conn:
+            with self._modified_lock:
+                if db_type not in self.modified:
+                    engine.forget_dataset(conn)
+                    self.modified.add(db_type)
+
+            start = time.perf_counter_ns()
+            cursor = conn.cursor()
+            try:
+                engine.begin(cursor, isolation)
+                for sql, params in statements:
+                    engine.execute(cursor, engine.adapt_query(engine.bind_style(sql)), params)
+                    if cursor.description is not None:
+                        cursor.fetchall()
+                if rollback:
+                    conn.rollback()
+                    outcome = "rollback"
+                else:
+                    conn.commit()
+                    outcome = "commit"
+                error = None
+            except Exception as e:
+                conn.rollback()
+                outcome = engine.classify_error(e) or "error"
+                error = str(e)
+            finally:
+                cursor.close()
+            elapsed = (time.perf_counter_ns() - start) / 1e9
+
+        return {"outcome": outcome, "time": elapsed, "error": error}
+
+    def cleanup(self):
+        """Close connection pools, then stop and remove containers and database files"""
+        self.close_pools()
+        if not self.containers_started:
+            return
+            
+        print("Cleaning up databases...")
+        for engine in self.engines.values():
+            engine.teardown(self.runner)
+        print("Cleanup complete.")
+        self.containers_started = False
+        self.data_loaded = False
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# Bump when the generated rows change so cached files and loaded tables are rebuilt
+GENERATOR_VERSION = 1
+
+# Named dataset sizes accepted wherever a row count is
+SCALE_FACTORS = {
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+    "100m": 100_000_000
+}
+
+# Secondary indexes that can be created on test_table
+INDEX_COLUMNS = ("value", "created_at")
+
+COLUMNS = ("name", "value", "created_at")
+
+START = pd.Timestamp("2023-01-01")
+# created_at advances one hour per row and wraps after 50 years of hours,
+# which keeps it inside MariaDB's DATETIME range at any scale while every
+# hour of the day still gets an equal share of rows
+HOUR_WRAP = 24 * 365 * 50
+# value wraps below the NUMERIC(10,2) limit; rows under 6.6M never reach it
+VALUE_WRAP = 10_000_000
+
+
+def resolve_size(spec):
+    """Row count for a scale factor name ("1m") or a plain number"""
+    if isinstance(spec, int):
+        return spec
+    spec = str(spec).strip().lower()
+    if spec in SCALE_FACTORS:
+        return SCALE_FACTORS[spec]
+    try:
+        return int(float(spec))
+    except ValueError:
+        raise ValueError(f"Unknown dataset size: {spec} (use a number or one of {', '.join(SCALE_FACTORS)})")
+
+
+def parse_indexes(spec):
+    """Tuple of index columns from a comma-separated list; "" or "none" means no indexes"""
+    if not spec or spec.strip().lower() == "none":
+        return ()
+    columns = tuple(column.strip() for column in spec.split(",") if column.strip())
+    for column in columns:
+        if column not in INDEX_COLUMNS:
+            raise ValueError(f"Cannot index {column}; choose from {', '.join(INDEX_COLUMNS)}")
+    return columns
+
+
+def generate_chunks(data_size, chunk_size=1_000_000):
+    """Yield DataFrames of (name, value, created_at) covering rows 0..data_size-1
+
+    Every engine loads exactly these rows: item{i}, i * 1.5 and
+    2023-01-01 + i hours, wrapped as described above.
+    """
+    for start in range(0, data_size, chunk_size):
+        index = np.arange(start, min(start + chunk_size, data_size), dtype=np.int64)
+        yield pd.DataFrame({
+            "name": "item" + pd.Series(index).astype(str),
+            "value": (index * 1.5) % VALUE_WRAP,
+            "created_at": START + pd.to_timedelta(index % HOUR_WRAP, unit="h")
+        })
+
+
+class Dataset:
+    """A generated dataset stored as a tab-separated file (COPY text format)"""
+    def __init__(self, size, path, checksum):
+        self.size = size
+        self.path = path
+        self.checksum = checksum
+
+    def rows(self):
+        """Yield (name, value, created_at) string tuples read back from the file"""
+        with open(self.path) as f:
+            for line in f:
+                yield tuple(line.rstrip("\n").split("\t"))
+
+
+def prepare(data_size, cache_dir=None, chunk_size=1_000_000):
+    """Return the Dataset for data_size rows, generating it unless it is cached
+
+    The file and a small JSON sidecar with its SHA-256 live in cache_dir
+    (DB_DATASET_CACHE, by default a directory in the system temp dir), so
+    later runs and other processes reuse them.
+    """
+    data_size = resolve_size(data_size)
+    cache_dir = cache_dir or os.getenv('DB_DATASET_CACHE') or os.path.join(
+        tempfile.gettempdir(), "db-speed-test-datasets"
+    )
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"test_table_v{GENERATOR_VERSION}_{data_size}.tsv")
+    meta_path = f"{path}.json"
+
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("size") == data_size and os.path.getsize(path) == meta.get("bytes"):
+            print(f"Using cached dataset {path}")
+            return Dataset(data_size, path, meta["checksum"])
+
+    print(f"Generating dataset with {data_size} rows...")
+    start_time = time.time()
+    digest = hashlib.sha256()
+    written = 0
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in generate_chunks(data_size, chunk_size):
+            data = chunk.to_csv(
+                sep="\t", header=False, index=False, float_format="%.2f",
+                date_format="%Y-%m-%d %H:%M:%S"
+            ).encode()
+            digest.update(data)
+            f.write(data)
+            written += len(data)
+    # Include the version so a generator change never matches an old load
+    checksum = f"v{GENERATOR_VERSION}-{digest.hexdigest()}"
+    os.replace(tmp_path, path)
+    with open(meta_path, "w") as f:
+        json.dump({"size": data_size, "bytes": written, "checksum": checksum}, f)
+    print(f"Generated {data_size} rows ({written / 1e6:.0f} MB) in {time.time() - start_time:.1f}s")
+    return Dataset(data_size, path, checksum)
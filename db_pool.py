@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection could be checked out before the timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections for a single backend"""
+    def __init__(self, name, connect, min_size=1, max_size=10, checkout_timeout=30.0,
+                 health_check=None, health_check_idle=0.0):
+        """Initialize the pool
+
+        Args:
+            name: Backend name, used in log messages and stats
+            connect: Callable returning a new DB-API connection
+            min_size: Connections opened eagerly by prefill()
+            max_size: Hard upper bound on open connections
+            checkout_timeout: Seconds to wait for a free connection before giving up
+            health_check: Callable(conn) that raises if the connection is unusable
+            health_check_idle: Only health check connections idle at least this many seconds
+        """
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size for {name}: min={min_size}, max={max_size}")
+        self.name = name
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check = health_check
+        self.health_check_idle = health_check_idle
+
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, last_used) pairs, most recently used last
+        self._size = 0
+        self._closed = False
+        # Per-connection state (e.g. prepared statement caches) by id(conn)
+        self._state = {}
+
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.exhausted = 0
+        self.timeouts = 0
+        self.reconnects = 0
+
+    def prefill(self):
+        """Open connections until min_size are available"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            self.release(conn)
+
+    def acquire(self):
+        """Check out a healthy connection, opening or waiting for one as needed"""
+        start = time.perf_counter()
+        conn = None
+        last_used = None
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolExhaustedError(f"{self.name} pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                if not waited:
+                    self.exhausted += 1
+                    waited = True
+                remaining = self.checkout_timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolExhaustedError(
+                        f"Timed out after {self.checkout_timeout}s waiting for a {self.name} connection"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            if conn is None:
+                conn = self.connect()
+            elif not self._is_healthy(conn, last_used):
+                self._close_quietly(conn)
+                conn = self.connect()
+                with self._cond:
+                    self.reconnects += 1
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        wait = time.perf_counter() - start
+        with self._cond:
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it if discard is set"""
+        if not discard:
+            try:
+                # End any transaction the caller left open so the next user
+                # starts from a fresh snapshot
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard or self._closed:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks out a connection and always returns it"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            # release() rolls back and discards the connection if that fails,
+            # so a broken connection is never handed out again
+            self.release(conn)
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Return a snapshot of the pool counters"""
+        with self._cond:
+            return {
+                "name": self.name,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "checkouts": self.checkouts,
+                "checkout_wait_total": self.checkout_wait_total,
+                "checkout_wait_avg": self.checkout_wait_total / self.checkouts if self.checkouts else 0.0,
+                "checkout_wait_max": self.checkout_wait_max,
+                "exhausted": self.exhausted,
+                "timeouts": self.timeouts,
+                "reconnects": self.reconnects,
+            }
+
+    def _is_healthy(self, conn, last_used):
+        if self.health_check is None:
+            return True
+        if last_used is not None and time.monotonic() - last_used < self.health_check_idle:
+            return True
+        try:
+            self.health_check(conn)
+            return True
+        except Exception as e:
+            print(f"{self.name} pool: discarding unhealthy connection: {e}")
+            return False
+
+    def state(self, conn):
+        """Dict of caller state that lives exactly as long as the pooled connection"""
+        with self._cond:
+            return self._state.setdefault(id(conn), {})
+
+    def _close_quietly(self, conn):
+        with self._cond:
+            self._state.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,669 @@
+#!/usr/bin/env python3
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import tempfile
+import uuid
+from datetime import datetime
+import bulk_loader
+from dataset import COLUMNS, INDEX_COLUMNS
+
+# Database drivers are optional so the embedded engines work without them
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+try:
+    import mysql.connector
+except ImportError:
+    mysql = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+# Engine classes by name, filled in by @register
+ENGINES = {}
+
+
+def register(cls):
+    """Class decorator adding an Engine subclass to the registry"""
+    ENGINES[cls.name] = cls
+    return cls
+
+
+def available_engines():
+    """Names of registered engines whose driver is installed"""
+    return [name for name, cls in ENGINES.items() if cls.is_available()]
+
+
+def create_engine(name, **settings):
+    """Instantiate a registered engine, passing settings to its constructor"""
+    cls = ENGINES.get(name)
+    if cls is None:
+        raise ValueError(f"Unknown database engine: {name} (known: {', '.join(ENGINES)})")
+    if not cls.is_available():
+        raise ValueError(f"Database engine {name} is not available; is its driver installed?")
+    return cls(**settings)
+
+
+# %(name)s placeholders in query templates
+_PYFORMAT = re.compile(r"%\((\w+)\)s")
+
+
+def positional(sql, marker):
+    """Replace %(name)s placeholders with positional markers
+
+    marker is a format string given the 1-based position ("${}" or "?").
+    Returns the rewritten SQL and the parameter names in marker order.
+    """
+    names = []
+
+    def replace(match):
+        names.append(match.group(1))
+        return marker.format(len(names))
+
+    return _PYFORMAT.sub(replace, sql).replace("%%", "%"), names
+
+
+class Engine:
+    """A database backend: how to start, connect to, load, query and tear it down
+
+    Subclasses set name and override the methods that differ; the defaults
+    are plain DB-API calls.
+    """
+    name = None
+    # Whether the engine runs in a container that has to be started first
+    container = False
+    # DB-API parameter marker of the driver
+    placeholder = "%s"
+    # Whether prepare()/execute_prepared() use server-side prepared statements
+    supports_prepare = False
+    # Whether a prepared statement's rows can be read through a server-side cursor
+    server_side_prepared = True
+    # Isolation levels begin() accepts; engines with a single fixed level list only that
+    isolation_levels = ("read uncommitted", "read committed", "repeatable read", "serializable")
+
+    def __init__(self, database_name="performance_test"):
+        self.database_name = database_name
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def connect(self):
+        """Open a new DB-API connection"""
+        raise NotImplementedError
+
+    def start(self, runner):
+        """Make the database reachable (start its container); runner is subprocess.run-compatible"""
+
+    def teardown(self, runner):
+        """Stop the database and remove its storage"""
+
+    def create_table(self, cursor):
+        """Drop and recreate test_table"""
+        raise NotImplementedError
+
+    def bulk_load(self, conn, dataset, batch_size):
+        """Recreate test_table and fill it from a dataset.Dataset, returning the row count"""
+        cursor = conn.cursor()
+        try:
+            self.create_table(cursor)
+            rows = bulk_loader.insert_batches(
+                cursor, "test_table", COLUMNS, dataset.rows(),
+                batch_size=batch_size, placeholder=self.placeholder
+            )
+            conn.commit()
+            return rows
+        finally:
+            cursor.close()
+
+    def drop_index_sql(self, name):
+        return f"DROP INDEX IF EXISTS {name}"
+
+    def set_indexes(self, conn, columns):
+        """Create secondary indexes on the given test_table columns and drop the others"""
+        cursor = conn.cursor()
+        try:
+            for column in INDEX_COLUMNS:
+                name = f"idx_test_table_{column}"
+                cursor.execute(self.drop_index_sql(name))
+                if column in columns:
+                    cursor.execute(f"CREATE INDEX {name} ON test_table ({column})")
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def stored_dataset(self, conn):
+        """(checksum, indexes) recorded by the last completed load, or None"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT checksum, indexes FROM dataset_meta")
+            row = cursor.fetchone()
+            cursor.fetchall()
+            return (row[0], row[1]) if row else None
+        except Exception:
+            # No dataset_meta table yet
+            conn.rollback()
+            return None
+        finally:
+            cursor.close()
+
+    def forget_dataset(self, conn):
+        """Drop the recorded checksum so the next start reloads the data"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DROP TABLE IF EXISTS dataset_meta")
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def record_dataset(self, conn, dataset, indexes):
+        """Store the checksum and index set of the data now in test_table"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DROP TABLE IF EXISTS dataset_meta")
+            cursor.execute("""
+                CREATE TABLE dataset_meta (
+                    checksum VARCHAR(80),
+                    row_count BIGINT,
+                    indexes VARCHAR(100),
+                    loaded_at VARCHAR(32)
+                )
+            """)
+            marks = ", ".join([self.placeholder] * 4)
+            cursor.execute(
+                f"INSERT INTO dataset_meta (checksum, row_count, indexes, loaded_at) VALUES ({marks})",
+                (dataset.checksum, dataset.size, ",".join(indexes), datetime.now().isoformat(" ", "seconds"))
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def adapt_query(self, query):
+        """Rewrite query for this engine's SQL dialect"""
+        return query
+
+    def open_cursor(self, conn, query, server_side, batch_size):
+        """Cursor to run query with; server_side asks for rows to be streamed in batches"""
+        return conn.cursor()
+
+    def bind_style(self, sql):
+        """Convert a pyformat template (%(name)s) to the driver's paramstyle"""
+        return sql
+
+    def execute(self, cursor, query, params=None):
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+
+    def prepare(self, cursor, name, sql):
+        """PREPARE sql (a pyformat template) as name; returns the parameter names in marker order"""
+        raise NotImplementedError(f"{self.name} has no server-side prepared statements")
+
+    def execute_prepared(self, cursor, name, param_names, params):
+        raise NotImplementedError(f"{self.name} has no server-side prepared statements")
+
+    def explain(self, conn, query):
+        """Planning and execution time in ms as reported by the engine itself"""
+        raise NotImplementedError(f"{self.name} does not report execution times")
+
+    def begin(self, cursor, isolation=None):
+        """Start a transaction, at the given isolation level if set
+
+        The DB-API drivers open a transaction implicitly with the first
+        statement, so only the isolation level has to be set beforehand.
+        """
+        if isolation:
+            cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {isolation.upper()}")
+
+    def classify_error(self, error):
+        """"deadlock", "serialization" or "lock_timeout" for a transaction conflict,
+        "timeout" for a statement cancelled by its timeout or cancel(), None otherwise"""
+        return None
+
+    def set_statement_timeout(self, conn, seconds):
+        """Make the server abort statements on conn that run longer than seconds
+
+        Returns False for engines without a server-side limit; their queries
+        are only stopped by cancel().
+        """
+        return False
+
+    def cancel(self, conn, connect):
+        """Interrupt the statement running on conn; called from another thread
+
+        connect is a zero-argument callable opening a new connection to the
+        same database, for engines that cancel through a second connection.
+        """
+
+
+class ContainerEngine(Engine):
+    """Engine running in a podman container published on a local port"""
+    container = True
+    image = None
+    container_port = None
+
+    def __init__(self, database_name="performance_test", container_name=None, port=None, password=None):
+        super().__init__(database_name)
+        self.container_name = container_name or f"{self.name}-test"
+        self.port = port or self.container_port
+        self.password = password or self.name
+
+    def container_env(self):
+        """Environment variables passed to the container"""
+        raise NotImplementedError
+
+    def container_command(self):
+        """podman run arguments for this engine's container"""
+        command = ["podman", "run", "--name", self.container_name]
+        for key, value in self.container_env().items():
+            command += ["-e", f"{key}={value}"]
+        return command + ["-p", f"{self.port}:{self.container_port}", "-d", self.image]
+
+    def start(self, runner):
+        """Start the container unless it is already running"""
+        print(f"Starting {self.name} container...")
+        try:
+            # Check if container exists and is running
+            result = runner(["podman", "ps", "-q", "-f", f"name={self.container_name}"],
+                            capture_output=True, text=True)
+            if not result.stdout.strip():
+                # Container not running, start it
+                runner(self.container_command(), check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error starting {self.name} container: {e}")
+            raise
+
+    def teardown(self, runner):
+        runner(["podman", "stop", self.container_name], check=False)
+        runner(["podman", "rm", self.container_name], check=False)
+
+
+@register
+class PostgresEngine(ContainerEngine):
+    name = "postgres"
+    image = "postgres:latest"
+    container_port = 5432
+    supports_prepare = True
+    # DECLARE ... CURSOR cannot wrap EXECUTE
+    server_side_prepared = False
+
+    @classmethod
+    def is_available(cls):
+        return psycopg2 is not None
+
+    def container_env(self):
+        return {"POSTGRES_PASSWORD": self.password, "POSTGRES_DB": self.database_name}
+
+    def connect(self):
+        return psycopg2.connect(
+            host="localhost",
+            port=self.port,
+            database=self.database_name,
+            user="postgres",
+            password=self.password
+        )
+
+    def create_table(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS test_table;")
+        cursor.execute("""
+            CREATE TABLE test_table (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(50),
+                value NUMERIC(10,2),
+                created_at TIMESTAMP
+            );
+        """)
+
+    def bulk_load(self, conn, dataset, batch_size):
+        """Recreate test_table and stream the dataset file in with COPY"""
+        cursor = conn.cursor()
+        try:
+            self.create_table(cursor)
+            bulk_loader.copy_file(cursor, "test_table", COLUMNS, dataset.path)
+            conn.commit()
+            return dataset.size
+        finally:
+            cursor.close()
+
+    def open_cursor(self, conn, query, server_side, batch_size):
+        if not server_side:
+            return conn.cursor()
+        # A named cursor is a server-side DECLARE ... CURSOR; rows stay on
+        # the server until fetched
+        cursor = conn.cursor(name=f"run_query_{uuid.uuid4().hex}")
+        cursor.itersize = batch_size
+        return cursor
+
+    def prepare(self, cursor, name, sql):
+        statement, names = positional(sql, "${}")
+        cursor.execute(f"PREPARE {name} AS {statement}")
+        return names
+
+    def execute_prepared(self, cursor, name, param_names, params):
+        if not param_names:
+            cursor.execute(f"EXECUTE {name}")
+        else:
+            markers = ", ".join(["%s"] * len(param_names))
+            cursor.execute(f"EXECUTE {name} ({markers})", [params[p] for p in param_names])
+
+    def classify_error(self, error):
+        return {
+            "40P01": "deadlock",
+            "40001": "serialization",
+            "55P03": "lock_timeout",
+            # query_canceled, by statement_timeout or cancel()
+            "57014": "timeout"
+        }.get(getattr(error, "pgcode", None))
+
+    def set_statement_timeout(self, conn, seconds):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SET statement_timeout = {int(seconds * 1000)}")
+            # A SET inside a transaction that is rolled back is undone
+            conn.commit()
+        finally:
+            cursor.close()
+        return True
+
+    def cancel(self, conn, connect):
+        conn.cancel()
+
+    def explain(self, conn, query):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}")
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            plan = plan[0]
+            return {
+                "planning": plan.get("Planning Time"),
+                "execution": plan.get("Execution Time")
+            }
+        finally:
+            cursor.close()
+
+
+@register
+class MariaDBEngine(ContainerEngine):
+    name = "mariadb"
+    image = "mariadb:latest"
+    container_port = 3306
+    supports_prepare = True
+
+    @classmethod
+    def is_available(cls):
+        return mysql is not None
+
+    def container_env(self):
+        return {"MYSQL_ROOT_PASSWORD": self.password, "MYSQL_DATABASE": self.database_name}
+
+    def connect(self):
+        return mysql.connector.connect(
+            host="localhost",
+            port=self.port,
+            database=self.database_name,
+            user="root",
+            password=self.password
+        )
+
+    def create_table(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS test_table;")
+        cursor.execute("""
+            CREATE TABLE test_table (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(50),
+                value DECIMAL(10,2),
+                created_at DATETIME
+            );
+        """)
+
+    def drop_index_sql(self, name):
+        return f"DROP INDEX IF EXISTS {name} ON test_table"
+
+    def open_cursor(self, conn, query, server_side, batch_size):
+        if not server_side:
+            return conn.cursor()
+        # Unbuffered: rows are read off the socket as they are fetched
+        return conn.cursor(buffered=False)
+
+    def prepare(self, cursor, name, sql):
+        # SQL-level PREPARE/EXECUTE so the statement works with the
+        # unbuffered cursors used for streaming
+        statement, names = positional(sql, "?")
+        cursor.execute(f"PREPARE {name} FROM %s", (statement,))
+        return names
+
+    def execute_prepared(self, cursor, name, param_names, params):
+        if not param_names:
+            cursor.execute(f"EXECUTE {name}")
+        else:
+            markers = ", ".join(["%s"] * len(param_names))
+            cursor.execute(f"EXECUTE {name} USING {markers}", [params[p] for p in param_names])
+
+    def classify_error(self, error):
+        # 1020 is "Record has changed since last read" under innodb_snapshot_isolation
+        return {
+            1213: "deadlock",
+            1020: "serialization",
+            1205: "lock_timeout",
+            # max_statement_time exceeded, and KILL QUERY from cancel()
+            1969: "timeout",
+            1317: "timeout"
+        }.get(getattr(error, "errno", None))
+
+    def set_statement_timeout(self, conn, seconds):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SET SESSION max_statement_time = {seconds:g}")
+        finally:
+            cursor.close()
+        return True
+
+    def cancel(self, conn, connect):
+        # The connection is busy, so the KILL goes through a second one
+        killer = connect()
+        try:
+            cursor = killer.cursor()
+            cursor.execute(f"KILL QUERY {conn.connection_id}")
+            cursor.close()
+        finally:
+            killer.close()
+
+    def explain(self, conn, query):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"ANALYZE FORMAT=JSON {query}")
+            analysis = json.loads(cursor.fetchone()[0])
+            cursor.fetchall()
+            return {
+                "planning": analysis.get("query_optimization", {}).get("r_total_time_ms"),
+                "execution": analysis.get("query_block", {}).get("r_total_time_ms")
+            }
+        finally:
+            cursor.close()
+
+
+class EmbeddedEngine(Engine):
+    """In-process engine storing the database in a local file; needs no container"""
+    extension = None
+
+    def __init__(self, database_name="performance_test", path=None):
+        super().__init__(database_name)
+        self.path = path or os.path.join(tempfile.gettempdir(), f"{database_name}.{self.extension}")
+
+    def teardown(self, runner):
+        for path in (self.path, f"{self.path}-journal", f"{self.path}-wal", f"{self.path}.wal"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# EXTRACT(HOUR FROM col), which SQLite does not support
+_EXTRACT_HOUR = re.compile(r"EXTRACT\(\s*HOUR\s+FROM\s+(\w+)\s*\)", re.IGNORECASE)
+
+
+@register
+class SQLiteEngine(EmbeddedEngine):
+    name = "sqlite"
+    extension = "sqlite"
+    placeholder = "?"
+    # Transactions are serialized by the database-wide write lock
+    isolation_levels = ("serializable",)
+
+    def connect(self):
+        # Pooled connections move between request threads, one at a time
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def create_table(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS test_table;")
+        cursor.execute("""
+            CREATE TABLE test_table (
+                id INTEGER PRIMARY KEY,
+                name VARCHAR(50),
+                value NUMERIC(10,2),
+                created_at TIMESTAMP
+            );
+        """)
+
+    def bind_style(self, sql):
+        # sqlite3 caches compiled statements per connection, so bound queries
+        # are only parsed once anyway
+        return _PYFORMAT.sub(r":\1", sql).replace("%%", "%")
+
+    def adapt_query(self, query):
+        return _EXTRACT_HOUR.sub(r"CAST(strftime('%H', \1) AS INTEGER)", query)
+
+    def begin(self, cursor, isolation=None):
+        # Take the write lock up front; a deferred transaction that reads
+        # before writing fails instead of waiting when another writer is active
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def classify_error(self, error):
+        if isinstance(error, sqlite3.OperationalError) and "locked" in str(error):
+            return "lock_timeout"
+        if isinstance(error, sqlite3.OperationalError) and "interrupted" in str(error):
+            return "timeout"
+        return None
+
+    def cancel(self, conn, connect):
+        conn.interrupt()
+
+
+class _DuckDBCursor:
+    """Cursor that runs its statements on the DuckDB connection itself
+
+    DuckDB's own cursor() opens a duplicate connection with a transaction of
+    its own, so commit(), rollback() and interrupt() on the connection would
+    not reach the statements run through it.
+    """
+    def __init__(self, conn):
+        self._conn = conn
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _DuckDBConnection:
+    """DuckDB connection whose rollback() is a no-op outside a transaction, as in DB-API drivers"""
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _DuckDBCursor(self._conn)
+
+    def rollback(self):
+        try:
+            self._conn.rollback()
+        except duckdb.TransactionException:
+            pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@register
+class DuckDBEngine(EmbeddedEngine):
+    name = "duckdb"
+    extension = "duckdb"
+    placeholder = "?"
+    # Optimistic MVCC: concurrent writes to the same row abort with a conflict
+    isolation_levels = ("snapshot",)
+
+    @classmethod
+    def is_available(cls):
+        return duckdb is not None
+
+    def connect(self):
+        return _DuckDBConnection(duckdb.connect(self.path))
+
+    def bind_style(self, sql):
+        return _PYFORMAT.sub(r"$\1", sql).replace("%%", "%")
+
+    def begin(self, cursor, isolation=None):
+        # DuckDB connections autocommit every statement otherwise
+        cursor.execute("BEGIN TRANSACTION")
+
+    def classify_error(self, error):
+        if isinstance(error, duckdb.TransactionException) and "conflict" in str(error).lower():
+            return "serialization"
+        if isinstance(error, duckdb.InterruptException):
+            return "timeout"
+        return None
+
+    def cancel(self, conn, connect):
+        conn.interrupt()
+
+    def create_table(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS test_table;")
+        cursor.execute("DROP SEQUENCE IF EXISTS test_table_id_seq;")
+        cursor.execute("CREATE SEQUENCE test_table_id_seq;")
+        cursor.execute("""
+            CREATE TABLE test_table (
+                id INTEGER DEFAULT nextval('test_table_id_seq') PRIMARY KEY,
+                name VARCHAR(50),
+                value DECIMAL(10,2),
+                created_at TIMESTAMP
+            );
+        """)
+
+    def bulk_load(self, conn, dataset, batch_size):
+        """Recreate test_table and read the dataset file with COPY
+
+        Row-at-a-time inserts are very slow in DuckDB; COPY reads the file in
+        bulk.
+        """
+        cursor = conn.cursor()
+        try:
+            self.create_table(cursor)
+            cursor.execute(
+                f"COPY test_table ({', '.join(COLUMNS)}) FROM '{dataset.path}' "
+                "(DELIMITER '\t', HEADER false, NULLSTR '\\N')"
+            )
+            return dataset.size
+        finally:
+            cursor.close()
+
+    def explain(self, conn, query):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"EXPLAIN ANALYZE {query}")
+            plan = "\n".join(str(column) for row in cursor.fetchall() for column in row)
+        finally:
+            cursor.close()
+        match = re.search(r"Total Time:\s*([\d.]+)s", plan)
+        return {
+            "planning": None,
+            "execution": float(match.group(1)) * 1000 if match else None
+        }
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+import datetime
+import decimal
+import json
+import uuid
+
+# orjson is optional; it serialises result rows several times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    """JSON form of the database types the standard encoders do not know"""
+    if isinstance(value, decimal.Decimal):
+        # NUMERIC values; a float keeps them numbers for clients
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Compact JSON bytes for obj, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class TreatmentCache:
+    """TTL cache in front of split_client.get_treatment
+
+    Treatments change rarely compared to the request rate, so each
+    (key, feature flag) pair is evaluated at most once per ttl seconds. The
+    cache holds at most max_entries pairs, evicting the least recently used.
+    """
+    def __init__(self, client, ttl=30.0, max_entries=10000):
+        """Initialize the cache
+
+        Args:
+            client: Split client (or anything with get_treatment(key, flag))
+            ttl: Seconds a treatment is reused; 0 disables caching
+            max_entries: Maximum cached (key, flag) pairs
+        """
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_treatment(self, key, feature_flag):
+        cache_key = (key, feature_flag)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        treatment = self.client.get_treatment(key, feature_flag)
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[cache_key] = (now, treatment)
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return treatment
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class TrackQueue:
+    """Bounded queue of track() events sent by a background thread
+
+    Requests only enqueue; a worker sends events to the Split client in
+    batches of up to batch_size, at least every flush_interval seconds. When
+    the queue is full new events are dropped and counted rather than
+    blocking the request.
+    """
+    def __init__(self, client, max_size=10000, batch_size=100, flush_interval=1.0):
+        """Initialize the queue
+
+        Args:
+            client: Split client (or anything with track(key, traffic_type, event_type, value, properties))
+            max_size: Events buffered before new ones are dropped
+            batch_size: Events sent per worker wake-up
+            flush_interval: Maximum seconds an event waits in the queue
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread if it is not running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="split-track", daemon=True)
+            self._thread.start()
+
+    def track(self, key, traffic_type, event_type, value=None, properties=None):
+        """Enqueue an event; returns False if it was dropped"""
+        try:
+            self._queue.put_nowait((key, traffic_type, event_type, value, properties))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _take_batch(self, timeout):
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch):
+        sent = failed = 0
+        for key, traffic_type, event_type, value, properties in batch:
+            try:
+                if self.client.track(key, traffic_type, event_type, value, properties) is False:
+                    failed += 1
+                else:
+                    sent += 1
+            except Exception as e:
+                print(f"Split track failed: {e}")
+                failed += 1
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(self.flush_interval)
+            if batch:
+                with self._send_lock:
+                    self._send(batch)
+
+    def flush(self):
+        """Send everything still queued from the calling thread"""
+        with self._send_lock:
+            while True:
+                batch = self._take_batch(0)
+                if not batch:
+                    return
+                self._send(batch)
+
+    def stop(self, timeout=5.0):
+        """Stop the worker and send the remaining events"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "failed": self.failed
+            }
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Multi-worker serving: gunicorn -c gunicorn.conf.py app:app
+
+The master imports the app once (preload_app) and spawns a separate process
+that starts the containers, loads the test data and tears them down on exit;
+the master itself runs no threads, so forking workers is safe. Every
+worker creates its own Split.io client, connection pools and background
+threads after fork, and shares its metrics, dashboard statistics and the
+warm-up state with the others through files in one directory.
+"""
+import glob
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+# Long queries and large streamed results must not be mistaken for hung workers
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = True
+
+# Files shared by the master and its workers; the default is removed on exit
+SHARED_DIR = os.getenv('APP_SHARED_DIR') or os.path.join(tempfile.gettempdir(), f"db-speed-test-{os.getpid()}")
+os.environ['APP_PREFORK'] = '1'
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(SHARED_DIR, 'metrics'))
+os.environ.setdefault('STATS_SHARED_DIR', os.path.join(SHARED_DIR, 'stats'))
+os.environ.setdefault('DB_WARMUP_STATE_FILE', os.path.join(SHARED_DIR, 'warmup.json'))
+
+# Files the workers write into the shared directories, with their temp files
+SNAPSHOT_FILES = (
+    ('METRICS_MULTIPROC_DIR', ('metrics_*.json*',)),
+    ('STATS_SHARED_DIR', ('aggregates_*.json*', 'recent_*.json*', 'paired_*.json*')),
+)
+
+warmup_process = None
+
+
+def clear_shared_state():
+    """Remove snapshots and warm-up state left by an earlier run in the same APP_SHARED_DIR
+
+    Otherwise their counters would be merged into this run's metrics and
+    dashboard, and a reused pid could pass for a live worker.
+    """
+    paths = [os.environ['DB_WARMUP_STATE_FILE'], f"{os.environ['DB_WARMUP_STATE_FILE']}.retry"]
+    for variable, patterns in SNAPSHOT_FILES:
+        for pattern in patterns:
+            paths.extend(glob.glob(os.path.join(os.environ[variable], pattern)))
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def when_ready(server):
+    """Master, once listening and before forking workers: start the warm-up process"""
+    global warmup_process
+    clear_shared_state()
+    # A separate program rather than a fork: the warm-up process has
+    # threads, the master none
+    warmup_process = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warmup.py'),
+        os.environ['DB_WARMUP_STATE_FILE'], os.getenv('DB_DATA_SIZE', '100000')
+    ])
+
+
+def post_fork(server, worker):
+    """Worker, right after fork: create the per-process clients and threads"""
+    import app
+    app.init_worker()
+
+
+def worker_exit(server, worker):
+    """Worker, on the way out: flush statistics and close its own connections"""
+    import app
+    app.shutdown_worker()
+
+
+def on_exit(server):
+    """Master, on shutdown: stop the warm-up process, which stops the containers, after all workers are gone"""
+    if warmup_process is not None:
+        warmup_process.terminate()
+        try:
+            warmup_process.wait(120)
+        except subprocess.TimeoutExpired:
+            warmup_process.kill()
+    if not os.getenv('APP_SHARED_DIR'):
+        shutil.rmtree(SHARED_DIR, ignore_errors=True)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+import csv
+import json
+import math
+import threading
+import time
+
+# Percentiles included in every report
+REPORT_PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p99.9", 0.999))
+
+
+class LatencyHistogram:
+    """Compact, mergeable latency histogram with logarithmic buckets
+
+    Values are stored in microseconds in buckets whose width grows
+    geometrically, so any recorded value is reproduced within the relative
+    error (1% by default) while the number of buckets stays bounded by the
+    dynamic range (about 1,300 buckets from 1 us to a day) rather than by the
+    number of samples.
+    """
+    def __init__(self, relative_error=0.01):
+        self.relative_error = relative_error
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self.gamma)
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, micros):
+        return int(math.ceil(math.log(max(micros, 1.0)) / self._log_gamma))
+
+    def _value(self, index):
+        # Midpoint (in relative terms) of the bucket (gamma^(i-1), gamma^i]
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def record(self, seconds, count=1):
+        """Record a latency given in seconds"""
+        micros = seconds * 1e6
+        index = self._index(micros)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += micros * count
+        self.min = micros if self.min is None else min(self.min, micros)
+        self.max = micros if self.max is None else max(self.max, micros)
+
+    def merge(self, other):
+        """Add the contents of another histogram with the same relative error"""
+        if other.relative_error != self.relative_error:
+            raise ValueError("Cannot merge histograms with different relative errors")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, fraction):
+        """Latency in seconds at the given fraction (0-1) of recorded values"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(math.ceil(fraction * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._value(index), self.min), self.max) / 1e6
+        return self.max / 1e6
+
+    @property
+    def mean(self):
+        return self.total / self.count / 1e6 if self.count else 0.0
+
+    def summary(self):
+        """Count, mean, report percentiles and max, all in seconds"""
+        summary = {"count": self.count, "mean": self.mean}
+        for label, fraction in REPORT_PERCENTILES:
+            summary[label] = self.percentile(fraction)
+        summary["max"] = self.max / 1e6 if self.max is not None else 0.0
+        return summary
+
+    def to_dict(self):
+        return {
+            "relative_error": self.relative_error,
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["relative_error"])
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class LatencyRecorder:
+    """Thread-safe set of latency histograms and error counts keyed by (backend, query)"""
+    def __init__(self, relative_error=0.01):
+        self.relative_error = relative_error
+        self.histograms = {}
+        self.errors = {}
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, backend, query, seconds, error=False):
+        """Record one request; failed requests count as errors and still contribute their latency"""
+        key = (backend, query)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram(self.relative_error)
+                self.errors[key] = 0
+            histogram.record(seconds)
+            if error:
+                self.errors[key] += 1
+
+    def merge(self, other):
+        """Fold another recorder's histograms and error counts into this one"""
+        with self._lock:
+            for key, histogram in other.histograms.items():
+                if key not in self.histograms:
+                    self.histograms[key] = LatencyHistogram(self.relative_error)
+                    self.errors[key] = 0
+                self.histograms[key].merge(histogram)
+                self.errors[key] += other.errors.get(key, 0)
+            self.started_at = min(self.started_at, other.started_at)
+            if other.finished_at:
+                self.finished_at = max(self.finished_at or 0, other.finished_at)
+        return self
+
+    def drain(self):
+        """Move everything recorded so far into a new recorder and return it
+
+        This recorder starts over empty, so calling drain() at regular
+        intervals yields one recorder per interval.
+        """
+        now = time.time()
+        with self._lock:
+            drained = LatencyRecorder(self.relative_error)
+            drained.histograms, drained.errors = self.histograms, self.errors
+            drained.started_at, drained.finished_at = self.started_at, now
+            self.histograms, self.errors = {}, {}
+            self.started_at = now
+        return drained
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    def rows(self):
+        """One report row per (backend, query) plus per-backend and overall totals"""
+        with self._lock:
+            items = list(self.histograms.items())
+            errors = dict(self.errors)
+
+        groups = {}
+        for (backend, query), histogram in sorted(items):
+            groups.setdefault((backend, query), []).append((histogram, errors[(backend, query)]))
+            groups.setdefault((backend, "*"), []).append((histogram, errors[(backend, query)]))
+            groups.setdefault(("*", "*"), []).append((histogram, errors[(backend, query)]))
+
+        elapsed = self.elapsed
+        rows = []
+        # Individual keys first, then per-backend totals, then the overall total
+        order = sorted(groups, key=lambda key: (key[0] == "*", key[0], key[1] == "*", key[1]))
+        for backend, query in order:
+            members = groups[(backend, query)]
+            merged = LatencyHistogram(self.relative_error)
+            error_count = 0
+            for histogram, histogram_errors in members:
+                merged.merge(histogram)
+                error_count += histogram_errors
+            row = {"backend": backend, "query": query}
+            row.update(merged.summary())
+            row["errors"] = error_count
+            row["error_rate"] = error_count / merged.count if merged.count else 0.0
+            row["throughput"] = merged.count / elapsed if elapsed > 0 else 0.0
+            rows.append(row)
+        return rows
+
+    def print_report(self):
+        rows = self.rows()
+        if not rows:
+            print("No requests recorded")
+            return
+        header = f"{'backend':<10} {'count':>8} {'errors':>7} {'req/s':>8} " + " ".join(
+            f"{label:>9}" for label, _ in REPORT_PERCENTILES
+        ) + f" {'max':>9}  query"
+        print(header)
+        for row in rows:
+            print(
+                f"{row['backend']:<10} {row['count']:>8} {row['errors']:>7} {row['throughput']:>8.1f} "
+                + " ".join(f"{row[label] * 1000:>7.1f}ms" for label, _ in REPORT_PERCENTILES)
+                + f" {row['max'] * 1000:>7.1f}ms  {row['query'][:60]}"
+            )
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "relative_error": self.relative_error,
+                "histograms": [
+                    {
+                        "backend": backend,
+                        "query": query,
+                        "errors": self.errors[(backend, query)],
+                        "histogram": histogram.to_dict()
+                    }
+                    for (backend, query), histogram in self.histograms.items()
+                ]
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        recorder = cls(data["relative_error"])
+        recorder.started_at = data["started_at"]
+        recorder.finished_at = data["finished_at"]
+        for entry in data["histograms"]:
+            key = (entry["backend"], entry["query"])
+            recorder.histograms[key] = LatencyHistogram.from_dict(entry["histogram"])
+            recorder.errors[key] = entry["errors"]
+        return recorder
+
+    def write_json(self, path):
+        """Write the summary rows and the raw histograms, which can be merged or diffed later"""
+        with open(path, "w") as f:
+            json.dump({"summary": self.rows(), **self.to_dict()}, f, indent=2)
+
+    def write_csv(self, path):
+        rows = self.rows()
+        fields = ["backend", "query", "count", "errors", "error_rate", "throughput", "mean"] + [
+            label for label, _ in REPORT_PERCENTILES
+        ] + ["max"]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({field: row[field] for field in fields})
@@ -1,18 +1,30 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import math
+import multiprocessing
+import os
 import time
 import uuid
 import threading
 import random
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+import aiohttp
 from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener, wait
+from histogram import LatencyHistogram, LatencyRecorder
+
+# Selenium is only needed for the opt-in browser engine
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+except ImportError:
+    webdriver = None
 
 
 class BrowserSession:
     """Manages a headless browser session accessing the DB performance app"""
-    def __init__(self, base_url, session_id=None, auto_refresh=False, query=None):
+    def __init__(self, base_url, session_id=None, auto_refresh=False, query=None, recorder=None):
         """Initialize a browser session
         
         Args:
@@ -20,11 +32,13 @@ class BrowserSession:
             session_id: Unique identifier for this session (used for tracking)
             auto_refresh: Whether to use the app's auto-refresh feature
             query: Optional specific query to test
+            recorder: LatencyRecorder shared by all sessions (manual refreshes only)
         """
         self.base_url = base_url
         self.session_id = session_id or f"load-test-{uuid.uuid4().hex[:8]}"
         self.auto_refresh = auto_refresh
         self.query = query
+        self.recorder = recorder if recorder is not None else LatencyRecorder()
         self.browser = None
         self.stop_event = threading.Event()
         
@@ -36,6 +50,8 @@ class BrowserSession:
             manual_refresh_interval: Seconds between manual refreshes (if auto_refresh=False)
         """
         try:
+            if webdriver is None:
+                raise RuntimeError("selenium is not installed; use --engine http or pip install selenium")
             print(f"Starting browser session {self.session_id}")
             
             # Setup Chrome in headless mode
@@ -90,7 +106,10 @@ class BrowserSession:
                 # If not using auto-refresh, manually refresh
                 if not self.auto_refresh:
                     if (time.time() - start_time) > manual_refresh_interval * (refresh_count + 1):
+                        refresh_start = time.perf_counter()
                         self.browser.refresh()
+                        self.recorder.record(self._page_database(), self.query or "random",
+                                             time.perf_counter() - refresh_start)
                         refresh_count += 1
                         print(f"Session {self.session_id}: Manual refresh #{refresh_count}")
                 
@@ -102,6 +121,13 @@ class BrowserSession:
         finally:
             self.cleanup()
                 
+    def _page_database(self):
+        """Read the database badge from the results page"""
+        try:
+            return self.browser.find_element("css selector", ".db-badge").text.strip().lower()
+        except Exception:
+            return "unknown"
+
     def cleanup(self):
         """Clean up browser resources"""
         if self.browser:
@@ -127,19 +153,477 @@ class BrowserSession:
         self.stop_event.set()
 
 
-def run_browser_session(args):
+class HttpSession:
+    """Simulates one user hitting the DB performance app with a plain HTTP client"""
+    def __init__(self, base_url, session_id=None, query=None, connector=None, timeout=30, recorder=None):
+        """Initialize an HTTP session
+
+        Args:
+            base_url: Base URL of the web application
+            session_id: Unique identifier for this session (used for tracking)
+            query: Optional specific query to test
+            connector: Shared aiohttp connector providing keep-alive connections
+            timeout: Per-request timeout in seconds
+            recorder: LatencyRecorder shared by all sessions
+        """
+        self.base_url = base_url
+        self.session_id = session_id or f"load-test-{uuid.uuid4().hex[:8]}"
+        self.query = query
+        self.connector = connector
+        self.timeout = timeout
+        self.client = None
+        self.recorder = recorder if recorder is not None else LatencyRecorder()
+        self.requests = 0
+        self.errors = 0
+        self.stop_event = asyncio.Event()
+
+    async def open(self):
+        """Create the HTTP client; each virtual user gets its own cookie jar but shares the connection pool"""
+        self.client = aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            headers={"User-Agent": f"LoadTest/{self.session_id}"},
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def fetch(self, intended_start=None):
+        """Request the page once and record its latency
+
+        Args:
+            intended_start: Event loop time at which the request was scheduled
+                to be sent. Latency is measured from here rather than from the
+                actual send time, so queueing delay in the load generator or
+                the connection pool is not hidden (coordinated omission).
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time() if intended_start is None else intended_start
+        params = {"query": self.query} if self.query else None
+        backend = "unknown"
+        query = self.query
+        error = False
+        try:
+            async with self.client.get(self.base_url, params=params) as response:
+                await response.read()
+                backend = response.headers.get("X-Database", backend)
+                query = query or response.headers.get("X-Query-Id", "unknown")
+                error = response.status >= 400
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = True
+            if self.errors < 3:
+                print(f"Session {self.session_id}: Request error: {e!r}")
+        self.requests += 1
+        if error:
+            self.errors += 1
+        self.recorder.record(backend, query or "unknown", loop.time() - start, error=error)
+
+    async def start(self, duration_seconds=60, refresh_interval=5):
+        """Closed loop: request the page every refresh_interval seconds for duration_seconds"""
+        deadline = time.monotonic() + duration_seconds
+        await self.open()
+        try:
+            # Spread the first requests over one interval instead of a thundering herd
+            await self._sleep(min(random.uniform(0, refresh_interval), duration_seconds))
+
+            while time.monotonic() < deadline and not self.stop_event.is_set():
+                await self.fetch()
+                await self._sleep(min(refresh_interval, max(0, deadline - time.monotonic())))
+        finally:
+            await self.close()
+        return self.session_id
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def stop(self):
+        """Signal this session to stop"""
+        self.stop_event.set()
+
+
+class RateProfile:
+    """Target request rate over the course of an open-loop test"""
+    PROFILES = ("constant", "ramp", "step", "spike")
+
+    def __init__(self, rate, profile="constant", ramp_up=0, step_rate=None, step_interval=10,
+                 spike_at=None, spike_duration=5, spike_multiplier=5):
+        """Initialize the profile
+
+        Args:
+            rate: Target requests per second (the plateau for ramp and step)
+            profile: One of constant, ramp, step or spike
+            ramp_up: Seconds to ramp linearly from 0 to rate (ramp)
+            step_rate: Requests per second added at each step (step, default rate / 5)
+            step_interval: Seconds between steps (step)
+            spike_at: Seconds into the test at which the spike starts (spike, default mid-test)
+            spike_duration: Length of the spike in seconds (spike)
+            spike_multiplier: Rate multiplier during the spike (spike)
+        """
+        if profile not in self.PROFILES:
+            raise ValueError(f"Unknown rate profile: {profile}")
+        self.rate = rate
+        self.profile = profile
+        self.ramp_up = ramp_up
+        self.step_rate = step_rate or rate / 5
+        self.step_interval = step_interval
+        self.spike_at = spike_at
+        self.spike_duration = spike_duration
+        self.spike_multiplier = spike_multiplier
+
+    def rate_at(self, t):
+        """Target requests per second t seconds into the test"""
+        if self.profile == "ramp" and self.ramp_up > 0:
+            return self.rate * min(1.0, t / self.ramp_up)
+        if self.profile == "step":
+            return min(self.rate, self.step_rate * (int(t // self.step_interval) + 1))
+        if self.profile == "spike" and self.spike_at is not None:
+            if self.spike_at <= t < self.spike_at + self.spike_duration:
+                return self.rate * self.spike_multiplier
+        return self.rate
+
+
+def arrival_offsets(profile, duration, poisson=False, rng=None, resolution=0.01):
+    """Yield intended send times (seconds from test start) following profile
+
+    The rate is treated as constant over each resolution-second slice, and an
+    arrival is emitted each time the expected request count since the last
+    arrival reaches the next target: 1 for a fixed schedule, or an Exp(1) draw
+    for a Poisson process.
+    """
+    rng = rng or random.Random()
+    draw = (lambda: rng.expovariate(1.0)) if poisson else (lambda: 1.0)
+    t = 0.0
+    accumulated = 0.0
+    target = draw()
+    while t < duration:
+        rate = profile.rate_at(t)
+        slice_end = min(t + resolution, duration)
+        expected = rate * (slice_end - t)
+        if rate > 0 and accumulated + expected >= target:
+            t += (target - accumulated) / rate
+            accumulated = 0.0
+            target = draw()
+            yield t
+        else:
+            accumulated += expected
+            t = slice_end
+
+
+async def run_open_loop(session_args, connections, profile, duration, poisson=False, recorder=None):
+    """Issue requests on an open-loop arrival schedule, independent of response times
+
+    Requests are dealt round-robin across the virtual users. A slow response
+    never delays the next scheduled send, so the target rate is held even
+    when the app saturates and the latency reflects the queueing it causes.
+    """
+    loop = asyncio.get_running_loop()
+    connector = aiohttp.TCPConnector(limit=connections, keepalive_timeout=60)
+    sessions = [
+        HttpSession(base_url=base_url, session_id=session_id, query=query, connector=connector, recorder=recorder)
+        for session_id, base_url, _, _, _, query in session_args
+    ]
+    in_flight = set()
+    max_lag = 0.0
+    try:
+        for session in sessions:
+            await session.open()
+        start = loop.time()
+        for i, offset in enumerate(arrival_offsets(profile, duration, poisson=poisson)):
+            intended = start + offset
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+            task = asyncio.create_task(sessions[i % len(sessions)].fetch(intended_start=intended))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+    finally:
+        for session in sessions:
+            await session.close()
+        await connector.close()
+    if max_lag > 0.01:
+        print(f"WARNING: load generator fell up to {max_lag * 1000:.0f} ms behind schedule")
+    return sessions
+
+
+async def run_http_sessions(session_args, connections, recorder=None):
+    """Run all HTTP sessions concurrently on one event loop"""
+    connector = aiohttp.TCPConnector(limit=connections, keepalive_timeout=60)
+    sessions = []
+    try:
+        coroutines = []
+        for session_id, base_url, duration, auto_refresh, refresh_interval, query in session_args:
+            session = HttpSession(base_url=base_url, session_id=session_id, query=query,
+                                  connector=connector, recorder=recorder)
+            sessions.append(session)
+            # The app's auto-refresh reloads the page every second
+            interval = 1 if auto_refresh else refresh_interval
+            coroutines.append(session.start(duration_seconds=duration, refresh_interval=interval))
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+    finally:
+        await connector.close()
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Session error: {result!r}")
+    return sessions
+
+
+def make_session_args(args):
+    """Session argument tuples for all --sessions virtual users"""
+    session_args = []
+    # The JSON API skips the results page rendering the app does for /
+    url = args.url.rstrip('/') + '/api/query' if args.endpoint == 'api' else args.url
+    for i in range(args.sessions):
+        session_id = f"session-{i+1}"
+        
+        # Assign a specific query if provided
+        query = None
+        if args.queries:
+            query = args.queries[i % len(args.queries)]
+        
+        session_args.append((
+            session_id,
+            url,
+            args.duration,
+            args.auto_refresh,
+            args.refresh_interval,
+            query
+        ))
+    return session_args
+
+
+def make_profile(args, share=1.0):
+    """RateProfile from the command line, scaled to one load generator's share of the rate"""
+    return RateProfile(
+        args.rate * share,
+        profile=args.profile,
+        ramp_up=args.ramp_up,
+        step_rate=args.step_rate * share if args.step_rate else None,
+        step_interval=args.step_interval,
+        spike_at=args.spike_at if args.spike_at is not None else args.duration / 2,
+        spike_duration=args.spike_duration,
+        spike_multiplier=args.spike_multiplier
+    )
+
+
+def run_browser_session(args, recorder=None):
     """Function to run in a thread pool to manage a single browser session"""
     session_id, base_url, duration, auto_refresh, refresh_interval, query = args
     session = BrowserSession(
         base_url=base_url,
         session_id=session_id,
         auto_refresh=auto_refresh,
-        query=query
+        query=query,
+        recorder=recorder
     )
     session.start(duration_seconds=duration, manual_refresh_interval=refresh_interval)
     return session_id
 
 
+# Settings the coordinator sends to every load generator process
+WORKER_SETTINGS = (
+    "url", "endpoint", "sessions", "connections", "duration", "auto_refresh", "refresh_interval", "queries",
+    "rate", "arrival", "profile", "ramp_up", "step_rate", "step_interval", "spike_at",
+    "spike_duration", "spike_multiplier", "report_interval"
+)
+
+
+async def run_worker_load(conn, settings, index, total, start_at):
+    """One load generator's share of the test, reporting every report_interval seconds
+
+    Runs sessions index, index + total, ... and, in open-loop mode, 1/total
+    of the rate. Each interval's requests are sent to the coordinator as a
+    compact LatencyRecorder dict; raw samples never leave the process.
+    """
+    args = argparse.Namespace(**settings)
+    session_args = make_session_args(args)[index::total]
+    connections = max(1, math.ceil((args.connections or args.sessions) / total))
+    recorder = LatencyRecorder()
+
+    delay = start_at - time.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    recorder.started_at = time.time()
+
+    if args.rate:
+        load = run_open_loop(session_args, connections, make_profile(args, 1 / total), args.duration,
+                             poisson=args.arrival == "poisson", recorder=recorder)
+    else:
+        load = run_http_sessions(session_args, connections, recorder=recorder)
+    task = asyncio.create_task(load)
+
+    interval = 0
+    while not task.done():
+        next_report = start_at + (interval + 1) * args.report_interval
+        await asyncio.wait({task}, timeout=max(0.0, next_report - time.time()))
+        if conn.poll() and conn.recv().get("type") == "stop":
+            task.cancel()
+            break
+        if not task.done():
+            conn.send({"type": "interval", "index": interval, "recorder": recorder.drain().to_dict()})
+            interval += 1
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    # The last, usually partial, interval
+    last = recorder.drain()
+    if last.histograms:
+        conn.send({"type": "interval", "index": interval, "recorder": last.to_dict()})
+    conn.send({"type": "done"})
+
+
+def run_worker(conn):
+    """Wait for the coordinator's start message on conn, then generate load"""
+    try:
+        message = conn.recv()
+        asyncio.run(run_worker_load(conn, message["settings"], message["index"], message["total"],
+                                    message["start_at"]))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        conn.close()
+
+
+def _local_worker(conn):
+    run_worker(conn)
+
+
+def _agent_worker(host, port, authkey):
+    run_worker(Client((host, port), authkey=authkey))
+
+
+def run_agent(address, processes, authkey):
+    """Run `processes` load generators on this host, each connected to a remote coordinator"""
+    host, port = address.rsplit(":", 1)
+    workers = [
+        multiprocessing.Process(target=_agent_worker, args=(host, int(port), authkey))
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    print(f"Started {processes} load generators for the coordinator at {address}")
+    for process in workers:
+        process.join()
+
+
+class IntervalReport:
+    """Merges per-interval recorders from every load generator into a live report"""
+    def __init__(self, workers, report_interval):
+        self.workers = workers
+        self.report_interval = report_interval
+        self.total = LatencyRecorder()
+        self.intervals = {}
+        self.finished = set()
+        self.printed = 0
+
+    def add(self, worker, index, data):
+        recorder = LatencyRecorder.from_dict(data)
+        self.total.merge(recorder)
+        interval = self.intervals.setdefault(index, (LatencyRecorder(), set()))
+        interval[0].merge(recorder)
+        interval[1].add(worker)
+
+    def finish(self, worker):
+        """worker has sent its last interval"""
+        self.finished.add(worker)
+
+    def print_ready(self, final=False):
+        """Print, in order, every interval that all still running generators have reported"""
+        while self.printed in self.intervals:
+            recorder, reported = self.intervals[self.printed]
+            waiting = set(range(self.workers)) - reported - self.finished
+            if waiting and not final:
+                break
+            merged = LatencyHistogram(recorder.relative_error)
+            for histogram in recorder.histograms.values():
+                merged.merge(histogram)
+            errors = sum(recorder.errors.values())
+            summary = merged.summary()
+            seconds = (self.printed + 1) * self.report_interval
+            print(f"[{seconds:>6.0f}s] {merged.count / self.report_interval:>8.1f} req/s {errors:>5} errors  "
+                  f"p50 {summary['p50'] * 1000:>7.1f}ms  p90 {summary['p90'] * 1000:>7.1f}ms  "
+                  f"p99 {summary['p99'] * 1000:>7.1f}ms  ({len(reported)}/{self.workers} generators)")
+            del self.intervals[self.printed]
+            self.printed += 1
+
+
+def run_coordinator(args, processes, listen=None, agents=0, authkey=None):
+    """Fan the test out over local processes and remote agents and merge their reports
+
+    Every generator gets the same wall-clock start time a couple of seconds
+    ahead, so they start together; multi-host runs need synchronised clocks.
+    Returns the merged LatencyRecorder.
+    """
+    connections = []
+    local = []
+    for _ in range(processes):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_local_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        connections.append(parent_conn)
+        local.append(process)
+
+    if listen:
+        host, port = listen.rsplit(":", 1)
+        with Listener((host, int(port)), authkey=authkey) as listener:
+            print(f"Waiting for {agents} remote load generators on {listen}...")
+            while len(connections) < processes + agents:
+                connections.append(listener.accept())
+                print(f"Load generator connected from {listener.last_accepted[0]}")
+
+    total = len(connections)
+    if args.sessions < total:
+        print(f"Raising --sessions from {args.sessions} to {total}, one per load generator")
+        args.sessions = total
+    settings = {name: getattr(args, name) for name in WORKER_SETTINGS}
+    start_at = time.time() + 2
+    for index, conn in enumerate(connections):
+        conn.send({"settings": settings, "index": index, "total": total, "start_at": start_at})
+    print(f"Starting {total} load generators at {time.strftime('%H:%M:%S', time.localtime(start_at))}")
+
+    report = IntervalReport(total, args.report_interval)
+    workers = {conn: index for index, conn in enumerate(connections)}
+    pending = list(connections)
+    try:
+        while pending:
+            for conn in wait(pending):
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    message = {"type": "done"}
+                if message["type"] == "interval":
+                    report.add(workers[conn], message["index"], message["recorder"])
+                else:
+                    pending.remove(conn)
+                    report.finish(workers[conn])
+            report.print_ready()
+    except KeyboardInterrupt:
+        print("Stopping load generators...")
+        for conn in pending:
+            try:
+                conn.send({"type": "stop"})
+            except OSError:
+                pass
+    report.print_ready(final=True)
+    for process in local:
+        process.join(timeout=5)
+
+    report.total.started_at = start_at
+    report.total.finish()
+    return report.total
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Load test for DB performance comparison app'
@@ -149,11 +633,28 @@ def main():
         default='http://localhost:5000',
         help='Base URL of the web application (default: http://localhost:5000)'
     )
+    parser.add_argument(
+        '--engine',
+        choices=['http', 'selenium'],
+        default='http',
+        help='http drives the app with lightweight asyncio clients, selenium with one headless Chrome per session (default: http)'
+    )
+    parser.add_argument(
+        '--endpoint',
+        choices=['page', 'api'],
+        default='page',
+        help='page requests the HTML results page at /, api the compact JSON /api/query (http engine, default: page)'
+    )
     parser.add_argument(
         '--sessions', 
         type=int, 
         default=5,
-        help='Number of browser sessions to run concurrently (default: 5)'
+        help='Number of sessions (virtual users) to run concurrently (default: 5)'
+    )
+    parser.add_argument(
+        '--connections',
+        type=int,
+        help='Maximum keep-alive connections shared by all http sessions (default: one per session)'
     )
     parser.add_argument(
         '--duration', 
@@ -168,7 +669,7 @@ def main():
     )
     parser.add_argument(
         '--refresh-interval', 
-        type=int, 
+        type=float, 
         default=5,
         help='Refresh interval in seconds for manual refresh (default: 5)'
     )
@@ -177,57 +678,190 @@ def main():
         nargs='+',
         help='Optional specific queries to test (will be distributed across sessions)'
     )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        help='Open-loop mode (http engine): target requests per second across all sessions, '
+             'sent on schedule regardless of response times'
+    )
+    parser.add_argument(
+        '--arrival',
+        choices=['fixed', 'poisson'],
+        default='fixed',
+        help='Open-loop arrival process: evenly spaced or Poisson (default: fixed)'
+    )
+    parser.add_argument(
+        '--profile',
+        choices=RateProfile.PROFILES,
+        default='constant',
+        help='Open-loop rate profile (default: constant)'
+    )
+    parser.add_argument(
+        '--ramp-up',
+        type=float,
+        default=0,
+        help='ramp profile: seconds to ramp from 0 to --rate (default: 0)'
+    )
+    parser.add_argument(
+        '--step-rate',
+        type=float,
+        help='step profile: requests per second added at each step (default: rate / 5)'
+    )
+    parser.add_argument(
+        '--step-interval',
+        type=float,
+        default=10,
+        help='step profile: seconds between steps (default: 10)'
+    )
+    parser.add_argument(
+        '--spike-at',
+        type=float,
+        help='spike profile: seconds into the test at which the spike starts (default: halfway)'
+    )
+    parser.add_argument(
+        '--spike-duration',
+        type=float,
+        default=5,
+        help='spike profile: spike length in seconds (default: 5)'
+    )
+    parser.add_argument(
+        '--spike-multiplier',
+        type=float,
+        default=5,
+        help='spike profile: rate multiplier during the spike (default: 5)'
+    )
+    
+    parser.add_argument(
+        '--report-json',
+        help='Write per-backend/query latency summaries and raw histograms to this JSON file'
+    )
+    parser.add_argument(
+        '--report-csv',
+        help='Write per-backend/query latency summaries to this CSV file'
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=1,
+        help='Load generator processes on this host (http engine); sessions and rate are split across them (default: 1)'
+    )
+    parser.add_argument(
+        '--report-interval',
+        type=float,
+        default=5,
+        help='Seconds between live interval reports with --processes or --listen (default: 5)'
+    )
+    parser.add_argument(
+        '--listen',
+        metavar='HOST:PORT',
+        help='Coordinate: also wait for --agents remote load generators connecting to this address'
+    )
+    parser.add_argument(
+        '--agents',
+        type=int,
+        default=0,
+        help='Number of remote load generator processes to wait for with --listen (default: 0)'
+    )
+    parser.add_argument(
+        '--agent',
+        metavar='HOST:PORT',
+        help='Run --processes load generators for the coordinator at this address; it sends all other settings'
+    )
+    parser.add_argument(
+        '--auth-key',
+        default=os.getenv('LOAD_TEST_AUTH_KEY'),
+        help='Shared secret between coordinator and agents, required with --listen and --agent '
+             '(default: LOAD_TEST_AUTH_KEY). Messages are pickled: anyone with the key can run code on '
+             'the coordinator and agents'
+    )
     
     args = parser.parse_args()
+    if args.rate and args.engine != "http":
+        parser.error("--rate requires the http engine")
+    if args.endpoint == "api" and args.engine != "http":
+        parser.error("--endpoint api requires the http engine")
+    distributed = args.processes > 1 or args.listen
+    if (distributed or args.agent) and args.engine != "http":
+        parser.error("--processes, --listen and --agent require the http engine")
+    if args.listen and args.agents < 1:
+        parser.error("--listen requires --agents")
+    if (args.listen or args.agent) and not args.auth_key:
+        parser.error("--listen and --agent require --auth-key or LOAD_TEST_AUTH_KEY")
+
+    if args.agent:
+        run_agent(args.agent, args.processes, args.auth_key.encode())
+        return
     
-    print(f"Starting load test with {args.sessions} concurrent sessions")
-    print(f"Target URL: {args.url}")
+    print(f"Starting {args.engine} load test with {args.sessions} concurrent sessions")
+    print(f"Target URL: {args.url}{' (JSON API)' if args.endpoint == 'api' else ''}")
     print(f"Duration per session: {args.duration} seconds")
-    print(f"Auto-refresh: {'Enabled' if args.auto_refresh else 'Disabled'}")
-    if not args.auto_refresh:
-        print(f"Manual refresh interval: {args.refresh_interval} seconds")
+    if args.rate:
+        print(f"Open loop: {args.rate} requests/sec, {args.profile} profile, {args.arrival} arrivals")
+    else:
+        print(f"Auto-refresh: {'Enabled' if args.auto_refresh else 'Disabled'}")
+        if not args.auto_refresh:
+            print(f"Manual refresh interval: {args.refresh_interval} seconds")
     
-    # Generate session arguments
-    session_args = []
-    for i in range(args.sessions):
-        session_id = f"session-{i+1}"
-        
-        # Assign a specific query if provided
-        query = None
-        if args.queries:
-            query = args.queries[i % len(args.queries)]
-        
-        session_args.append((
-            session_id,
-            args.url,
-            args.duration,
-            args.auto_refresh,
-            args.refresh_interval,
-            query
-        ))
-    
-    # Run browser sessions in parallel using a thread pool
+    session_args = make_session_args(args)
     start_time = time.time()
-    completed = 0
-    
-    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
-        future_to_session = {
-            executor.submit(run_browser_session, arg): arg[0]
-            for arg in session_args
-        }
-        
-        for future in future_to_session:
-            try:
-                session_id = future.result()
-                completed += 1
-                print(f"Session {session_id} completed")
-            except Exception as e:
-                print(f"Session error: {e}")
-    
-    total_time = time.time() - start_time
-    print(f"\nLoad test completed in {total_time:.1f} seconds")
-    print(f"{completed}/{args.sessions} sessions completed successfully")
-    
+    recorder = LatencyRecorder()
+
+    if distributed:
+        recorder = run_coordinator(args, args.processes, listen=args.listen, agents=args.agents,
+                                   authkey=args.auth_key.encode() if args.auth_key else None)
+        total_time = recorder.elapsed
+        requests = sum(histogram.count for histogram in recorder.histograms.values())
+        errors = sum(recorder.errors.values())
+        print(f"\nLoad test completed in {total_time:.1f} seconds")
+        print(f"{requests} requests, {errors} errors, {requests / total_time:.1f} requests/sec")
+    elif args.engine == "http":
+        connections = args.connections or args.sessions
+        if args.rate:
+            profile = make_profile(args)
+            sessions = asyncio.run(run_open_loop(
+                session_args, connections, profile, args.duration,
+                poisson=args.arrival == "poisson", recorder=recorder
+            ))
+        else:
+            sessions = asyncio.run(run_http_sessions(session_args, connections, recorder=recorder))
+        recorder.finish()
+        total_time = time.time() - start_time
+        requests = sum(session.requests for session in sessions)
+        errors = sum(session.errors for session in sessions)
+        print(f"\nLoad test completed in {total_time:.1f} seconds")
+        print(f"{requests} requests, {errors} errors, {requests / total_time:.1f} requests/sec")
+    else:
+        # Run browser sessions in parallel using a thread pool
+        completed = 0
+
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            future_to_session = {
+                executor.submit(run_browser_session, arg, recorder): arg[0]
+                for arg in session_args
+            }
+
+            for future in future_to_session:
+                try:
+                    session_id = future.result()
+                    completed += 1
+                    print(f"Session {session_id} completed")
+                except Exception as e:
+                    print(f"Session error: {e}")
+
+        recorder.finish()
+        total_time = time.time() - start_time
+        print(f"\nLoad test completed in {total_time:.1f} seconds")
+        print(f"{completed}/{args.sessions} sessions completed successfully")
+
+    print()
+    recorder.print_report()
+    if args.report_json:
+        recorder.write_json(args.report_json)
+        print(f"Wrote JSON report to {args.report_json}")
+    if args.report_csv:
+        recorder.write_csv(args.report_csv)
+        print(f"Wrote CSV report to {args.report_csv}")
+
 
 if __name__ == "__main__":
     main()
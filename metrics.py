@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import time
+from admission import QueryRejected, QueryTimeout
+from queries import query_label
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), multiprocess_mode="sum"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # How a gauge combines across worker processes: "sum" or "max" over
+        # live processes. Counters and histograms are always summed.
+        self.multiprocess_mode = multiprocess_mode
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def samples(self):
+        """List of (suffix, labels, value) for the current values"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("_total", dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            return [("", dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed distribution of observed values"""
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += 1
+            state[2] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, count, total in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+            samples.append(("_count", labels, count))
+            samples.append(("_sum", labels, total))
+        return samples
+
+
+class MetricsRegistry:
+    """In-process metrics registry rendered in the Prometheus text format
+
+    When multiproc_dir is set, each process periodically writes a snapshot of
+    its metrics there and a scrape merges the snapshots of every worker, so
+    /metrics reports the whole server no matter which worker answers it.
+    Counters and histograms from exited workers keep counting; gauges only
+    include live processes.
+    """
+    def __init__(self, multiproc_dir=None, flush_interval=5.0):
+        self.metrics = {}
+        self.collectors = []
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), multiprocess_mode="sum"):
+        return self._register(Gauge(name, documentation, labelnames, multiprocess_mode))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector):
+        """Add a callable run at each scrape or snapshot
+
+        It returns a list of (name, type, documentation, samples) families,
+        where samples is a list of (suffix, labels, value). A fifth element
+        may give the multiprocess mode for gauges ("sum" or "max").
+        """
+        self.collectors.append(collector)
+
+    def families(self):
+        """Current metric families of this process"""
+        families = [
+            {
+                "name": metric.name,
+                "type": metric.type,
+                "help": metric.documentation,
+                "mode": metric.multiprocess_mode,
+                "samples": metric.samples()
+            }
+            for metric in list(self.metrics.values())
+        ]
+        for collector in self.collectors:
+            try:
+                for name, metric_type, documentation, samples, *mode in collector():
+                    families.append({
+                        "name": name, "type": metric_type, "help": documentation,
+                        "mode": mode[0] if mode else "sum", "samples": samples
+                    })
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        return families
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.multiproc_dir, f"metrics_{pid}.json")
+
+    def write_snapshot(self):
+        """Write this process's metrics to the shared directory"""
+        if not self.multiproc_dir:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"pid": os.getpid(), "time": time.time(), "families": self.families()}, f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self):
+        """Start the background snapshot writer for this process (once per pid)"""
+        if not self.multiproc_dir or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def flush_loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.write_snapshot()
+                except Exception as e:
+                    print(f"Failed to write metrics snapshot: {e}")
+
+        self._flusher = threading.Thread(target=flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def _all_families(self):
+        """Families of this process merged with every other worker's latest snapshot"""
+        processes = [(os.getpid(), True, self.families())]
+        if self.multiproc_dir:
+            for path in glob.glob(os.path.join(self.multiproc_dir, "metrics_*.json")):
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if snapshot["pid"] == os.getpid():
+                    continue
+                processes.append((snapshot["pid"], self._alive(snapshot["pid"]), snapshot["families"]))
+
+        merged = {}
+        for _, alive, families in processes:
+            for family in families:
+                entry = merged.setdefault(family["name"], {**family, "samples": {}})
+                if family["type"] == "gauge" and not alive:
+                    continue
+                for suffix, labels, value in family["samples"]:
+                    key = (suffix, tuple(labels.items()))
+                    if key in entry["samples"] and family["type"] == "gauge" and family["mode"] == "max":
+                        entry["samples"][key] = max(entry["samples"][key], value)
+                    else:
+                        entry["samples"][key] = entry["samples"].get(key, 0) + value
+        return merged
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, family in sorted(self._all_families().items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for (suffix, labels), value in family["samples"].items():
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class QueryMetrics:
+    """Per-database query instruments: latency and phase histograms, errors and in-flight"""
+    def __init__(self, registry, max_query_labels=200):
+        """Initialize the instruments
+
+        Args:
+            registry: MetricsRegistry to register them in
+            max_query_labels: Distinct query labels kept before new ones are
+                reported as "other", to bound the number of series
+        """
+        self.duration = registry.histogram(
+            "db_query_duration_seconds", "Query execution time (execute + fetch)", ["database", "query"]
+        )
+        self.phases = registry.histogram(
+            "db_query_phase_seconds", "Time spent in each phase of run_query", ["database", "phase"]
+        )
+        self.errors = registry.counter(
+            "db_query_errors", "Queries that raised an error", ["database", "query"]
+        )
+        self.rejected = registry.counter(
+            "db_query_rejected", "Queries turned away by admission control", ["database"]
+        )
+        self.timeouts = registry.counter(
+            "db_query_timeouts", "Queries cancelled by the statement timeout", ["database", "query"]
+        )
+        self.in_flight = registry.gauge(
+            "db_queries_in_flight", "Queries currently executing", ["database"]
+        )
+        self.max_query_labels = max_query_labels
+        self._labels = set()
+        self._lock = threading.Lock()
+
+    def query_label(self, query):
+        label = query_label(query)
+        if label in self._labels:
+            return label
+        with self._lock:
+            if len(self._labels) >= self.max_query_labels:
+                return "other"
+            self._labels.add(label)
+        return label
+
+    def track(self, database, query, run):
+        """Call run() and record its result dict (or exception) for database and query
+
+        Rejections and timeouts are counted apart from other errors.
+        """
+        label = self.query_label(query)
+        self.in_flight.inc(database=database)
+        try:
+            result = run()
+        except QueryRejected:
+            self.rejected.inc(database=database)
+            raise
+        except QueryTimeout:
+            self.timeouts.inc(database=database, query=label)
+            raise
+        except Exception:
+            self.errors.inc(database=database, query=label)
+            raise
+        finally:
+            self.in_flight.dec(database=database)
+        self.duration.observe(result["execution_time"], database=database, query=label)
+        for phase, ms in result["phases"].items():
+            self.phases.observe(ms / 1000, database=database, phase=phase)
+        return result
+
+
+# Pool counters from ConnectionPool.stats() exported as counters, by stats key
+POOL_COUNTERS = (
+    ("db_pool_checkouts", "checkouts", "Connections checked out of the pool"),
+    ("db_pool_checkout_wait_seconds", "checkout_wait_total", "Time spent waiting for a pooled connection"),
+    ("db_pool_exhausted", "exhausted", "Checkouts that found the pool at max_size"),
+    ("db_pool_timeouts", "timeouts", "Checkouts that gave up waiting"),
+    ("db_pool_reconnects", "reconnects", "Connections replaced after failing a health check"),
+)
+
+
+def pool_collector(db_manager):
+    """Collector exporting DatabaseManager.pool_stats() for MetricsRegistry.register_collector"""
+    def collect():
+        stats = db_manager.pool_stats()
+        families = [
+            (name, "counter", documentation,
+             [("_total", {"database": db_type}, pool[key]) for db_type, pool in stats.items()])
+            for name, key, documentation in POOL_COUNTERS
+        ]
+        families.append((
+            "db_pool_connections", "gauge", "Open pooled connections by state",
+            [("", {"database": db_type, "state": state}, pool[state])
+             for db_type, pool in stats.items() for state in ("idle", "in_use")]
+        ))
+        return families
+    return collect
+
+
+# AdmissionGate.stats() counters exported as counters, by stats key
+ADMISSION_COUNTERS = (
+    ("db_admission_admitted", "admitted", "Queries given a slot by admission control"),
+    ("db_admission_queue_wait_seconds", "queue_wait_total", "Time queries spent waiting for a slot"),
+)
+
+
+def admission_collector(db_manager):
+    """Collector exporting DatabaseManager.admission_stats() for MetricsRegistry.register_collector"""
+    def collect():
+        stats = db_manager.admission_stats()
+        families = [
+            (name, "counter", documentation,
+             [("_total", {"database": db_type}, gate[key]) for db_type, gate in stats.items()])
+            for name, key, documentation in ADMISSION_COUNTERS
+        ]
+        families.append((
+            "db_admission_rejected", "counter", "Queries rejected by admission control, by reason",
+            [("_total", {"database": db_type, "reason": reason}, gate[key])
+             for db_type, gate in stats.items() for reason, key in (("queue_full", "queue_full"), ("queue_timeout", "queue_timeouts"))]
+        ))
+        families.append((
+            "db_admission_queries", "gauge", "Queries running or waiting for a slot",
+            [("", {"database": db_type, "state": state}, gate[state])
+             for db_type, gate in stats.items() for state in ("running", "queued")]
+        ))
+        return families
+    return collect
+
+
+def warmup_collector(warmup):
+    """Collector exporting warm-up state and startup timings of a warmup.WarmUp"""
+    def collect():
+        status = warmup.status()
+        startup = [
+            ("", {"database": db_type, "phase": phase}, timings[phase])
+            for db_type, timings in status["startup_timings"].items() if isinstance(timings, dict)
+            for phase in ("container_start", "ready_wait", "total")
+        ]
+        return [
+            ("app_ready", "gauge", "1 once the databases are started and loaded",
+             [("", {}, 1 if warmup.is_ready else 0)], "max"),
+            ("app_warmup_phase_seconds", "gauge", "Duration of each completed warm-up phase",
+             [("", {"phase": phase}, seconds) for phase, seconds in status["phase_timings"].items()], "max"),
+            ("db_startup_seconds", "gauge", "Container start and readiness wait per database",
+             startup, "max"),
+        ]
+    return collect
+
+
+def feature_flag_collector(treatments, track_queue):
+    """Collector exporting feature_flags.TreatmentCache and TrackQueue counters"""
+    def collect():
+        cache = treatments.stats()
+        events = track_queue.stats()
+        return [
+            ("split_treatment_lookups", "counter", "Treatment lookups by cache result",
+             [("_total", {"result": "hit"}, cache["hits"]), ("_total", {"result": "miss"}, cache["misses"])]),
+            ("split_events", "counter", "Split track() events by outcome",
+             [("_total", {"outcome": outcome}, events[outcome])
+              for outcome in ("enqueued", "sent", "dropped", "failed")]),
+            ("split_events_queued", "gauge", "Split track() events waiting to be sent",
+             [("", {}, events["queued"])]),
+        ]
+    return collect
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from flask import g, request
+
+_NO_STAGE = nullcontext()
+
+
+class RequestProfile:
+    """perf_counter_ns timings of the named stages of one request"""
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter_ns()
+        self.stages = {}
+        # Thread id registered with the StackSampler, if this request is sampled
+        self.sampled_thread = None
+        self.finished = False
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with block as stage name; repeated stages add up"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter_ns() - start
+
+    def elapsed_ms(self):
+        return (time.perf_counter_ns() - self.start) / 1e6
+
+    def server_timing(self):
+        """Server-Timing header value: every stage so far and the total, in ms"""
+        parts = [f"{name};dur={ns / 1e6:.3f}" for name, ns in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed_ms():.3f}")
+        return ", ".join(parts)
+
+
+class StackSampler:
+    """Samples the stacks of registered threads and aggregates them as collapsed stacks
+
+    One background thread reads sys._current_frames() every interval seconds,
+    but only while at least one thread is registered, so the cost falls on
+    sampled requests alone. The counts are written to <directory>/stacks_<pid>.folded
+    in the "frame;frame;frame count" format that flamegraph.pl and speedscope
+    read; the files of several worker processes can simply be concatenated.
+    """
+    def __init__(self, directory, interval=0.005, flush_interval=10.0):
+        """Initialize the sampler
+
+        Args:
+            directory: Directory the collapsed stack files are written to
+            interval: Seconds between samples
+            flush_interval: Seconds between writes of the aggregated counts
+        """
+        self.directory = directory
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.counts = Counter()
+        self.samples = 0
+        self._threads = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._dirty = False
+
+    def register(self, thread_id):
+        """Start sampling a thread"""
+        with self._cond:
+            self._threads.add(thread_id)
+            if self._thread is None or not self._thread.is_alive():
+                # Started lazily, and again in a forked worker process
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def unregister(self, thread_id):
+        with self._cond:
+            self._threads.discard(thread_id)
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            with self._cond:
+                if not self._threads:
+                    self._cond.wait(self.flush_interval)
+                threads = list(self._threads)
+            if threads:
+                frames = sys._current_frames()
+                stacks = [self._collapse(frames[thread_id]) for thread_id in threads if thread_id in frames]
+                with self._cond:
+                    self.counts.update(stacks)
+                    self.samples += len(stacks)
+                    self._dirty = self._dirty or bool(stacks)
+                time.sleep(self.interval)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                last_flush = time.monotonic()
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"Failed to write stack samples: {e}")
+
+    def flush(self):
+        """Write the aggregated counts, if anything was sampled since the last write"""
+        with self._cond:
+            if not self._dirty:
+                return
+            lines = [f"{stack} {count}\n" for stack, count in self.counts.most_common()]
+            self._dirty = False
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"stacks_{os.getpid()}.folded")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, path)
+
+
+class RequestProfiler:
+    """Opt-in per-request instrumentation for a Flask app
+
+    With stage timing on, routes time their stages with
+    profiler.stage(name); the breakdown is sent in a Server-Timing header
+    and logged. Rendering of a streamed template happens after the headers
+    are sent, so it only appears in the log, as the "render" stage. With a
+    sample rate of N, one request in N is also stack-sampled by a
+    StackSampler.
+    """
+    def __init__(self, app, stages=False, log_ms=0.0, sample_rate=0, sample_interval=0.005,
+                 output="profiles", flush_interval=10.0):
+        """Install the request hooks on app
+
+        Args:
+            app: Flask application
+            stages: Time request stages, with a Server-Timing header and a log line
+            log_ms: Only log requests that took at least this many milliseconds
+            sample_rate: Stack-sample one request in this many; 0 disables sampling
+            sample_interval: Seconds between stack samples of a sampled request
+            output: Directory for the collapsed stack files
+            flush_interval: Seconds between writes of the collapsed stack files
+        """
+        self.stages_enabled = stages
+        self.log_ms = log_ms
+        self.sample_rate = sample_rate
+        self.sampler = StackSampler(output, sample_interval, flush_interval) if sample_rate > 0 else None
+        if stages or self.sampler:
+            app.before_request(self._before)
+            app.after_request(self._after)
+            app.teardown_request(self._teardown)
+
+    def stage(self, name):
+        """Context manager timing stage name of the current request (a no-op when disabled)"""
+        if not self.stages_enabled:
+            return _NO_STAGE
+        profile = g.get("request_profile")
+        return profile.stage(name) if profile is not None else _NO_STAGE
+
+    def _before(self):
+        profile = RequestProfile(request.method, request.path)
+        if self.sampler and random.random() * self.sample_rate < 1:
+            profile.sampled_thread = threading.get_ident()
+            self.sampler.register(profile.sampled_thread)
+        g.request_profile = profile
+
+    def _after(self, response):
+        profile = g.get("request_profile")
+        if profile is None:
+            return response
+        if self.stages_enabled:
+            response.headers["Server-Timing"] = profile.server_timing()
+        if response.is_streamed:
+            # The body is generated while it is sent; finish once it has been
+            response.response = self._timed_body(response.response, profile)
+        else:
+            self._finish(profile)
+        return response
+
+    def _teardown(self, error):
+        profile = g.get("request_profile")
+        # A failed request never reaches after_request
+        if profile is not None and error is not None:
+            self._finish(profile)
+
+    def _timed_body(self, body, profile):
+        try:
+            with profile.stage("render"):
+                yield from body
+        finally:
+            close = getattr(body, "close", None)
+            if close is not None:
+                close()
+            self._finish(profile)
+
+    def _finish(self, profile):
+        if profile.finished:
+            return
+        profile.finished = True
+        if profile.sampled_thread is not None:
+            self.sampler.unregister(profile.sampled_thread)
+        if self.stages_enabled:
+            total = profile.elapsed_ms()
+            if total >= self.log_ms:
+                stages = " ".join(f"{name}={ns / 1e6:.2f}ms" for name, ns in profile.stages.items())
+                print(f"{profile.method} {profile.path} {total:.2f}ms {stages}")
+
+    def flush(self):
+        """Write the collapsed stacks sampled so far"""
+        if self.sampler:
+            self.sampler.flush()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import hashlib
+import random
+import re
+
+# Sample queries as templates with pyformat placeholders. Each parameter has
+# a default, used to render SAMPLE_QUERIES, and a range for random values
+QUERY_TEMPLATES = [
+    {
+        "sql": "SELECT COUNT(*), AVG(value) FROM test_table WHERE value > %(min_value)s",
+        "params": {"min_value": (100, 0, 100000)}
+    },
+    {
+        "sql": "SELECT a.id, a.name, b.value FROM test_table a JOIN test_table b ON a.value < b.value "
+               "WHERE a.id < %(max_id)s AND b.id < %(max_id)s LIMIT 100",
+        "params": {"max_id": (100, 50, 200)}
+    },
+    {
+        "sql": "SELECT name, MAX(value) FROM test_table GROUP BY name LIMIT 100",
+        "params": {}
+    },
+    {
+        "sql": "SELECT id, name, value FROM test_table WHERE id %% %(modulus)s = 0 ORDER BY value DESC LIMIT 100",
+        "params": {"modulus": (10, 2, 20)}
+    },
+    {
+        "sql": "SELECT EXTRACT(HOUR FROM created_at) as hour, COUNT(*), AVG(value) FROM test_table "
+               "GROUP BY EXTRACT(HOUR FROM created_at) ORDER BY hour",
+        "params": {}
+    }
+]
+
+# How parameterised queries are sent: literal SQL text, driver-bound
+# parameters, or server-side prepared statements
+QUERY_MODES = ("literal", "parameterized", "prepared")
+
+
+def default_params(template):
+    return {name: spec[0] for name, spec in template["params"].items()}
+
+
+def random_params(template, rng=random):
+    """Random bind values for template within each parameter's range"""
+    return {name: rng.randint(low, high) for name, (_, low, high) in template["params"].items()}
+
+
+def render(sql, params):
+    """Inline params into a pyformat template as SQL literals (numbers only)"""
+    for name, value in params.items():
+        if not isinstance(value, (int, float)):
+            raise TypeError(f"Only numeric parameters can be inlined, got {name}={value!r}")
+    return sql % params
+
+
+# Sample queries to rotate through
+SAMPLE_QUERIES = [render(template["sql"], default_params(template)) for template in QUERY_TEMPLATES]
+
+
+def template_for(query):
+    """The template a query belongs to (by literal sample text or template SQL), or None"""
+    for sample, template in zip(SAMPLE_QUERIES, QUERY_TEMPLATES):
+        if query == sample or query == template["sql"]:
+            return template
+    return None
+
+
+def query_id(query):
+    """Short label for a query: sample-N for SAMPLE_QUERIES or their templates, otherwise custom"""
+    template = template_for(query)
+    if template is None:
+        return "custom"
+    return f"sample-{QUERY_TEMPLATES.index(template) + 1}"
+
+
+# String and numeric literals, replaced by ? when fingerprinting
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(query):
+    """Short hash of a query with literals and whitespace normalised
+
+    Ad-hoc queries that only differ in their constants share a fingerprint.
+    """
+    normalized = " ".join(_LITERALS.sub("?", query).lower().split())
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def query_label(query):
+    """sample-N for SAMPLE_QUERIES, otherwise fp-<fingerprint>"""
+    label = query_id(query)
+    return label if label != "custom" else f"fp-{fingerprint(query)}"
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import glob
+import json
+import os
+import threading
+import time
+
+
+class SnapshotDir:
+    """JSON state snapshots shared between the worker processes of one server
+
+    Every process periodically writes its own <prefix>_<pid>.json to the
+    directory, and readers combine their live in-process state with the
+    latest snapshot of every other process, the same way MetricsRegistry
+    merges metrics. Snapshots of exited workers are kept, so their
+    executions still count.
+    """
+    def __init__(self, directory, prefix, flush_interval=5.0):
+        """Initialize the snapshot directory
+
+        Args:
+            directory: Directory shared by all workers; created on first write
+            prefix: File name prefix telling apart the users of one directory
+            flush_interval: Seconds between background writes
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self._cache = {}
+        self._flusher_pid = None
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{self.prefix}_{pid}.json")
+
+    def write(self, data):
+        """Replace this process's snapshot with data"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def others(self):
+        """Latest snapshot data of every other process; files are only re-read when they change"""
+        own = self._path(os.getpid())
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, f"{self.prefix}_*.json")):
+            if path == own:
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+                cached = self._cache.get(path)
+                if cached is None or cached[0] != mtime:
+                    with open(path) as f:
+                        cached = self._cache[path] = (mtime, json.load(f))
+            except (OSError, ValueError):
+                continue
+            snapshots.append(cached[1])
+        return snapshots
+
+    def start_flusher(self, snapshot):
+        """Write snapshot() every flush_interval seconds on a background thread (once per pid)"""
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def flush_loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.write(snapshot())
+                except Exception as e:
+                    print(f"Failed to write {self.prefix} snapshot: {e}")
+
+        threading.Thread(target=flush_loop, name=f"{self.prefix}-flush", daemon=True).start()
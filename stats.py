@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+import math
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+
+
+def bootstrap_ci(values, statistic=statistics.median, confidence=0.95, resamples=1000, rng=None):
+    """Percentile bootstrap confidence interval for statistic(values)
+
+    Returns (low, high), or (None, None) with fewer than two values.
+    """
+    if len(values) < 2:
+        return None, None
+    rng = rng or random.Random()
+    n = len(values)
+    estimates = sorted(
+        statistic([values[rng.randrange(n)] for _ in range(n)])
+        for _ in range(resamples)
+    )
+    tail = (1 - confidence) / 2
+    low = estimates[int(tail * (resamples - 1))]
+    high = estimates[int((1 - tail) * (resamples - 1))]
+    return low, high
+
+
+def bootstrap_ratio_ci(baseline, candidate, statistic=statistics.median, confidence=0.95,
+                       resamples=1000, rng=None):
+    """Bootstrap CI for statistic(candidate) / statistic(baseline) from two independent samples
+
+    Returns (low, high), or (None, None) if either sample has fewer than two values.
+    """
+    if len(baseline) < 2 or len(candidate) < 2:
+        return None, None
+    rng = rng or random.Random()
+    estimates = []
+    for _ in range(resamples):
+        base = statistic([baseline[rng.randrange(len(baseline))] for _ in baseline])
+        cand = statistic([candidate[rng.randrange(len(candidate))] for _ in candidate])
+        if base > 0:
+            estimates.append(cand / base)
+    if not estimates:
+        return None, None
+    estimates.sort()
+    tail = (1 - confidence) / 2
+    return (estimates[int(tail * (len(estimates) - 1))],
+            estimates[int((1 - tail) * (len(estimates) - 1))])
+
+
+def summarize(samples):
+    """Descriptive statistics for a list of timings"""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "n": n,
+        "mean": statistics.fmean(ordered),
+        "stdev": statistics.stdev(ordered) if n > 1 else 0.0,
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "p90": ordered[min(n - 1, int(0.9 * n))],
+        "p99": ordered[min(n - 1, int(0.99 * n))],
+        "max": ordered[-1]
+    }
+
+
+class PairedStats:
+    """Running statistics over matched (baseline, candidate) timing pairs
+
+    Each pair is the same query run on two databases at the same moment, so
+    their ratio cancels out most of the noise from load and query choice.
+    Only the most recent window of pairs per key is kept. The bootstrap
+    confidence intervals are too slow for the request path, so a background
+    thread recomputes every key's summary each refresh_seconds and
+    summary() returns the latest one.
+    """
+    def __init__(self, baseline="postgres", candidate="mariadb", window=500, resamples=200,
+                 refresh_seconds=1.0, shared=None):
+        """Initialize the statistics
+
+        Args:
+            baseline: Database in the denominator of the ratio
+            candidate: Database in the numerator of the ratio
+            window: Number of recent pairs kept per key
+            resamples: Bootstrap resamples for the confidence interval
+            refresh_seconds: Seconds between background summary refreshes
+            shared: Optional snapshots.SnapshotDir; summaries then include
+                the pairs of every worker process
+        """
+        self.baseline = baseline
+        self.candidate = candidate
+        self.window = window
+        self.resamples = resamples
+        self.refresh_seconds = refresh_seconds
+        self.shared = shared
+        self.pairs = {}
+        self.totals = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self._refresher_pid = None
+
+    def add(self, key, baseline_time, candidate_time):
+        """Record one pair under key and under the overall key "*"."""
+        with self._lock:
+            for k in (key, "*"):
+                if k not in self.pairs:
+                    self.pairs[k] = deque(maxlen=self.window)
+                    self.totals[k] = 0
+                self.pairs[k].append((baseline_time, candidate_time))
+                self.totals[k] += 1
+
+    def keys(self):
+        with self._lock:
+            keys = set(self.pairs)
+        if self.shared:
+            for snapshot in self.shared.others():
+                keys.update(snapshot["pairs"])
+        return sorted(keys)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "pairs": {key: list(pairs) for key, pairs in self.pairs.items()},
+                "totals": dict(self.totals)
+            }
+
+    def flush(self):
+        """Write this process's pairs to the shared directory now"""
+        if self.shared:
+            self.shared.write(self.to_dict())
+
+    def start_flusher(self):
+        """Keep this process's snapshot in the shared directory up to date"""
+        if self.shared:
+            self.shared.start_flusher(self.to_dict)
+
+    def start_refresher(self):
+        """Recompute the summaries every refresh_seconds on a background thread (once per pid)"""
+        if self._refresher_pid == os.getpid():
+            return
+        self._refresher_pid = os.getpid()
+
+        def refresh_loop():
+            while True:
+                time.sleep(self.refresh_seconds)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Failed to refresh paired statistics: {e}")
+
+        threading.Thread(target=refresh_loop, name="paired-refresh", daemon=True).start()
+
+    def refresh(self):
+        """Recompute the summary of every key; the CI is only redone for keys with new pairs"""
+        for key in self.keys():
+            with self._lock:
+                previous = self._summaries.get(key)
+            summary = self._summarize(key, previous)
+            with self._lock:
+                self._summaries[key] = summary
+
+    def summary(self, key="*"):
+        """Median times, median candidate/baseline ratio and its 95% bootstrap CI
+
+        Returns the summary of the last refresh. A key that has not been
+        refreshed yet is summarized on the spot, without a CI.
+        """
+        with self._lock:
+            summary = self._summaries.get(key)
+        if summary is None:
+            summary = self._summarize(key, None, ci=False)
+        return summary
+
+    def _summarize(self, key, previous, ci=True):
+        with self._lock:
+            pairs = list(self.pairs.get(key, ()))
+            total = self.totals.get(key, 0)
+        if self.shared:
+            # Each worker contributes its own most recent window
+            for snapshot in self.shared.others():
+                pairs.extend(tuple(pair) for pair in snapshot["pairs"].get(key, ()))
+                total += snapshot["totals"].get(key, 0)
+
+        ratios = [candidate / baseline for baseline, candidate in pairs if baseline > 0]
+        if not ci:
+            low, high = None, None
+        elif previous is not None and previous["pairs"] == total and previous["ci_low"] is not None:
+            low, high = previous["ci_low"], previous["ci_high"]
+        else:
+            low, high = bootstrap_ci(ratios, resamples=self.resamples)
+        return {
+            "key": key,
+            "baseline": self.baseline,
+            "candidate": self.candidate,
+            "pairs": total,
+            "window": len(pairs),
+            "baseline_median": statistics.median(p[0] for p in pairs) if pairs else None,
+            "candidate_median": statistics.median(p[1] for p in pairs) if pairs else None,
+            "median_ratio": statistics.median(ratios) if ratios else None,
+            "ci_low": low,
+            "ci_high": high
+        }
+
+
+class RunningStats:
+    """Streaming count, mean, variance, min and max (Welford's algorithm)"""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Combine with another RunningStats (Chan et al. parallel update)"""
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data["count"]
+        stats.mean = data["mean"]
+        stats.m2 = data["m2"]
+        stats.min = data["min"]
+        stats.max = data["max"]
+        return stats
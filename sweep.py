@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import platform
+import random
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from api_client import ApiClient
+from database import DatabaseManager
+from engines import create_engine
+from histogram import LatencyHistogram
+from queries import QUERY_MODES, QUERY_TEMPLATES, random_params
+
+
+def concurrency_levels(max_workers, start=1):
+    """Doubling worker counts from start up to and including max_workers: 1, 2, 4 ... N"""
+    levels = []
+    workers = start
+    while workers < max_workers:
+        levels.append(workers)
+        workers *= 2
+    levels.append(max_workers)
+    return levels
+
+
+def run_step(db_manager, engine, workers, duration, warmup=1.0, mode=None, seed=None):
+    """Drive engine with `workers` concurrent threads and return that step's measurements
+
+    Every thread runs the sample query templates with random bind values in
+    a closed loop. All threads start together. Only queries that start after
+    the first `warmup` seconds and finish within the following `duration`
+    seconds are counted, and throughput is their number per second.
+    """
+    barrier = threading.Barrier(workers + 1)
+    histograms = [LatencyHistogram() for _ in range(workers)]
+    errors = [0] * workers
+    times = {}
+
+    def worker(index):
+        rng = random.Random(None if seed is None else seed + index)
+        histogram = histograms[index]
+        barrier.wait()
+        measure_from, stop_at = times["measure_from"], times["stop_at"]
+        while True:
+            template = rng.choice(QUERY_TEMPLATES)
+            start = time.perf_counter()
+            if start >= stop_at:
+                break
+            try:
+                db_manager.run_query(template["sql"], engine, engine_timing=False,
+                                     params=random_params(template, rng), mode=mode)
+                failed = False
+            except Exception:
+                failed = True
+            end = time.perf_counter()
+            if start >= measure_from and end <= stop_at:
+                if failed:
+                    errors[index] += 1
+                else:
+                    histogram.record(end - start)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    now = time.perf_counter()
+    times["measure_from"] = now + warmup
+    times["stop_at"] = now + warmup + duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    latency = LatencyHistogram()
+    for histogram in histograms:
+        latency.merge(histogram)
+    summary = latency.summary()
+    return {
+        "workers": workers,
+        "completed": latency.count,
+        "errors": sum(errors),
+        "throughput": latency.count / duration,
+        "latency": summary
+    }
+
+
+def find_knee(steps, tolerance=0.1):
+    """Index of the saturation knee in a list of steps ordered by workers, or None
+
+    The knee is the smallest concurrency whose throughput is within
+    `tolerance` of the best throughput measured: adding workers beyond it
+    buys at most that much more throughput and only adds queueing latency.
+    """
+    if not steps:
+        return None
+    peak = max(step["throughput"] for step in steps)
+    if peak <= 0:
+        return None
+    for i, step in enumerate(steps):
+        if step["throughput"] >= (1 - tolerance) * peak:
+            return i
+    return None
+
+
+def sweep(db_manager, engine, levels, duration, warmup=1.0, mode=None, tolerance=0.1, seed=None):
+    """Run every concurrency level on one engine and return its curve and knee"""
+    steps = []
+    for workers in levels:
+        print(f"Sweeping {engine} with {workers} workers...")
+        step = run_step(db_manager, engine, workers, duration, warmup=warmup, mode=mode, seed=seed)
+        # Throughput per worker relative to a single worker: 1.0 is perfect scaling
+        if steps and steps[0]["throughput"]:
+            step["efficiency"] = step["throughput"] / (steps[0]["throughput"] * workers / steps[0]["workers"])
+        else:
+            step["efficiency"] = 1.0 if step["throughput"] else 0.0
+        steps.append(step)
+    knee = find_knee(steps, tolerance)
+    return {
+        "engine": engine,
+        "steps": steps,
+        "knee": steps[knee]["workers"] if knee is not None else None,
+        "peak_throughput": max((step["throughput"] for step in steps), default=0.0)
+    }
+
+
+def chart(report, width=640, height=260, padding=40):
+    """SVG coordinates for plotting throughput and p99 latency against workers
+
+    Workers are spaced on a log2 axis. Returns axis ticks and, per engine,
+    polyline point strings for throughput and p99 and the knee position,
+    for templates/sweep.html.
+    """
+    levels = sorted({step["workers"] for result in report["results"] for step in result["steps"]})
+    if not levels:
+        return None
+    max_throughput = max(step["throughput"] for result in report["results"] for step in result["steps"]) or 1.0
+    max_p99 = max(step["latency"]["p99"] for result in report["results"] for step in result["steps"]) or 1.0
+    plot_width = width - 2 * padding
+    plot_height = height - 2 * padding
+
+    def x(workers):
+        if len(levels) == 1:
+            return padding + plot_width / 2
+        span = math.log2(levels[-1] / levels[0])
+        position = math.log2(workers / levels[0]) / span
+        return padding + position * plot_width
+
+    def y(value, top):
+        return padding + plot_height * (1 - value / top)
+
+    series = []
+    for result in report["results"]:
+        steps = result["steps"]
+        knee = next((step for step in steps if step["workers"] == result["knee"]), None)
+        series.append({
+            "engine": result["engine"],
+            "throughput": " ".join(f"{x(s['workers']):.1f},{y(s['throughput'], max_throughput):.1f}" for s in steps),
+            "p99": " ".join(f"{x(s['workers']):.1f},{y(s['latency']['p99'], max_p99):.1f}" for s in steps),
+            "knee": (round(x(knee["workers"]), 1), round(y(knee["throughput"], max_throughput), 1)) if knee else None
+        })
+    return {
+        "width": width,
+        "height": height,
+        "padding": padding,
+        "ticks": [(workers, round(x(workers), 1)) for workers in levels],
+        "max_throughput": max_throughput,
+        "max_p99_ms": max_p99 * 1000,
+        "series": series
+    }
+
+
+def print_sweep(result):
+    print(f"\n{result['engine']}")
+    print(f"{'workers':>8} {'qps':>10} {'efficiency':>11} {'p50':>10} {'p99':>10} {'errors':>7}")
+    for step in result["steps"]:
+        marker = "  <- knee" if step["workers"] == result["knee"] else ""
+        print(f"{step['workers']:>8} {step['throughput']:>10.1f} {step['efficiency']:>11.2f} "
+              f"{step['latency']['p50'] * 1000:>8.2f}ms {step['latency']['p99'] * 1000:>8.2f}ms "
+              f"{step['errors']:>7}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure how each database scales with the number of concurrent clients'
+    )
+    parser.add_argument(
+        '--engines',
+        nargs='+',
+        help='Databases to sweep, e.g. postgres mariadb (default: DB_ENGINES)'
+    )
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        default=64,
+        help='Highest number of concurrent workers; levels double from 1 up to it (default: 64)'
+    )
+    parser.add_argument(
+        '--levels',
+        type=int,
+        nargs='+',
+        help='Explicit worker counts to run instead of doubling up to --max-workers'
+    )
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=10.0,
+        help='Measured seconds per concurrency level (default: 10)'
+    )
+    parser.add_argument(
+        '--warmup',
+        type=float,
+        default=2.0,
+        help='Unmeasured seconds at the start of each level (default: 2)'
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.1,
+        help='The knee is the fewest workers reaching this close to peak throughput (default: 0.1)'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=QUERY_MODES,
+        help='How queries send their values (default: DB_QUERY_MODE, literal)'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='Seed for the random query and bind value choices'
+    )
+    parser.add_argument(
+        '--output',
+        default='sweep.json',
+        help='Write the report to this JSON file, shown by the app at /sweep (default: sweep.json)'
+    )
+    parser.add_argument(
+        '--data-size',
+        default='100000',
+        help='Rows of test data to load, or a scale factor: 100k, 1m, 10m, 100m (default: 100000)'
+    )
+    parser.add_argument(
+        '--no-setup',
+        action='store_true',
+        help='Assume the containers are running and the test data is loaded'
+    )
+    parser.add_argument(
+        '--api',
+        metavar='URL',
+        help='Sweep the /api/query endpoint of the app at this URL instead of the databases; '
+             'the app owns the containers, data and connection pools'
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    levels = sorted(set(args.levels)) if args.levels else concurrency_levels(args.max_workers)
+    if args.api:
+        db_manager = ApiClient(args.api, engines=args.engines)
+    else:
+        engines = {name: create_engine(name) for name in args.engines} if args.engines else None
+        db_manager = DatabaseManager(engines=engines)
+        # Every worker needs its own connection, otherwise the sweep measures pool waits
+        db_manager.pool_max_size = max(db_manager.pool_max_size, levels[-1])
+    if not args.no_setup and not args.api:
+        db_manager.ensure_containers_running()
+        db_manager.load_test_data(args.data_size)
+
+    results = []
+    try:
+        for engine in db_manager.engines:
+            result = sweep(db_manager, engine, levels, args.duration, warmup=args.warmup,
+                           mode=args.mode, tolerance=args.tolerance, seed=args.seed)
+            print_sweep(result)
+            results.append(result)
+    finally:
+        db_manager.close_pools()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "engines": list(db_manager.engines),
+            "levels": levels,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "tolerance": args.tolerance,
+            "pool_mode": db_manager.pool_mode,
+            "query_mode": args.mode or db_manager.query_mode,
+            "api": args.api,
+            "data_size": args.data_size
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote sweep report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
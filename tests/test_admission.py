@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionGate, QueryRejected, QueryTimeout, Watchdog
+from database import DatabaseManager
+from engines import DuckDBEngine, SQLiteEngine
+
+# Queries that run far longer than the tests' statement timeout
+ENDLESS_QUERIES = {
+    "sqlite": "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT COUNT(*) FROM c",
+    "duckdb": "SELECT COUNT(*) FROM range(1000000) a, range(1000000) b WHERE a.range + b.range < 0"
+}
+
+
+def test_gate_rejects_when_the_queue_is_full():
+    gate = AdmissionGate("test", max_concurrent=1, max_queue=0)
+    gate.acquire()
+    with pytest.raises(QueryRejected):
+        gate.acquire()
+    gate.release()
+    with gate.slot():
+        pass
+    stats = gate.stats()
+    assert (stats["admitted"], stats["queue_full"], stats["running"]) == (2, 1, 0)
+
+
+def test_gate_rejects_after_the_queue_timeout():
+    gate = AdmissionGate("test", max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    gate.acquire()
+    start = time.perf_counter()
+    with pytest.raises(QueryRejected):
+        gate.acquire()
+    assert time.perf_counter() - start >= 0.05
+    stats = gate.stats()
+    assert (stats["queue_timeouts"], stats["queued"]) == (1, 0)
+
+
+def test_gate_hands_a_released_slot_to_a_waiting_query():
+    gate = AdmissionGate("test", max_concurrent=1, max_queue=1, queue_timeout=5)
+    gate.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        with gate.slot():
+            admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.05)
+    assert not admitted.is_set()
+    gate.release()
+    thread.join(5)
+    assert admitted.is_set()
+    assert gate.stats()["running"] == 0
+
+
+def test_watchdog_fires_only_undiscarded_watches():
+    watchdog = Watchdog("test-watchdog")
+    fired = []
+    kept = watchdog.watch(0.05, lambda: fired.append("kept"))
+    dropped = watchdog.watch(0.05, lambda: fired.append("dropped"))
+    watchdog.discard(dropped)
+    kept.done.wait(5)
+    assert fired == ["kept"]
+    assert watchdog.fired == 1
+
+
+@pytest.mark.parametrize("db_type", ["sqlite", "duckdb"])
+def test_watchdog_cancels_a_long_query(db_type, tmp_path):
+    if db_type == "duckdb":
+        pytest.importorskip("duckdb")
+        engine = DuckDBEngine(path=str(tmp_path / "test.duckdb"))
+    else:
+        engine = SQLiteEngine(path=str(tmp_path / "test.sqlite"))
+    manager = DatabaseManager(engines={db_type: engine})
+    # Neither engine has a server-side timeout, so the watchdog cancels
+    manager.statement_timeout = 0.2
+    manager.cancel_grace = 0.1
+    try:
+        start = time.perf_counter()
+        with pytest.raises(QueryTimeout):
+            manager.run_query(ENDLESS_QUERIES[db_type], db_type)
+        assert time.perf_counter() - start < 5
+        assert manager.watchdog.fired == 1
+        # The cancelled connection went back to the pool and still works
+        assert manager.run_query("SELECT 1", db_type)["results"] == [(1,)]
+    finally:
+        manager.close_pools()
@@ -0,0 +1,44 @@
+import json
+import os
+
+import pytest
+
+from aggregates import AggregateStore
+from snapshots import SnapshotDir
+
+
+def test_recent_and_summary_include_other_workers(tmp_path):
+    store = AggregateStore(shared=SnapshotDir(str(tmp_path), "aggregates"),
+                           shared_recent=SnapshotDir(str(tmp_path), "recent"))
+    other = AggregateStore()
+    other.record("mariadb", "q1", "SELECT 1", 0.002, timestamp=200.0)
+    other.record("mariadb", "q1", "SELECT 1", 30.0, outcome="timeout", timestamp=150.0)
+    # Snapshots of another worker process
+    with open(tmp_path / "aggregates_1.json", "w") as f:
+        json.dump(other.to_dict(), f)
+    with open(tmp_path / "recent_1.json", "w") as f:
+        json.dump(other.recent_dict(), f)
+
+    store.record("postgres", "q1", "SELECT 1", 0.001, timestamp=100.0)
+    store.flush()
+    assert [execution["database"] for execution in store.recent()] == ["postgres", "mariadb", "mariadb"]
+    # The small recent snapshot has no series in it
+    assert "series" not in json.loads((tmp_path / f"recent_{os.getpid()}.json").read_text())
+
+    rows = store.summary()["windows"]["all"]
+    assert [(row["engine"], row["count"], row["timeouts"]) for row in rows] == [("mariadb", 1, 1), ("postgres", 1, 0)]
+
+
+def test_failures_are_counted_by_outcome_apart_from_latencies():
+    store = AggregateStore()
+    store.record("postgres", "q1", "SELECT 1", 0.010, timestamp=100.0)
+    store.record("postgres", "q1", "SELECT 1", 0.0001, outcome="rejected", timestamp=101.0)
+    store.record("postgres", "q1", "SELECT 1", 30.0, outcome="timeout", timestamp=102.0)
+    store.record("postgres", "q1", "SELECT 1", 0.002, outcome="error", timestamp=103.0)
+    store.record("postgres", "q1", "SELECT 1", 0.003, outcome="error", timestamp=104.0)
+
+    row = store.summary()["windows"]["all"][0]
+    assert (row["count"], row["errors"], row["rejected"], row["timeouts"]) == (1, 2, 1, 1)
+    assert row["p50"] == pytest.approx(0.010, rel=0.02)
+    assert row["last"] == 0.010
+    assert store.recent()[-1]["outcome"] == "error"
@@ -0,0 +1,103 @@
+import json
+import tempfile
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("splitio")
+
+
+@pytest.fixture(scope="module")
+def app_process(tmp_path_factory):
+    """The app module, set up without network, containers or warm-up
+
+    The Split.io SDK runs in localhost mode from a temporary split file.
+    The app runs as a gunicorn worker would: it follows a warm-up state
+    file, which here already says ready, and init_worker() is called by
+    hand.
+    """
+    directory = tmp_path_factory.mktemp("app")
+    split_file = directory / ".split"
+    split_file.write_text("db_performance_comparison sqlite\n")
+    state_file = directory / "warmup.json"
+    state_file.write_text(json.dumps({"state": "ready"}))
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("SPLITIO_SDK_KEY", "localhost")
+        patch.setenv("SPLITIO_SPLIT_FILE", str(split_file))
+        patch.setenv("APP_PREFORK", "1")
+        patch.setenv("DB_WARMUP_STATE_FILE", str(state_file))
+        patch.setenv("DB_ENGINES", "sqlite")
+        for name in ("STATS_SHARED_DIR", "METRICS_MULTIPROC_DIR", "DB_MAX_CONCURRENT", "DB_ADMISSION_QUEUE"):
+            patch.delenv(name, raising=False)
+        # The SQLite database file goes to the temporary directory
+        patch.setattr(tempfile, "tempdir", str(directory))
+        import app
+        app.init_worker()
+        try:
+            yield app
+        finally:
+            app.shutdown_worker()
+
+
+@pytest.fixture
+def app_module(app_process, monkeypatch):
+    monkeypatch.setattr(app_process.aggregates, "cache_seconds", 0)
+    return app_process
+
+
+def failure_count(app, label, column="errors"):
+    rows = app.aggregates.summary()["windows"]["all"]
+    return sum(row[column] for row in rows if row["engine"] == "sqlite" and row["query"] == label)
+
+
+def test_failed_query_counts_as_error(app_module):
+    from queries import query_label
+
+    sql = "SELECT * FROM missing_table"
+    before = failure_count(app_module, query_label(sql))
+    response = app_module.app.test_client().post("/api/query", json={"query": sql, "database": "sqlite"})
+    assert response.status_code == 500
+    assert response.get_json()["outcome"] == "error"
+    assert failure_count(app_module, query_label(sql)) == before + 1
+    assert app_module.aggregates.recent(1)[0]["outcome"] == "error"
+
+
+def test_rejected_query_counts_apart_from_errors(app_module):
+    from queries import query_label
+
+    sql = "SELECT 1"
+    gate = app_module.db_manager.admission_gate("sqlite")
+    before = failure_count(app_module, query_label(sql), "rejected"), failure_count(app_module, query_label(sql))
+    max_queue = gate.max_queue
+    gate.max_queue = 0
+    for _ in range(gate.max_concurrent):
+        gate.acquire()
+    try:
+        response = app_module.app.test_client().post("/api/query", json={"query": sql, "database": "sqlite"})
+    finally:
+        for _ in range(gate.max_concurrent):
+            gate.release()
+        gate.max_queue = max_queue
+    assert response.status_code == 503
+    after = failure_count(app_module, query_label(sql), "rejected"), failure_count(app_module, query_label(sql))
+    assert after == (before[0] + 1, before[1])
+
+
+def test_dashboard_compares_the_paired_databases(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.paired_stats, "baseline", "sqlite")
+    monkeypatch.setattr(app_module.paired_stats, "candidate", "duckdb")
+    app_module.aggregates.record("sqlite", "dashboard-test", "SELECT 2", 0.001)
+    app_module.aggregates.record("duckdb", "dashboard-test", "SELECT 2", 0.002)
+    page = app_module.app.test_client().get("/dashboard").get_data(as_text=True)
+    assert "DUCKDB / SQLITE median ratio" in page
+
+
+def test_unknown_mode_is_a_client_error(app_module):
+    from queries import SAMPLE_QUERIES, query_label
+
+    sql = SAMPLE_QUERIES[0]
+    client = app_module.app.test_client()
+    before = failure_count(app_module, query_label(sql))
+    assert client.post("/api/query", json={"query": sql, "database": "sqlite", "mode": "bogus"}).status_code == 400
+    assert client.get("/", query_string={"query": sql, "mode": "bogus", "paired": "0"}).status_code == 400
+    assert failure_count(app_module, query_label(sql)) == before
@@ -0,0 +1,103 @@
+import pytest
+
+from database import DatabaseManager
+from engines import DuckDBEngine, SQLiteEngine
+
+
+@pytest.fixture(params=["sqlite", "duckdb"])
+def manager(request, tmp_path):
+    """DatabaseManager over one embedded engine with an empty test table"""
+    if request.param == "duckdb":
+        pytest.importorskip("duckdb")
+        engine = DuckDBEngine(path=str(tmp_path / "test.duckdb"))
+    else:
+        engine = SQLiteEngine(path=str(tmp_path / "test.sqlite"))
+    manager = DatabaseManager(engines={request.param: engine})
+    conn = engine.connect()
+    try:
+        engine.create_table(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+    yield manager
+    manager.close_pools()
+
+
+def count_rows(manager, db_type, where="1 = 1"):
+    result = manager.run_query(f"SELECT COUNT(*) FROM test_table WHERE {where}", db_type)
+    return result["results"][0][0]
+
+
+def test_load_test_data(manager, tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_DATASET_CACHE", str(tmp_path / "cache"))
+    db_type = manager.default_engine
+    manager.load_test_data(100)
+    assert count_rows(manager, db_type) == 100
+
+    # The checksum is recorded, so the next load is skipped
+    engine = manager.engines[db_type]
+    conn = engine.connect()
+    try:
+        assert engine.stored_dataset(conn) is not None
+    finally:
+        conn.close()
+
+
+def test_run_transaction_commit_is_visible(manager):
+    db_type = manager.default_engine
+    result = manager.run_transaction(db_type, [
+        ("INSERT INTO test_table (id, name, value, created_at) "
+         "VALUES (%(id)s, %(name)s, %(value)s, %(created_at)s)",
+         {"id": 1000001, "name": "committed", "value": 1.5, "created_at": "2024-01-01 00:00:00"}),
+    ])
+    assert result["outcome"] == "commit", result["error"]
+    assert count_rows(manager, db_type, "id = 1000001") == 1
+
+
+def test_run_transaction_rollback_is_discarded(manager):
+    db_type = manager.default_engine
+    result = manager.run_transaction(db_type, [
+        ("INSERT INTO test_table (id, name, value, created_at) "
+         "VALUES (%(id)s, %(name)s, %(value)s, %(created_at)s)",
+         {"id": 1000002, "name": "rolled back", "value": 2.5, "created_at": "2024-01-01 00:00:00"}),
+    ], rollback=True)
+    assert result["outcome"] == "rollback", result["error"]
+    assert count_rows(manager, db_type, "name = 'rolled back'") == 0
+
+
+def test_run_paired_runs_every_database(tmp_path):
+    engines = {
+        "first": SQLiteEngine(path=str(tmp_path / "first.sqlite")),
+        "second": SQLiteEngine(path=str(tmp_path / "second.sqlite"))
+    }
+    manager = DatabaseManager(engines=engines)
+    try:
+        results = manager.run_paired("SELECT 1", ("first", "second"))
+        assert list(results) == ["first", "second"]
+        assert all(result["results"] == [(1,)] for result in results.values())
+
+        with pytest.raises(Exception):
+            manager.run_paired("SELECT * FROM missing_table", ("first", "second"))
+    finally:
+        manager.close_pools()
+
+
+def test_run_transaction_is_rejected_when_the_gate_is_full(manager):
+    db_type = manager.default_engine
+    gate = manager.admission_gate(db_type)
+    gate.max_queue = 0
+    for _ in range(gate.max_concurrent):
+        gate.acquire()
+    try:
+        result = manager.run_transaction(db_type, [("SELECT 1", {})])
+    finally:
+        for _ in range(gate.max_concurrent):
+            gate.release()
+    assert result["outcome"] == "rejected"
+    assert manager.run_transaction(db_type, [("SELECT 1", {})])["outcome"] == "commit"
+
+
+def test_run_query_rejects_an_unknown_mode(manager):
+    with pytest.raises(ValueError):
+        manager.run_query("SELECT id FROM test_table WHERE id = %(id)s", manager.default_engine,
+                          params={"id": 1}, mode="bogus")
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolExhaustedError
+from engines import DuckDBEngine, SQLiteEngine
+
+
+@pytest.fixture(params=["sqlite", "duckdb"])
+def engine(request, tmp_path):
+    """Embedded engine with an empty test table"""
+    if request.param == "duckdb":
+        pytest.importorskip("duckdb")
+        engine = DuckDBEngine(path=str(tmp_path / "test.duckdb"))
+    else:
+        engine = SQLiteEngine(path=str(tmp_path / "test.sqlite"))
+    conn = engine.connect()
+    try:
+        engine.create_table(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+    return engine
+
+
+def count_rows(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM test_table")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def test_release_rolls_back_and_reuses_the_connection(engine):
+    pool = ConnectionPool(engine.name, engine.connect, min_size=0, max_size=1)
+    try:
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            engine.begin(cursor)
+            cursor.execute("INSERT INTO test_table (id, name) VALUES (1, 'uncommitted')")
+            cursor.close()
+            first = conn
+        with pool.connection() as conn:
+            assert conn is first
+            assert count_rows(conn) == 0
+        stats = pool.stats()
+        assert (stats["checkouts"], stats["size"], stats["idle"]) == (2, 1, 1)
+    finally:
+        pool.close()
+
+
+def test_checkout_times_out_when_the_pool_is_exhausted(engine):
+    pool = ConnectionPool(engine.name, engine.connect, min_size=0, max_size=1, checkout_timeout=0.05)
+    try:
+        conn = pool.acquire()
+        start = time.perf_counter()
+        with pytest.raises(PoolExhaustedError):
+            pool.acquire()
+        assert time.perf_counter() - start >= 0.05
+        pool.release(conn)
+        stats = pool.stats()
+        assert (stats["exhausted"], stats["timeouts"]) == (1, 1)
+        # The released connection is free again
+        pool.release(pool.acquire())
+    finally:
+        pool.close()
+
+
+def test_connection_that_fails_rollback_is_discarded():
+    opened = []
+
+    class BrokenConnection:
+        def rollback(self):
+            raise RuntimeError("connection lost")
+
+        def close(self):
+            pass
+
+    def connect():
+        opened.append(BrokenConnection())
+        return opened[-1]
+
+    pool = ConnectionPool("test", connect, min_size=0, max_size=1)
+    with pool.connection():
+        pass
+    assert pool.stats()["size"] == 0
+    with pool.connection() as conn:
+        assert conn is opened[1]
@@ -0,0 +1,30 @@
+from engines import MariaDBEngine
+
+
+class RecordingConnection:
+    def __init__(self, executed):
+        self.executed = executed
+        self.connection_id = 42
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def close(self):
+        self.closed = True
+
+
+def test_mariadb_cancel_uses_the_given_connector():
+    executed = []
+    killers = []
+
+    def connect():
+        killers.append(RecordingConnection(executed))
+        return killers[-1]
+
+    MariaDBEngine().cancel(RecordingConnection([]), connect)
+    assert executed == ["KILL QUERY 42"]
+    assert killers[0].closed
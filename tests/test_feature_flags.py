@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from feature_flags import TrackQueue, TreatmentCache
+
+splitio = pytest.importorskip("splitio")
+
+
+class CountingClient:
+    """Split client wrapper counting the calls that reach the SDK"""
+    def __init__(self, client):
+        self.client = client
+        self.treatment_calls = 0
+        self.tracked = []
+
+    def get_treatment(self, key, feature_flag):
+        self.treatment_calls += 1
+        return self.client.get_treatment(key, feature_flag)
+
+    def track(self, key, traffic_type, event_type, value=None, properties=None):
+        self.tracked.append((key, event_type, value))
+        return self.client.track(key, traffic_type, event_type, value, properties)
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Split client in localhost mode, reading treatments from a temporary split file"""
+    split_file = tmp_path / ".split"
+    split_file.write_text("db_performance_comparison duckdb\n")
+    factory = splitio.get_factory("localhost", config={"splitFile": str(split_file)})
+    factory.block_until_ready(5)
+    client = factory.client()
+    yield CountingClient(client)
+    client.destroy()
+
+
+def test_treatments_are_cached_for_the_ttl(client):
+    cache = TreatmentCache(client, ttl=0.2)
+    assert cache.get_treatment("user_1", "db_performance_comparison") == "duckdb"
+    assert cache.get_treatment("user_1", "db_performance_comparison") == "duckdb"
+    assert client.treatment_calls == 1
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+    # Another key is evaluated on its own
+    cache.get_treatment("user_2", "db_performance_comparison")
+    assert client.treatment_calls == 2
+
+    time.sleep(0.25)
+    assert cache.get_treatment("user_1", "db_performance_comparison") == "duckdb"
+    assert client.treatment_calls == 3
+
+
+def test_stop_sends_the_queued_events(client):
+    track_queue = TrackQueue(client, batch_size=2, flush_interval=60)
+    for i in range(5):
+        assert track_queue.track(f"user_{i}", "user", "query_execution", i * 0.01)
+    assert track_queue.stats()["queued"] == 5
+
+    # Without a running worker everything is still queued until stop()
+    track_queue.stop()
+    assert [value for _, _, value in client.tracked] == [0.0, 0.01, 0.02, 0.03, 0.04]
+    stats = track_queue.stats()
+    assert (stats["queued"], stats["sent"], stats["failed"]) == (0, 5, 0)
+
+
+def test_full_queue_drops_events(client):
+    track_queue = TrackQueue(client, max_size=1)
+    assert track_queue.track("user_1", "user", "query_execution", 1.0)
+    assert not track_queue.track("user_2", "user", "query_execution", 2.0)
+    track_queue.stop()
+    assert track_queue.stats()["dropped"] == 1
+    assert len(client.tracked) == 1
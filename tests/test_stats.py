@@ -0,0 +1,17 @@
+from stats import PairedStats
+
+
+def test_paired_summary_gets_ci_from_refresh():
+    stats = PairedStats(baseline="a", candidate="b", resamples=50)
+    for i in range(20):
+        stats.add("q", 10.0, 20.0 + i % 3)
+
+    summary = stats.summary("q")
+    assert summary["pairs"] == 20
+    assert summary["median_ratio"] == 2.1
+    assert summary["ci_low"] is None
+
+    stats.refresh()
+    summary = stats.summary("q")
+    assert summary["ci_low"] <= summary["median_ratio"] <= summary["ci_high"]
+    assert stats.summary()["pairs"] == 20
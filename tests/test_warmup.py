@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import time
+
+from warmup import FAILED, READY, WarmUp, WarmUpState
+
+
+class FlakyManager:
+    """Stands in for DatabaseManager; the first container start fails"""
+    def __init__(self):
+        self.attempts = 0
+        self.startup_timings = {}
+        self.containers_started = False
+        self.data_loaded = False
+
+    def ensure_containers_running(self):
+        self.attempts += 1
+        if self.attempts == 1:
+            raise RuntimeError("podman not found")
+        self.containers_started = True
+
+    def load_test_data(self, data_size):
+        self.data_loaded = True
+
+
+def test_worker_start_retries_failed_master_warmup(tmp_path):
+    state_file = str(tmp_path / "warmup.json")
+    master = WarmUp(FlakyManager(), state_file=state_file)
+    master.start()
+    assert not master.wait(5)
+    master.watch_retries(poll_interval=0.01)
+
+    worker = WarmUpState(state_file, poll_interval=0.01)
+    assert worker.status()["state"] == FAILED
+    worker.start()
+
+    deadline = time.monotonic() + 5
+    while not worker.is_ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.status()["state"] == READY
+    assert master.db_manager.attempts == 2
+
+
+def test_warmup_process_loads_and_cleans_up(tmp_path, monkeypatch):
+    database = tmp_path / "performance_test.sqlite"
+    monkeypatch.setenv("DB_ENGINES", "sqlite")
+    monkeypatch.setenv("DB_DATASET_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    state_file = str(tmp_path / "warmup.json")
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "warmup.py")
+    process = subprocess.Popen([sys.executable, script, state_file, "100"])
+    try:
+        assert WarmUpState(state_file, poll_interval=0.05).wait(60)
+        assert database.exists()
+    finally:
+        process.terminate()
+        process.wait(30)
+    assert process.returncode == 0
+    assert not database.exists()
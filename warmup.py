@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+STARTING = "starting"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class WarmUp:
+    """Runs container startup and data loading on a background thread"""
+    def __init__(self, db_manager, data_size=100000, state_file=None):
+        """Initialize the warm-up task
+
+        Args:
+            db_manager: DatabaseManager to start and load
+            data_size: Number of test rows to load, or a scale factor name such as "1m"
+            state_file: Optional path where every state change is written,
+                for WarmUpState readers in other processes
+        """
+        self.db_manager = db_manager
+        self.data_size = data_size
+        self.state_file = state_file
+        self.state = STARTING
+        self.error = None
+        self.started_at = None
+        self.phase_started_at = None
+        self.timings = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self):
+        return self.state == READY
+
+    def start(self):
+        """Start the warm-up thread unless one is already running or finished successfully"""
+        with self._lock:
+            if self.state == READY or (self._thread and self._thread.is_alive()):
+                return
+            self.state = STARTING
+            self.error = None
+            self.timings = {}
+            self.started_at = time.time()
+            self.phase_started_at = self.started_at
+            self._save()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def reset(self):
+        """Forget a finished warm-up so the next start() runs it again"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.state = STARTING
+            self.error = None
+            self.started_at = None
+            self.phase_started_at = None
+            self.timings = {}
+            self._save()
+
+    def watch_retries(self, poll_interval=1.0):
+        """Restart a failed warm-up when a WarmUpState in another process asks for it
+
+        Workers ask by creating <state_file>.retry; a background thread polls
+        for it every poll_interval seconds.
+        """
+        retry_file = f"{self.state_file}.retry"
+
+        def watch_loop():
+            while True:
+                time.sleep(poll_interval)
+                try:
+                    os.remove(retry_file)
+                except OSError:
+                    continue
+                if self.state == FAILED:
+                    print("Warm-up: retrying at a worker's request")
+                    self.start()
+
+        threading.Thread(target=watch_loop, name="warmup-retry", daemon=True).start()
+
+    def wait(self, timeout=None):
+        """Block until the warm-up thread finishes; returns True if ready"""
+        if self._thread:
+            self._thread.join(timeout)
+        return self.is_ready
+
+    def _enter(self, state, error=None):
+        with self._lock:
+            now = time.time()
+            self.timings[self.state] = now - self.phase_started_at
+            self.phase_started_at = now
+            self.state = state
+            self.error = error
+            self._save()
+        print(f"Warm-up: {state}")
+
+    def _save(self):
+        """Write the state file; called with the lock held, so states are written in order"""
+        if not self.state_file:
+            return
+        state = {
+            "state": self.state,
+            "error": self.error,
+            "started_at": self.started_at,
+            "phase_started_at": self.phase_started_at,
+            "phase_timings": dict(self.timings),
+            "startup_timings": self.db_manager.startup_timings,
+            "containers_started": self.db_manager.containers_started,
+            "data_loaded": self.db_manager.data_loaded
+        }
+        directory = os.path.dirname(self.state_file) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_file)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _run(self):
+        try:
+            print("Warm-up: starting containers")
+            self.db_manager.ensure_containers_running()
+            self._enter(LOADING)
+            self.db_manager.load_test_data(self.data_size)
+            self._enter(READY)
+            print(f"Warm-up complete in {time.time() - self.started_at:.1f}s")
+        except Exception as e:
+            traceback.print_exc()
+            self._enter(FAILED, str(e))
+
+    def status(self):
+        """Return a JSON-serialisable snapshot of the warm-up progress"""
+        now = time.time()
+        return {
+            "state": self.state,
+            "error": self.error,
+            "elapsed": now - self.started_at if self.started_at else 0.0,
+            "phase_elapsed": now - self.phase_started_at if self.phase_started_at else 0.0,
+            "phase_timings": dict(self.timings),
+            "startup_timings": self.db_manager.startup_timings,
+            "containers_started": self.db_manager.containers_started,
+            "data_loaded": self.db_manager.data_loaded
+        }
+
+
+def run_warmup_process(state_file, data_size):
+    """Body of the gunicorn master's warm-up process
+
+    The master forks workers, so it must not run threads of its own; the
+    warm-up runs in this process instead (python warmup.py STATE_FILE
+    DATA_SIZE) and reports through state_file. The process keeps answering retry requests until it is
+    terminated, and then stops the containers.
+    """
+    from database import DatabaseManager
+
+    # SIGTERM from the master unwinds through the finally block below
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+    db_manager = DatabaseManager()
+    try:
+        warmup = WarmUp(db_manager, data_size=data_size, state_file=state_file)
+        warmup.start()
+        warmup.watch_retries()
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            db_manager.cleanup()
+        except Exception as e:
+            print(f"Error during container cleanup: {e}")
+
+
+class WarmUpState:
+    """Read-only view of a WarmUp running in another process
+
+    Under gunicorn the master's warm-up process runs the warm-up and workers
+    follow its state file. That process owns the containers, so start()
+    only asks it to retry a failed warm-up, through a request file its
+    WarmUp.watch_retries() polls for.
+    """
+    def __init__(self, state_file, poll_interval=0.5):
+        self.state_file = state_file
+        self.poll_interval = poll_interval
+        self._state = {"state": STARTING}
+        self._read_at = 0.0
+
+    def _load(self):
+        # READY is final, so stop reading the file once it is reached
+        if self._state["state"] == READY or time.monotonic() - self._read_at < self.poll_interval:
+            return self._state
+        self._read_at = time.monotonic()
+        try:
+            with open(self.state_file) as f:
+                self._state = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return self._state
+
+    @property
+    def is_ready(self):
+        return self._load()["state"] == READY
+
+    def start(self):
+        """Ask the warm-up process to restart the warm-up if it failed"""
+        if self._load()["state"] != FAILED:
+            return
+        try:
+            with open(f"{self.state_file}.retry", "w"):
+                pass
+        except OSError as e:
+            print(f"Failed to request a warm-up retry: {e}")
+
+    def reset(self):
+        # Only /cleanup resets, and it leaves the warm-up process's containers alone
+        pass
+
+    def wait(self, timeout=None):
+        """Poll the state file until the warm-up finishes; returns True if ready"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._load()["state"] not in (READY, FAILED):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+        return self.is_ready
+
+    def status(self):
+        """The same snapshot as WarmUp.status(), from the state file"""
+        state = self._load()
+        now = time.time()
+        return {
+            "state": state["state"],
+            "error": state.get("error"),
+            "elapsed": now - state["started_at"] if state.get("started_at") else 0.0,
+            "phase_elapsed": now - state["phase_started_at"] if state.get("phase_started_at") else 0.0,
+            "phase_timings": state.get("phase_timings", {}),
+            "startup_timings": state.get("startup_timings", {}),
+            "containers_started": state.get("containers_started", False),
+            "data_loaded": state.get("data_loaded", False)
+        }
+
+
+if __name__ == "__main__":
+    run_warmup_process(sys.argv[1], sys.argv[2])
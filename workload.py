@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import platform
+import random
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from database import DatabaseManager
+from dataset import resolve_size
+from engines import create_engine
+from histogram import LatencyHistogram
+from queries import QUERY_MODES, QUERY_TEMPLATES, random_params
+
+# How a write transaction can end; "commit" and "rollback" are normal endings,
+# the rest are conflicts reported by the engine
+OUTCOMES = ("commit", "rollback", "deadlock", "serialization", "lock_timeout", "timeout", "rejected", "error")
+
+ISOLATION_LEVELS = ("read uncommitted", "read committed", "repeatable read", "serializable")
+
+
+def _tpcb(rng, rows, hot_rows):
+    # TPC-B: credit an account, read its balance back, credit one of a few
+    # hot "branch" rows every transaction contends on, append a history row
+    params = {"delta": rng.randint(-500, 500), "account": rng.randint(1, rows), "branch": rng.randint(1, hot_rows)}
+    return [
+        ("UPDATE test_table SET value = value + %(delta)s WHERE id = %(account)s", params),
+        ("SELECT value FROM test_table WHERE id = %(account)s", params),
+        ("UPDATE test_table SET value = value + %(delta)s WHERE id = %(branch)s", params),
+        ("INSERT INTO test_table (name, value, created_at) VALUES ('history', %(delta)s, CURRENT_TIMESTAMP)", params)
+    ]
+
+
+def _transfer(rng, rows, hot_rows):
+    # Two hot rows updated in random order, so concurrent transfers can deadlock
+    source, target = rng.sample(range(1, max(hot_rows, 2) + 1), 2)
+    amount = rng.randint(1, 500)
+    return [
+        ("UPDATE test_table SET value = value - %(amount)s WHERE id = %(id)s", {"amount": amount, "id": source}),
+        ("UPDATE test_table SET value = value + %(amount)s WHERE id = %(id)s", {"amount": amount, "id": target})
+    ]
+
+
+def _insert(rng, rows, hot_rows):
+    return [("INSERT INTO test_table (name, value, created_at) VALUES ('new', %(value)s, CURRENT_TIMESTAMP)",
+             {"value": rng.randint(0, 100000)})]
+
+
+def _delete(rng, rows, hot_rows):
+    # Accounts only, so the hot rows every other transaction needs stay in place
+    return [("DELETE FROM test_table WHERE id = %(id)s", {"id": rng.randint(hot_rows + 1, max(rows, hot_rows + 1))})]
+
+
+# Write transactions with their default weights in the write mix. abort runs
+# the TPC-B statements and then rolls back, like the 1% of TPC-C new-order
+# transactions the application cancels
+WRITE_TRANSACTIONS = {
+    "tpcb": {"weight": 50, "statements": _tpcb, "rollback": False},
+    "transfer": {"weight": 20, "statements": _transfer, "rollback": False},
+    "insert": {"weight": 15, "statements": _insert, "rollback": False},
+    "delete": {"weight": 10, "statements": _delete, "rollback": False},
+    "abort": {"weight": 5, "statements": _tpcb, "rollback": True}
+}
+
+
+def parse_weights(specs):
+    """Write mix weights from name=weight strings, starting from the defaults"""
+    weights = {name: spec["weight"] for name, spec in WRITE_TRANSACTIONS.items()}
+    for item in specs or ():
+        name, _, weight = item.partition("=")
+        if name not in WRITE_TRANSACTIONS:
+            raise ValueError(f"Unknown transaction {name}; choose from {', '.join(WRITE_TRANSACTIONS)}")
+        weights[name] = float(weight)
+    if not any(weights.values()):
+        raise ValueError("At least one write transaction needs a positive weight")
+    return weights
+
+
+def run_workload(db_manager, engine, workers, duration, rows, read_ratio=0.8, weights=None,
+                 isolation=None, hot_rows=10, mode=None, warmup=1.0, seed=None):
+    """Run the mixed read/write workload on one engine and return its measurements
+
+    Args:
+        db_manager: DatabaseManager with the test data loaded
+        engine: Engine name
+        workers: Concurrent closed-loop worker threads
+        duration: Measured seconds, after `warmup` unmeasured seconds
+        rows: Rows in the loaded test data, the range of account ids
+        read_ratio: Fraction of operations that are sample queries; the
+            rest are write transactions drawn by weight
+        weights: Dict of write transaction name to weight (default: WRITE_TRANSACTIONS)
+        isolation: Isolation level for write transactions (default: the engine's)
+        hot_rows: Ids 1..hot_rows are the contended rows of tpcb and transfer
+        mode: Query mode for the reads
+        seed: Seed for the random choices of each worker
+    """
+    weights = weights or {name: spec["weight"] for name, spec in WRITE_TRANSACTIONS.items()}
+    names = [name for name, weight in weights.items() if weight > 0]
+    name_weights = [weights[name] for name in names]
+    barrier = threading.Barrier(workers + 1)
+    times = {}
+    lock = threading.Lock()
+    latency = {name: LatencyHistogram() for name in ["read"] + names}
+    outcomes = {name: dict.fromkeys(OUTCOMES, 0) for name in names}
+    read_errors = [0]
+    errors = {}
+
+    def worker(index):
+        rng = random.Random(None if seed is None else seed + index)
+        barrier.wait()
+        measure_from, stop_at = times["measure_from"], times["stop_at"]
+        while True:
+            start = time.perf_counter()
+            if start >= stop_at:
+                break
+            if rng.random() < read_ratio:
+                name = "read"
+                template = rng.choice(QUERY_TEMPLATES)
+                try:
+                    db_manager.run_query(template["sql"], engine, engine_timing=False,
+                                         params=random_params(template, rng), mode=mode)
+                    outcome = "commit"
+                except Exception as e:
+                    outcome = "error"
+                    message = str(e)
+            else:
+                name = rng.choices(names, name_weights)[0]
+                spec = WRITE_TRANSACTIONS[name]
+                result = db_manager.run_transaction(engine, spec["statements"](rng, rows, hot_rows),
+                                                    isolation=isolation, rollback=spec["rollback"])
+                outcome, message = result["outcome"], result["error"]
+            end = time.perf_counter()
+            if start < measure_from or end > stop_at:
+                continue
+            with lock:
+                if name == "read":
+                    if outcome == "error":
+                        read_errors[0] += 1
+                else:
+                    outcomes[name][outcome] += 1
+                if outcome in ("commit", "rollback"):
+                    latency[name].record(end - start)
+                elif outcome == "error" and (message in errors or len(errors) < 10):
+                    errors[message] = errors.get(message, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    now = time.perf_counter()
+    times["measure_from"] = now + warmup
+    times["stop_at"] = now + warmup + duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    totals = dict.fromkeys(OUTCOMES, 0)
+    for counts in outcomes.values():
+        for outcome, count in counts.items():
+            totals[outcome] += count
+    attempts = sum(totals.values())
+    return {
+        "engine": engine,
+        "isolation": isolation if len(db_manager.engines[engine].isolation_levels) > 1
+                     else db_manager.engines[engine].isolation_levels[0],
+        "reads": latency["read"].count,
+        "read_errors": read_errors[0],
+        "transactions": attempts,
+        "throughput": (latency["read"].count + totals["commit"]) / duration,
+        "commits_per_second": totals["commit"] / duration,
+        "outcomes": totals,
+        "rates": {outcome: count / attempts if attempts else 0.0 for outcome, count in totals.items()},
+        "by_transaction": {
+            name: {"outcomes": outcomes[name], "latency": latency[name].summary()} for name in names
+        },
+        "read_latency": latency["read"].summary(),
+        "errors": errors
+    }
+
+
+def print_workload(result):
+    print(f"\n{result['engine']} ({result['isolation'] or 'default isolation'}): "
+          f"{result['throughput']:.1f} ops/s, {result['commits_per_second']:.1f} commits/s, "
+          f"{result['reads']} reads ({result['read_errors']} failed)")
+    rates = result["rates"]
+    print("  " + ", ".join(f"{outcome} {rates[outcome]:.2%}" for outcome in OUTCOMES))
+    print(f"  {'transaction':<12} {'count':>7} {'p50':>10} {'p99':>10}  conflicts")
+    rows = [("read", result["reads"], result["read_latency"], None)]
+    rows += [(name, sum(entry["outcomes"].values()), entry["latency"], entry["outcomes"])
+             for name, entry in result["by_transaction"].items()]
+    for name, count, latency, outcomes in rows:
+        conflicts = ""
+        if outcomes:
+            conflicts = " ".join(f"{o}={outcomes[o]}" for o in OUTCOMES[2:] if outcomes[o])
+        print(f"  {name:<12} {count:>7} {latency['p50'] * 1000:>8.2f}ms {latency['p99'] * 1000:>8.2f}ms  {conflicts}")
+    for message, count in result["errors"].items():
+        print(f"  error x{count}: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run a mixed read/write transactional workload against each database'
+    )
+    parser.add_argument(
+        '--engines',
+        nargs='+',
+        help='Databases to run, e.g. postgres mariadb (default: DB_ENGINES)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=8,
+        help='Concurrent clients (default: 8)'
+    )
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=30.0,
+        help='Measured seconds per engine and isolation level (default: 30)'
+    )
+    parser.add_argument(
+        '--warmup',
+        type=float,
+        default=2.0,
+        help='Unmeasured seconds before measuring (default: 2)'
+    )
+    parser.add_argument(
+        '--read-ratio',
+        type=float,
+        default=0.8,
+        help='Fraction of operations that are read queries, 0-1 (default: 0.8)'
+    )
+    parser.add_argument(
+        '--weights',
+        nargs='+',
+        metavar='NAME=WEIGHT',
+        help='Write mix weights for ' + ', '.join(WRITE_TRANSACTIONS) + ' (default: ' +
+             ' '.join(f"{name}={spec['weight']}" for name, spec in WRITE_TRANSACTIONS.items()) + ')'
+    )
+    parser.add_argument(
+        '--isolation',
+        nargs='+',
+        choices=ISOLATION_LEVELS,
+        help='Isolation levels to run, one after another (default: each engine\'s default)'
+    )
+    parser.add_argument(
+        '--hot-rows',
+        type=int,
+        default=10,
+        help='Number of contended rows updated by tpcb and transfer; fewer means more conflicts (default: 10)'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=QUERY_MODES,
+        help='How read queries send their values (default: DB_QUERY_MODE, literal)'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='Seed for the random operation choices'
+    )
+    parser.add_argument(
+        '--output',
+        help='Write the report to this JSON file'
+    )
+    parser.add_argument(
+        '--data-size',
+        default='100000',
+        help='Rows of test data to load, or a scale factor: 100k, 1m, 10m, 100m (default: 100000)'
+    )
+    parser.add_argument(
+        '--no-setup',
+        action='store_true',
+        help='Assume the containers are running and the test data is loaded'
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    weights = parse_weights(args.weights)
+    engines = {name: create_engine(name) for name in args.engines} if args.engines else None
+    db_manager = DatabaseManager(engines=engines)
+    db_manager.pool_max_size = max(db_manager.pool_max_size, args.workers)
+    if not args.no_setup:
+        db_manager.ensure_containers_running()
+        db_manager.load_test_data(args.data_size)
+    rows = resolve_size(args.data_size)
+
+    results = []
+    try:
+        for engine in db_manager.engines:
+            levels = args.isolation or [None]
+            if len(db_manager.engines[engine].isolation_levels) == 1:
+                # Every level runs the same way on single-level engines
+                levels = [None]
+            for isolation in levels:
+                print(f"Running workload on {engine} ({isolation or 'default isolation'})...")
+                result = run_workload(db_manager, engine, args.workers, args.duration, rows,
+                                      read_ratio=args.read_ratio, weights=weights, isolation=isolation,
+                                      hot_rows=args.hot_rows, mode=args.mode, warmup=args.warmup,
+                                      seed=args.seed)
+                print_workload(result)
+                results.append(result)
+    finally:
+        db_manager.close_pools()
+
+    print("\nThe workload modified test_table; the next run reloads the test data.")
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "host": platform.node(),
+                "python": platform.python_version(),
+                "engines": list(db_manager.engines),
+                "workers": args.workers,
+                "duration": args.duration,
+                "read_ratio": args.read_ratio,
+                "weights": weights,
+                "hot_rows": args.hot_rows,
+                "pool_mode": db_manager.pool_mode,
+                "query_mode": args.mode or db_manager.query_mode,
+                "data_size": args.data_size
+            },
+            "results": results
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote workload report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()